@@ -1,10 +1,57 @@
 from flask import Flask
+from flask_cors import CORS
+from dotenv import load_dotenv
 
-app = Flask(__name__)
+from json_rapido import instalar_json
+from limites import confiar_proxies
+from metricas import instrumentar
+from preparacion import CORS_MAX_AGE, calentar, preparar
+
+# Prefijo bajo el que se monta cada flujo de chat
+FLUJOS = {
+    'chat': '/chat',
+    'chat_complet': '/chat-complet',
+    'chat_isi': '/chat-isi',
+    'chat_simple': '/chat-simple'
+}
+
+
+def create_app(flujos=None):
+    """
+    Crea una app que sirve todos los flujos de chat, cada uno como blueprint
+    bajo su prefijo (p. ej. /chat-complet/api/chat).
+
+    Los flujos comparten el gateway del modelo, el store de sesiones y la
+    caché del catálogo; todos se crean recién cuando se usan por primera vez,
+    así el proceso arranca rápido.
+    """
+    from importlib import import_module
+
+    load_dotenv()
+    # orjson para jsonify y request.get_json
+    app = instalar_json(Flask(__name__))
+    CORS(app, max_age=CORS_MAX_AGE)
+    # IP real del cliente para los límites por IP (PROXIES_CONFIABLES, ver limites.py)
+    confiar_proxies(app)
+
+    for nombre, prefijo in (flujos or FLUJOS).items():
+        app.register_blueprint(import_module(nombre).bp, url_prefix=prefijo)
+
+    # Histogramas por etapa, Server-Timing y GET /metrics
+    instrumentar(app)
+
+    # Preflight CORS sin pasar por los hooks de la petición y GET /ready;
+    # el calentamiento lo corre cada worker (ver gunicorn.conf.py)
+    preparar(app)
+
+    @app.route('/')
+    def home():
+        return "¡Hola Mundo! Mi servidor Flask está funcionando."
+
+    return app
 
-@app.route('/')
-def home():
-    return "¡Hola Mundo! Mi servidor Flask está funcionando."
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app = create_app()
+    calentar(app)
+    app.run(debug=True)
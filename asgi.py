@@ -0,0 +1,50 @@
+# Modo asíncrono: uvicorn asgi:app (o hypercorn asgi:app)
+# Dependencias opcionales, solo para este modo: pip install quart quart-cors uvicorn
+# El modo síncrono (gunicorn -c gunicorn.conf.py wsgi:app) no las necesita.
+import asyncio
+
+from dotenv import load_dotenv
+
+try:
+    from quart import Quart, request
+    from quart_cors import cors
+except ImportError as e:
+    raise ImportError(
+        "El modo asíncrono requiere quart y quart-cors: pip install quart quart-cors uvicorn"
+    ) from e
+
+
+def create_asgi_app():
+    """
+    Crea la app ASGI con los handlers asíncronos, montados en las mismas rutas
+    que en create_app (p. ej. /chat-complet/api/chat).
+
+    Con un solo proceso atiende tantas conexiones simultáneas como permita
+    GEMINI_MAX_EN_VUELO_ASYNC, en lugar de una por hilo.
+    """
+    import chat_complet_async
+    from metricas import fijar_flujo
+    from preparacion import CORS_MAX_AGE, calentar
+
+    load_dotenv()
+    app = cors(Quart(__name__), max_age=CORS_MAX_AGE)
+    app.register_blueprint(chat_complet_async.bp, url_prefix='/chat-complet')
+
+    @app.before_request
+    async def _flujo():
+        # Las métricas de metricas.py no ven la petición de Quart: el flujo va aparte
+        fijar_flujo(request.blueprint or 'app')
+
+    @app.before_serving
+    async def _calentar():
+        # El servidor ASGI no acepta conexiones hasta que termina el arranque
+        await asyncio.to_thread(calentar, app)
+
+    @app.route('/')
+    async def home():
+        return "¡Hola Mundo! Mi servidor Quart está funcionando."
+
+    return app
+
+
+app = create_asgi_app()
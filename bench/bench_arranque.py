@@ -0,0 +1,48 @@
+"""
+Mide el tiempo de arranque del proceso: importar wsgi (create_app con todos
+los flujos) frente a crear además el cliente de Gemini al arrancar, como
+hacían antes los módulos de chat. Cada medición usa un intérprete nuevo.
+
+Uso: python -m bench.bench_arranque [--repeticiones 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+CASOS = {
+    'create_app (perezoso)': "import wsgi",
+    'create_app + cliente Gemini': "import wsgi, modelo; modelo.obtener_modelo()",
+    'solo python': "pass",
+}
+
+PLANTILLA = (
+    "import time; _t = time.perf_counter()\n"
+    "{codigo}\n"
+    "print(time.perf_counter() - _t)"
+)
+
+
+def medir(codigo):
+    env = dict(os.environ, GOOGLE_API_KEY=os.getenv('GOOGLE_API_KEY', 'fake'))
+    salida = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', PLANTILLA.format(codigo=codigo)],
+        capture_output=True, text=True, check=True, env=env
+    )
+    return float(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    for nombre, codigo in CASOS.items():
+        tiempos = [medir(codigo) for _ in range(args.repeticiones)]
+        print(f"{nombre:30s} mediana={1000 * statistics.median(tiempos):8.1f} ms "
+              f"min={1000 * min(tiempos):8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Conexiones simultáneas que atiende un proceso en modo síncrono (hilos, como
+gunicorn gthread) y en modo asíncrono (asgi.py), con el modelo falso.
+
+Cada conexión es una consulta a /chat-complet/api/chat que llega al modelo.
+En modo síncrono cada una ocupa un hilo durante toda la latencia del modelo;
+en modo asíncrono queda en un await.
+
+Uso: python -m bench.bench_async [--conexiones 10,100,1000] [--hilos 8] [--latencia 0.5]
+     [--modos sync,async]
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('GOOGLE_API_KEY', 'fake')
+# Todas las peticiones salen de la misma IP: sin límites de frecuencia (ver limites.py)
+os.environ.setdefault('LIMITE_IP_RAFAGA', '0')
+os.environ.setdefault('LIMITE_SESION_RAFAGA', '0')
+
+import modelo  # noqa: E402
+from app import create_app  # noqa: E402
+from chat_complet import procesar_mensaje  # noqa: E402
+from fake_gemini import FakeGenerativeModel  # noqa: E402
+from gateway import ModelGateway  # noqa: E402
+
+RUTA = '/chat-complet/api/chat'
+
+
+def abrir_sesiones(cantidad):
+    # Sesiones ya creadas; las consultas 'general' no piden datos y van directo al modelo
+    return [procesar_mensaje(None, 'hola')[0]['session_id'] for _ in range(cantidad)]
+
+
+def cuerpos(session_ids, etiqueta):
+    # Preguntas distintas para no usar la caché de respuestas
+    return [{'session_id': sid, 'message': f'{etiqueta} pregunta general {i}'}
+            for i, sid in enumerate(session_ids)]
+
+
+def resumen(modo, duraciones, codigos, total):
+    ordenadas = sorted(duraciones)
+    ok = sum(1 for c in codigos if c == 200)
+    return {
+        'modo': modo,
+        'conexiones': len(duraciones),
+        'ok': ok,
+        'total_s': total,
+        'p50_ms': 1000 * ordenadas[len(ordenadas) // 2],
+        'p95_ms': 1000 * ordenadas[int(0.95 * (len(ordenadas) - 1))],
+        'rps': ok / total,
+    }
+
+
+def correr_sync(session_ids, hilos, etiqueta):
+    app = create_app({'chat_complet': '/chat-complet'})
+
+    def una(cuerpo):
+        cliente = app.test_client()
+        inicio = time.perf_counter()
+        response = cliente.post(RUTA, json=cuerpo)
+        return time.perf_counter() - inicio, response.status_code
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        resultados = list(pool.map(una, cuerpos(session_ids, etiqueta)))
+    total = time.perf_counter() - inicio
+    return resumen(f'sync ({hilos} hilos)', [d for d, _ in resultados], [c for _, c in resultados], total)
+
+
+def correr_async(session_ids, etiqueta):
+    from asgi import create_asgi_app
+
+    app = create_asgi_app()
+
+    async def todas():
+        cliente = app.test_client()
+
+        async def una(cuerpo):
+            inicio = time.perf_counter()
+            response = await cliente.post(RUTA, json=cuerpo)
+            return time.perf_counter() - inicio, response.status_code
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(una(c) for c in cuerpos(session_ids, etiqueta)))
+        return resultados, time.perf_counter() - inicio
+
+    resultados, total = asyncio.run(todas())
+    return resumen('async', [d for d, _ in resultados], [c for _, c in resultados], total)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--conexiones', default='10,100,1000')
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--latencia', type=float, default=0.5)
+    parser.add_argument('--modos', default='sync,async')
+    args = parser.parse_args()
+
+    maximo = max(int(c) for c in args.conexiones.split(','))
+    # El límite del gateway no debe ser el cuello de botella en ninguno de los dos modos
+    modelo._gateway = ModelGateway(
+        FakeGenerativeModel(retardo_inicial=args.latencia),
+        max_en_vuelo=args.hilos, max_en_vuelo_async=maximo, timeout=600, espera_maxima=600
+    )
+    modos = args.modos.split(',')
+
+    print(f"latencia_modelo={1000 * args.latencia:.0f} ms")
+    print(f"{'modo':<16}{'conex':>7}{'ok':>7}{'total s':>9}{'p50 ms':>10}{'p95 ms':>10}{'rps':>9}{'simult.':>9}")
+    for n in (int(c) for c in args.conexiones.split(',')):
+        session_ids = abrir_sesiones(n)
+        for modo in modos:
+            if modo == 'sync':
+                r = correr_sync(session_ids, args.hilos, f'sync{n}')
+            else:
+                r = correr_async(session_ids, f'async{n}')
+            # Conexiones atendidas a la vez, en promedio: rps × latencia del modelo
+            simultaneas = r['rps'] * args.latencia
+            print(f"{r['modo']:<16}{r['conexiones']:>7}{r['ok']:>7}{r['total_s']:>9.2f}{r['p50_ms']:>10.0f}"
+                  f"{r['p95_ms']:>10.0f}{r['rps']:>9.1f}{simultaneas:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
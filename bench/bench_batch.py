@@ -0,0 +1,69 @@
+"""
+Throughput de /api/chat/batch frente a llamadas secuenciales a /api/chat,
+con el modelo falso detrás del ModelGateway.
+
+Uso: python -m bench.bench_batch [--sesiones 50] [--mensajes 4] [--latencia 0.05]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('GOOGLE_API_KEY', 'fake')
+# Todas las peticiones salen de la misma IP: sin límites de frecuencia (ver limites.py)
+os.environ.setdefault('LIMITE_IP_RAFAGA', '0')
+os.environ.setdefault('LIMITE_SESION_RAFAGA', '0')
+
+from app import create_app  # noqa: E402
+import chat_complet  # noqa: E402
+from fake_gemini import FakeGenerativeModel  # noqa: E402
+from gateway import ModelGateway  # noqa: E402
+
+
+def abrir_sesiones(client, cantidad):
+    return [client.post('/api/chat', json={'message': 'hola'}).get_json()['session_id']
+            for _ in range(cantidad)]
+
+
+def items_de_prueba(session_ids, mensajes, etiqueta):
+    # Preguntas de tipo 'general' (no piden datos) y distintas entre sí para no usar la caché
+    return [
+        {'session_id': session_id, 'message': f'{etiqueta} pregunta general {n} de {session_id}'}
+        for n in range(mensajes)
+        for session_id in session_ids
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sesiones', type=int, default=50)
+    parser.add_argument('--mensajes', type=int, default=4)
+    parser.add_argument('--latencia', type=float, default=0.05)
+    parser.add_argument('--max-en-vuelo', type=int, default=8)
+    args = parser.parse_args()
+
+    chat_complet.model = ModelGateway(
+        FakeGenerativeModel(retardo_inicial=args.latencia), max_en_vuelo=args.max_en_vuelo
+    )
+    chat_complet.BATCH_WORKERS = args.max_en_vuelo
+    client = create_app({'chat_complet': ''}).test_client()
+    session_ids = abrir_sesiones(client, args.sesiones)
+
+    items = items_de_prueba(session_ids, args.mensajes, 'secuencial')
+    inicio = time.perf_counter()
+    for item in items:
+        client.post('/api/chat', json=item)
+    secuencial = time.perf_counter() - inicio
+
+    items = items_de_prueba(session_ids, args.mensajes, 'lote')
+    inicio = time.perf_counter()
+    resultados = client.post('/api/chat/batch', json={'items': items}).get_json()['results']
+    lote = time.perf_counter() - inicio
+    errores = sum(1 for r in resultados if r['status'] != 'success')
+
+    print(f"items={len(items)} latencia_modelo={1000 * args.latencia:.0f} ms workers={args.max_en_vuelo}")
+    print(f"secuencial: {secuencial:7.2f} s  {len(items) / secuencial:8.1f} msg/s")
+    print(f"batch:      {lote:7.2f} s  {len(items) / lote:8.1f} msg/s  errores={errores}")
+
+
+if __name__ == '__main__':
+    main()
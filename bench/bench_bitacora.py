@@ -0,0 +1,95 @@
+"""
+Costo de leer una página del historial según el largo de la conversación:
+bitácora de segmentos (bitacora.py) frente al historial en el store en memoria
+(que antes se serializaba completo en cada llamada a /api/chat-history).
+
+También mide la escritura con flush por lotes, la reconstrucción del índice al
+arrancar y la compactación.
+
+Uso: python -m bench.bench_bitacora [--turnos 100,10000,100000] [--limite 50]
+"""
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+from bitacora import BitacoraConversaciones
+from sesiones import MemoriaStore
+
+TURNO = {
+    'timestamp': '2024-05-01T12:00:00',
+    'message': '¿Tienen polos de algodón en talla M y en color azul?',
+    'response': 'Sí, tenemos el Polo Básico en talla M y color azul a $25.99. ' * 3
+}
+
+
+def medir(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return 1e6 * (time.perf_counter() - inicio) / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turnos', default='100,10000,100000')
+    parser.add_argument('--limite', type=int, default=50)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+    niveles = [int(n) for n in args.turnos.split(',')]
+    limite = args.limite
+
+    directorio = tempfile.mkdtemp(prefix='bitacora-')
+    try:
+        bitacora = BitacoraConversaciones(directorio, max_bytes_segmento=16 * 2 ** 20, hilo_fondo=False)
+        store = MemoriaStore()
+
+        total_turnos = 0
+        inicio = time.perf_counter()
+        for n in niveles:
+            clave = f'sesion-{n}'
+            store.crear(clave, {})
+            for i in range(n):
+                bitacora.agregar(clave, dict(TURNO, n=i))
+                store.agregar_historial(clave, dict(TURNO, n=i))
+            # Otra sesión intercalada, para que los turnos no queden contiguos en disco
+            for i in range(n // 10):
+                bitacora.agregar(f'otra-{n}', TURNO)
+            total_turnos += n + n // 10
+        bitacora.flush()
+        escritura = time.perf_counter() - inicio
+        print(f"escritura: {total_turnos} turnos (bitácora + memoria) en {escritura:.2f} s, "
+              f"{bitacora.flushes} flushes, {bitacora.estadisticas()['segmentos']} segmentos")
+
+        print(f"\n{'turnos':>8}{'completo (json) µs':>22}{'página inicio µs':>19}"
+              f"{'página medio µs':>18}{'página final µs':>18}")
+        for n in niveles:
+            clave = f'sesion-{n}'
+            repeticiones = max(5, args.repeticiones * 100 // max(100, n))
+            completo = medir(lambda: json.dumps(store.historial(clave)), repeticiones)
+            paginas = [
+                medir(lambda: json.dumps(bitacora.rango(clave, desde, desde + limite)), args.repeticiones)
+                for desde in (0, n // 2, max(0, n - limite))
+            ]
+            print(f"{n:>8}{completo:>22.0f}{paginas[0]:>19.0f}{paginas[1]:>18.0f}{paginas[2]:>18.0f}")
+
+        inicio = time.perf_counter()
+        bitacora.compactar()
+        compactacion = time.perf_counter() - inicio
+        clave = f'sesion-{niveles[-1]}'
+        despues = medir(lambda: bitacora.rango(clave, niveles[-1] // 2, niveles[-1] // 2 + limite), args.repeticiones)
+        print(f"\ncompactación: {compactacion:.2f} s; página medio tras compactar: {despues:.0f} µs")
+        bitacora.cerrar()
+
+        inicio = time.perf_counter()
+        reabierta = BitacoraConversaciones(directorio, hilo_fondo=False)
+        print(f"reconstrucción del índice al arrancar: {time.perf_counter() - inicio:.2f} s "
+              f"({reabierta.estadisticas()['turnos']} turnos)")
+        reabierta.cerrar()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
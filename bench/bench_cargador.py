@@ -0,0 +1,117 @@
+"""
+Tiempo de carga y memoria de cargar_catalogo (lectura por partes, productos
+con __slots__) frente a json.load, sobre un catálogo sintético grande.
+
+Cada cargador se mide en un proceso aparte para que el pico de RSS de uno no
+contamine al otro.
+
+Uso: python -m bench.bench_cargador [--mb 500] [--invalidos 0.001] [--ruta catalogo_grande.json]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+TALLAS = [["XS", "S", "M", "L", "XL"], ["28", "30", "32", "34", "36"], ["S", "M", "L"], ["Única"]]
+COLORES = [["Blanco", "Negro", "Gris"], ["Azul", "Negro"], ["Rojo", "Verde", "Amarillo", "Azul"]]
+CATEGORIAS = ["casual", "deportiva", "formal", "calzado", "accesorios", "infantil"]
+
+
+def generar(ruta, megabytes, invalidos, semilla=1):
+    """Escribe un store_data.json sintético de aproximadamente `megabytes` MB"""
+    aleatorio = random.Random(semilla)
+    objetivo = megabytes * 2 ** 20
+    por_categoria = max(1, objetivo // 260 // len(CATEGORIAS))
+    escritos = 0
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write('{"info_general": {"nombre": "Fashion Store", "horario": "Lunes a Sábado 9:00-20:00", '
+                '"metodos_pago": ["Tarjeta", "Débito"], "politica_devoluciones": "30 días"},\n"categorias": {')
+        for c, categoria in enumerate(CATEGORIAS):
+            f.write(f'{"," if c else ""}\n"{categoria}": {{"productos": [')
+            for i in range(por_categoria):
+                producto = {
+                    "id": f"{categoria[:2].upper()}{i:07d}",
+                    "nombre": f"Producto {categoria} {i}",
+                    "precio": round(aleatorio.uniform(10, 900), 2),
+                    "tallas": aleatorio.choice(TALLAS),
+                    "colores": aleatorio.choice(COLORES),
+                    "descripcion": f"Prenda {categoria} de algodón, modelo {i % 977}, ideal para el día a día",
+                }
+                if aleatorio.random() < invalidos:
+                    del producto["tallas"]
+                linea = json.dumps(producto, ensure_ascii=False)
+                f.write(("," if i else "") + "\n" + linea)
+                escritos += len(linea) + 2
+            f.write(']}')
+        f.write('},\n"promociones": [{"id": "P1", "descripcion": "20% en segunda prenda", '
+                '"fecha_inicio": "2024-01-01", "fecha_fin": "2030-12-31"}]}\n')
+    return escritos
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def medir(metodo, ruta):
+    """Se ejecuta en el proceso hijo: carga `ruta` y devuelve las mediciones"""
+    base = rss_mb()
+    inicio = time.perf_counter()
+    if metodo == 'json':
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+        productos = sum(len(c['productos']) for c in datos['categorias'].values())
+        errores = None
+    else:
+        from cargador_catalogo import cargar_catalogo
+        datos = cargar_catalogo(ruta)
+        productos = sum(len(p) for p in datos.categorias.values())
+        errores = len(datos.errores)
+    segundos = time.perf_counter() - inicio
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        'metodo': metodo,
+        'segundos': round(segundos, 2),
+        'productos': productos,
+        'registros_invalidos': errores,
+        'rss_retenido_mb': round(rss_mb() - base, 1),
+        'rss_pico_mb': round(pico, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=int, default=500)
+    parser.add_argument('--invalidos', type=float, default=0.001)
+    parser.add_argument('--ruta', default='catalogo_grande.json')
+    parser.add_argument('--medir', choices=['json', 'streaming'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.medir, args.ruta)))
+        return
+
+    if not os.path.exists(args.ruta) or abs(os.path.getsize(args.ruta) / 2 ** 20 - args.mb) > args.mb * 0.1:
+        inicio = time.perf_counter()
+        generar(args.ruta, args.mb, args.invalidos)
+        print(f"catálogo sintético generado en {time.perf_counter() - inicio:.1f} s")
+    print(f"archivo: {args.ruta} ({os.path.getsize(args.ruta) / 2 ** 20:.0f} MB)\n")
+
+    print(f"{'método':<12}{'segundos':>10}{'productos':>12}{'inválidos':>11}{'RSS retenido MB':>17}{'RSS pico MB':>13}")
+    for metodo in ('json', 'streaming'):
+        salida = subprocess.run(
+            [sys.executable, '-m', 'bench.bench_cargador', '--medir', metodo, '--ruta', args.ruta],
+            capture_output=True, text=True, check=True
+        ).stdout
+        r = json.loads(salida.strip().splitlines()[-1])
+        invalidos = '-' if r['registros_invalidos'] is None else r['registros_invalidos']
+        print(f"{r['metodo']:<12}{r['segundos']:>10.2f}{r['productos']:>12}{invalidos:>11}"
+              f"{r['rss_retenido_mb']:>17.1f}{r['rss_pico_mb']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Tráfico que absorben las respuestas directas (respuestas_directas.py) y
+latencia ahorrada: recorre conversaciones guionadas contra los flujos con
+tienda, con y sin respuestas directas, usando el modelo falso con latencia.
+
+La caché de respuestas queda activa en las dos pasadas, como en producción,
+y se vacía entre ellas.
+
+Uso: python -m bench.bench_directas [--conversaciones 20] [--latencia-media 1.0]
+"""
+import argparse
+import os
+import statistics
+from importlib import import_module
+
+os.environ.setdefault('GOOGLE_API_KEY', 'fake')
+# Todas las peticiones salen de la misma IP: sin límites de frecuencia (ver limites.py)
+os.environ.setdefault('LIMITE_IP_RAFAGA', '0')
+os.environ.setdefault('LIMITE_SESION_RAFAGA', '0')
+
+import modelo  # noqa: E402
+from app import FLUJOS, create_app  # noqa: E402
+from bench.escenarios import conversar  # noqa: E402
+from fake_gemini import FakeGenerativeModel, latencia  # noqa: E402
+from gateway import ModelGateway  # noqa: E402
+
+FLUJOS_TIENDA = ('chat_isi', 'chat_simple', 'chat_complet')
+
+# Mezcla de preguntas sobre datos fijos y consultas que necesitan al modelo
+CORPUS = [
+    "¿Cuál es su horario de atención?",
+    "¿Tienen jeans en talla 32?",
+    "¿A qué hora abren los sábados?",
+    "¿Cuánto cuesta el polo básico?",
+    "¿Dónde están ubicados?",
+    "¿Hay alguna promoción esta semana?",
+    "¿Cuál es su número de teléfono?",
+    "¿Qué métodos de pago aceptan?",
+    "¿Me recomiendas algo para una boda?",
+    "¿Puedo devolver una prenda?",
+    "¿Dónde está mi pedido?",
+    "¿Atienden los domingos?",
+]
+
+
+def correr(app, flujo, conversaciones):
+    cliente = app.test_client()
+    tiempos = []
+    for n in range(conversaciones):
+        for tipo, segundos, _codigo, ok in conversar(cliente, flujo, n, consultas=CORPUS):
+            if tipo == 'consulta' and ok:
+                tiempos.append(segundos)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--conversaciones', type=int, default=20)
+    parser.add_argument('--latencia-media', type=float, default=1.0)
+    parser.add_argument('--latencia-desviacion', type=float, default=0.3)
+    args = parser.parse_args()
+
+    fake = FakeGenerativeModel(retardo_inicial=latencia('lognormal', args.latencia_media, args.latencia_desviacion))
+    modelo._gateway = ModelGateway(fake)
+    app = create_app({flujo: FLUJOS[flujo] for flujo in FLUJOS_TIENDA})
+
+    print(f"{'flujo':<14}{'modo':<10}{'consultas':>10}{'directas':>10}{'llamadas':>10}"
+          f"{'media ms':>10}{'p50 ms':>9}{'p95 ms':>9}{'directa µs':>12}")
+    for flujo in FLUJOS_TIENDA:
+        modulo = import_module(flujo)
+        directas = modulo.respuestas_directas
+        umbral = directas.umbral
+        for modo in ('modelo', 'directas'):
+            modulo.respuestas._entradas.clear()
+            directas.umbral = umbral if modo == 'directas' else float('inf')
+            antes_directas, antes_llamadas = directas.directas, fake.llamadas
+            tiempos = correr(app, flujo, args.conversaciones)
+            stats = directas.estadisticas()
+            cuantiles = statistics.quantiles(tiempos, n=20)
+            print(f"{flujo:<14}{modo:<10}{len(tiempos):>10}{stats['directas'] - antes_directas:>10}"
+                  f"{fake.llamadas - antes_llamadas:>10}{1000 * statistics.mean(tiempos):>10.1f}"
+                  f"{1000 * statistics.median(tiempos):>9.1f}{1000 * cuantiles[18]:>9.1f}"
+                  f"{stats['promedio_us']:>12.1f}")
+        directas.umbral = umbral
+
+
+if __name__ == '__main__':
+    main()
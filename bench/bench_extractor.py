@@ -0,0 +1,110 @@
+"""
+Turnos de conversación hasta llegar al chat activo y hasta la primera
+respuesta a la pregunta del cliente, con y sin el extractor local de datos
+(extractor_datos.py), sobre un corpus guionado de clientes que escriben sus
+datos de distintas formas: de a uno, todos juntos o mezclados con la
+pregunta.
+
+Uso: python -m bench.bench_extractor
+"""
+import os
+import statistics
+import time
+from importlib import import_module
+
+os.environ.setdefault('GOOGLE_API_KEY', 'fake')
+# Todas las peticiones salen de la misma IP: sin límites de frecuencia (ver limites.py)
+os.environ.setdefault('LIMITE_IP_RAFAGA', '0')
+os.environ.setdefault('LIMITE_SESION_RAFAGA', '0')
+
+import modelo  # noqa: E402
+from app import FLUJOS, create_app  # noqa: E402
+from bench.escenarios import persona  # noqa: E402
+from fake_gemini import FakeGenerativeModel  # noqa: E402
+from gateway import ModelGateway  # noqa: E402
+
+FLUJOS_DATOS = ('chat_isi', 'chat_simple', 'chat_complet')
+ESTADOS_ACTIVOS = ('chat_activo', 'conversando')
+MAX_TURNOS = 15
+
+# (apertura, respuestas a los pedidos de datos que difieren de dar solo el dato, pregunta)
+CORPUS = [
+    ("hola", {}, "¿Cuánto cuesta el blazer ejecutivo?"),
+    ("Hola, soy Ana Pérez, mi correo es ana@correo.com y mi celular 987654321. ¿Tienen blazers en talla M?",
+     {}, "¿Tienen blazers en talla M?"),
+    ("Hola, me llamo Luis Torres", {'email': "luis@correo.com, cel 912345678"}, "¿Qué jeans tienen?"),
+    ("buenas", {'nombre': "Carla Ríos, carla@correo.com, 955 111 222"}, "¿Hay promociones esta semana?"),
+    ("¿Cuánto cuestan los leggings deportivos?", {}, "¿Cuánto cuestan los leggings deportivos?"),
+    ("Soy Pedro Gómez, mi pedido PED-000045 no llega. Correo pedro@correo.com, celular 987-111-222",
+     {}, "mi pedido PED-000045 no llega"),
+    ("Hola", {'nombre': "María, 944333222"}, "¿Tienen camisetas blancas?"),
+    ("Quiero que me envíen a Av. Los Olivos 123, Lima. Soy Rosa Díaz, cel 988777666",
+     {}, "Quiero que me envíen a Av. Los Olivos 123, Lima"),
+]
+
+
+def recorrer(cliente, flujo, chat_sessions, n, guion, texto_modelo):
+    """(turnos hasta el chat activo, turnos hasta la respuesta a la pregunta)"""
+    apertura, respuestas, pregunta = guion
+    # Cada respuesta especial se da una vez; si no se acepta, el cliente repite solo el dato
+    respuestas = dict(respuestas)
+    datos = persona(n)
+    ruta = f"{FLUJOS[flujo]}/api/chat"
+    session_id, mensaje = None, apertura
+    preguntada = pregunta in apertura
+    activo = None
+    for turno in range(1, MAX_TURNOS + 1):
+        cuerpo = {'message': mensaje, **({'session_id': session_id} if session_id else {})}
+        respuesta = cliente.post(ruta, json=cuerpo).get_json()
+        session_id = respuesta.get('session_id', session_id)
+        sesion = chat_sessions.obtener(session_id) or {}
+        if activo is None and sesion.get('estado') in ESTADOS_ACTIVOS:
+            activo = turno
+        if preguntada and texto_modelo in (respuesta.get('response') or ''):
+            return activo, turno
+
+        esperando = respuesta.get('waiting_for')
+        if esperando:
+            mensaje = respuestas.pop(esperando, datos[esperando])
+        else:
+            mensaje, preguntada = pregunta, True
+    return activo, None
+
+
+def main():
+    fake = FakeGenerativeModel()
+    modelo._gateway = ModelGateway(fake)
+    app = create_app({flujo: FLUJOS[flujo] for flujo in FLUJOS_DATOS})
+    cliente = app.test_client()
+
+    print(f"{'flujo':<14}{'extractor':<11}{'turnos a activo':>16}{'turnos a respuesta':>20}{'extraer µs':>12}")
+    for flujo in FLUJOS_DATOS:
+        modulo = import_module(flujo)
+        modulo.respuestas_directas.umbral = float('inf')
+        maquina = getattr(modulo, 'maquina', None)
+        extractor = maquina.extraer if maquina else modulo.extractor
+        for activado in (False, True):
+            if maquina:
+                maquina.extraer = extractor if activado else None
+            else:
+                modulo.extractor = extractor if activado else (lambda mensaje, esperando=None: {})
+            activos, respuestas = [], []
+            for n, guion in enumerate(CORPUS):
+                modulo.respuestas._entradas.clear()
+                activo, respuesta = recorrer(cliente, flujo, modulo.chat_sessions, n, guion, fake.respuesta)
+                activos.append(activo or MAX_TURNOS)
+                respuestas.append(respuesta or MAX_TURNOS)
+            print(f"{flujo:<14}{'sí' if activado else 'no':<11}{statistics.mean(activos):>16.2f}"
+                  f"{statistics.mean(respuestas):>20.2f}", end='')
+            if activado:
+                inicio = time.perf_counter()
+                for _ in range(200):
+                    for apertura, _, _ in CORPUS:
+                        extractor(apertura, 'nombre')
+                print(f"{1e6 * (time.perf_counter() - inicio) / (200 * len(CORPUS)):>12.1f}")
+            else:
+                print()
+
+
+if __name__ == '__main__':
+    main()
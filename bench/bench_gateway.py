@@ -0,0 +1,65 @@
+"""
+Ejercita el ModelGateway contra el modelo falso con latencia y errores
+inyectados, y muestra sus métricas (espera en cola, latencia del modelo,
+reintentos, timeouts y estado del circuito).
+
+Uso: python -m bench.bench_gateway [--concurrencia 32] [--tasa-error 0.2]
+"""
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_gemini import FakeGenerativeModel
+from gateway import CircuitBreaker, GatewayError, ModelGateway
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--llamadas', type=int, default=200)
+    parser.add_argument('--concurrencia', type=int, default=32)
+    parser.add_argument('--max-en-vuelo', type=int, default=8)
+    parser.add_argument('--latencia', type=float, default=0.05)
+    parser.add_argument('--tasa-error', type=float, default=0.2)
+    parser.add_argument('--timeout', type=float, default=1.0)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    fake = FakeGenerativeModel(
+        retardo_inicial=lambda: rnd.expovariate(1 / args.latencia),
+        tasa_error=args.tasa_error, semilla=1
+    )
+    gateway = ModelGateway(
+        fake, max_en_vuelo=args.max_en_vuelo, timeout=args.timeout,
+        backoff_base=0.05, breaker=CircuitBreaker(umbral=10, enfriamiento=0.5)
+    )
+
+    def llamar(i):
+        try:
+            gateway.generate_content(f'pregunta {i}')
+            return 'ok'
+        except GatewayError:
+            return 'canned'
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrencia) as pool:
+        resultados = list(pool.map(llamar, range(args.llamadas)))
+    duracion = time.perf_counter() - inicio
+
+    print(f"ok={resultados.count('ok')} canned={resultados.count('canned')} "
+          f"duracion={duracion:.2f}s llamadas_al_modelo={fake.llamadas}")
+    print(json.dumps(gateway.estadisticas(), indent=2))
+
+    # Caída total del modelo: el circuito debe abrirse y responder sin esperar
+    fake.tasa_error = 1.0
+    for i in range(20):
+        llamar(i)
+    inicio = time.perf_counter()
+    llamar(0)
+    print(f"circuito={gateway.breaker.estado} respuesta_con_circuito_abierto="
+          f"{1000 * (time.perf_counter() - inicio):.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark del índice invertido del catálogo: tiempo de construcción y
+latencia de consulta con catálogos sintéticos de distinto tamaño.
+
+Uso: python -m bench.bench_indice [--tamanos 1000 10000 100000] [--consultas 500]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from indice_catalogo import IndiceCatalogo
+
+TIPOS = ['Camiseta', 'Polo', 'Jeans', 'Pantalón', 'Short', 'Vestido', 'Falda', 'Blazer',
+         'Casaca', 'Chompa', 'Leggings', 'Zapatillas', 'Botas', 'Gorra', 'Bufanda']
+ADJETIVOS = ['Básico', 'Clásico', 'Slim', 'Oversize', 'Deportivo', 'Ejecutivo', 'Urbano',
+             'Premium', 'Vintage', 'Térmico', 'Ligero', 'Elegante']
+CATEGORIAS = ['casual', 'deportiva', 'formal', 'invierno', 'verano', 'accesorios']
+COLORES = ['Blanco', 'Negro', 'Gris', 'Azul', 'Rojo', 'Verde', 'Rosa', 'Beige', 'Marrón']
+TALLAS = ['XS', 'S', 'M', 'L', 'XL', '28', '30', '32', '34', '36']
+MATERIALES = ['algodón', 'poliéster', 'lino', 'lana', 'denim', 'seda', 'cuero']
+
+
+def productos_sinteticos(cantidad, rnd):
+    return [
+        {
+            'id': f'P{i:06d}',
+            'nombre': f"{rnd.choice(TIPOS)} {rnd.choice(ADJETIVOS)} {i}",
+            'categoria': rnd.choice(CATEGORIAS),
+            'precio': round(rnd.uniform(20, 900), 2),
+            'tallas': rnd.sample(TALLAS, 4),
+            'colores': rnd.sample(COLORES, 3),
+            'descripcion': f"Prenda de {rnd.choice(MATERIALES)}, ideal para uso {rnd.choice(CATEGORIAS)}"
+        }
+        for i in range(cantidad)
+    ]
+
+
+def consultas_sinteticas(cantidad, rnd):
+    return [
+        f"¿Tienen {rnd.choice(TIPOS).lower()}s {rnd.choice(COLORES).lower()} "
+        f"en talla {rnd.choice(TALLAS)} de {rnd.choice(MATERIALES)}?"
+        for _ in range(cantidad)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--consultas', type=int, default=500)
+    parser.add_argument('--k', type=int, default=8)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    consultas = consultas_sinteticas(args.consultas, rnd)
+    print(f"{'productos':>10} {'build_s':>9} {'p50_ms':>8} {'p95_ms':>8} {'max_ms':>8}")
+    for tamano in args.tamanos:
+        productos = productos_sinteticos(tamano, rnd)
+        inicio = time.perf_counter()
+        indice = IndiceCatalogo(productos)
+        construccion = time.perf_counter() - inicio
+
+        latencias = []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            indice.buscar(consulta, args.k)
+            latencias.append(1000 * (time.perf_counter() - inicio))
+        latencias.sort()
+        print(f"{tamano:>10} {construccion:>9.3f} {statistics.median(latencias):>8.3f} "
+              f"{latencias[int(0.95 * len(latencias)) - 1]:>8.3f} {latencias[-1]:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
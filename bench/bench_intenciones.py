@@ -0,0 +1,69 @@
+"""
+Microbenchmark del clasificador de intenciones frente a la versión anterior
+de identificar_tipo_consulta (cinco búsquedas any(...) secuenciales).
+
+Uso: python -m bench.bench_intenciones [--mensajes 20000] [--extra 200]
+"""
+import argparse
+import random
+import time
+
+from intenciones import PALABRAS_CLAVE, ClasificadorIntenciones
+
+
+def identificar_tipo_consulta_anterior(mensaje, palabras_clave):
+    mensaje = mensaje.lower()
+    for tipo, palabras in palabras_clave.items():
+        if any(word in mensaje for word in palabras):
+            return tipo
+    return 'general'
+
+
+MENSAJES = [
+    "Hola, ¿cuánto cuesta la camiseta básica en talla M?",
+    "¿Tienen envios a provincia? quisiera saber cuanto demora la entrega",
+    "Quiero poner un reclamo, mi pedido llegó dañado",
+    "¿Hay alguna promocion o descuento esta semana?",
+    "Buenas tardes, quería saber el horario de atención de la tienda los domingos",
+    "Me interesan los jeans clásicos, ¿qué colores hay disponibles?",
+]
+
+
+def medir(funcion, mensajes):
+    inicio = time.perf_counter()
+    for mensaje in mensajes:
+        funcion(mensaje)
+    return 1e6 * (time.perf_counter() - inicio) / len(mensajes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mensajes', type=int, default=20000)
+    parser.add_argument('--extra', type=int, default=200,
+                        help='palabras clave sintéticas extra por intención')
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    mensajes = [rnd.choice(MENSAJES) for _ in range(args.mensajes)]
+
+    for extra in (0, args.extra):
+        palabras = {
+            tipo: lista + [f"{tipo}x{i}" for i in range(extra)]
+            for tipo, lista in PALABRAS_CLAVE.items()
+        }
+        clasificador = ClasificadorIntenciones(palabras)
+        anterior = medir(lambda m: identificar_tipo_consulta_anterior(m, palabras), mensajes)
+        nuevo = medir(clasificador.clasificar, mensajes)
+        total = sum(len(lista) for lista in palabras.values())
+        print(f"palabras={total:5d} anterior={anterior:7.2f} us/msg "
+              f"clasificador={nuevo:7.2f} us/msg  x{anterior / nuevo:.1f}")
+
+    clasificador = ClasificadorIntenciones()
+    print("\nEjemplos (anterior -> nuevo con puntajes):")
+    for mensaje in MENSAJES:
+        print(f"  {identificar_tipo_consulta_anterior(mensaje, PALABRAS_CLAVE):9s} -> "
+              f"{clasificador.puntajes(mensaje)}  {mensaje!r}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Serialización de historiales largos: json de Flask frente a json_rapido
+(orjson), bytes del cuerpo con cada compresión disponible, y
+/api/chat-history de chat_complet de punta a punta (200 comprimido y 304
+con If-None-Match).
+
+Uso: python -m bench.bench_json [--turnos 50,200,500] [--repeticiones 200]
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault('GOOGLE_API_KEY', 'fake')
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import json_rapido  # noqa: E402
+from app import create_app  # noqa: E402
+
+PALABRAS = (
+    "polo camiseta jeans blazer vestido leggings talla color azul negro blanco rojo precio envío "
+    "promoción descuento algodón tienda pedido cambio devolución Lima sábado tarjeta tenemos disponible "
+    "modelo clásico formal deportivo casual nuevo stock semana"
+).split()
+
+
+def turno(i, aleatorio):
+    """Un turno con texto distinto en cada uno, para que la compresión no sea irreal"""
+    return {
+        'timestamp': f'2024-05-01T12:{i // 60 % 60:02d}:{i % 60:02d}.{aleatorio.randrange(10 ** 6):06d}',
+        'message': ' '.join(aleatorio.choices(PALABRAS, k=10)) + '?',
+        'response': ' '.join(aleatorio.choices(PALABRAS, k=60)) + f'. Precio: ${aleatorio.uniform(10, 900):.2f}'
+    }
+
+
+DATOS_CLIENTE = {'nombre': 'Ana Pérez', 'email': 'ana@correo.com', 'celular': '912345678'}
+
+
+def medir(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return 1e6 * (time.perf_counter() - inicio) / repeticiones, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turnos', default='50,200,500')
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+    niveles = [int(n) for n in args.turnos.split(',')]
+    flask_json = DefaultJSONProvider(Flask(__name__))
+    aleatorio = random.Random(1)
+
+    print(f"orjson: {'sí' if json_rapido.orjson else 'no'}, compresiones: {', '.join(json_rapido.COMPRESORES)}\n")
+    print(f"{'turnos':>7}{'flask µs':>10}{'rápido µs':>11}{'flask B':>10}{'rápido B':>10}"
+          + "".join(f"{c + ' B':>10}{c + ' µs':>10}" for c in json_rapido.COMPRESORES))
+    for n in niveles:
+        datos = {
+            'status': 'success', 'history': [turno(i, aleatorio) for i in range(n)], 'total': n,
+            'cursor': 0, 'next_cursor': None, 'prev_cursor': None, 'collected_data': DATOS_CLIENTE
+        }
+        t_flask, cuerpo_flask = medir(lambda: flask_json.dumps(datos).encode('utf-8'), args.repeticiones)
+        t_rapido, cuerpo = medir(lambda: json_rapido.dumps(datos), args.repeticiones)
+        fila = f"{n:>7}{t_flask:>10.0f}{t_rapido:>11.0f}{len(cuerpo_flask):>10}{len(cuerpo):>10}"
+        for comprimir in json_rapido.COMPRESORES.values():
+            t, comprimido = medir(lambda: comprimir(cuerpo), args.repeticiones)
+            fila += f"{len(comprimido):>10}{t:>10.0f}"
+        print(fila)
+
+    # De punta a punta: una sesión con la conversación más larga
+    import chat_complet
+
+    app = create_app({'chat_complet': '/chat-complet'})
+    cliente = app.test_client()
+    n = max(niveles)
+    session_id = chat_complet.chat_sessions.crear_sesion({'estado': 'conversando', 'datos_cliente': DATOS_CLIENTE})
+    for i in range(n):
+        chat_complet.chat_sessions.agregar_historial(session_id, turno(i, aleatorio))
+    ruta = f'/chat-complet/api/chat-history?session_id={session_id}&limit={n}'
+
+    print(f"\n/api/chat-history con {n} turnos:")
+    for codificacion in ['identity', *json_rapido.COMPRESORES]:
+        t, respuesta = medir(lambda: cliente.get(ruta, headers={'Accept-Encoding': codificacion}), args.repeticiones)
+        print(f"  200 {codificacion:<9}{len(respuesta.data):>9} B {t:>9.0f} µs")
+    etag = respuesta.headers['ETag']
+    t, respuesta = medir(lambda: cliente.get(ruta, headers={'If-None-Match': etag}), args.repeticiones)
+    print(f"  {respuesta.status_code} sin cambios{len(respuesta.data):>7} B {t:>9.0f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Costo del paso de estado por mensaje: la revisión de datos faltantes como
+estaba (recorrer REQUIRED_DATA contra datos_cliente) frente a la máscara de
+bits de MaquinaEstados, y el costo de pausar/reanudar una sesión que pasa por
+un store externo (JSON ida y vuelta).
+
+Uso: python -m bench.bench_maquina [--repeticiones 200000]
+"""
+import argparse
+import json
+import time
+
+from chat_complet import FLUJO_CONSULTAS, REQUIRED_DATA
+from maquina_estados import MaquinaEstados
+
+
+def faltantes_lista(session, tipo_consulta):
+    if tipo_consulta not in REQUIRED_DATA:
+        return None
+    datos_cliente = session.get('datos_cliente', {})
+    faltantes = [dato for dato in REQUIRED_DATA[tipo_consulta]
+                 if dato not in datos_cliente or not datos_cliente[dato]]
+    return faltantes if faltantes else None
+
+
+def medir(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return 1e9 * (time.perf_counter() - inicio) / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeticiones', type=int, default=200000)
+    args = parser.parse_args()
+    n = args.repeticiones
+
+    maquina = MaquinaEstados(FLUJO_CONSULTAS)
+    sesion, _ = maquina.nueva_sesion()
+    for dato, valor in (('nombre', 'Ana'), ('email', 'ana@x.com')):
+        sesion['datos_cliente'][dato] = valor
+    sesion['maquina']['faltan'] &= ~maquina.mascara(['nombre', 'email'])
+    estado = sesion['maquina']
+
+    print(f"{'tipo':<12}{'lista ns':>10}{'máscara ns':>12}")
+    for tipo in ('general', 'precio', 'reclamo'):
+        assert (faltantes_lista(sesion, tipo) or []) == maquina.nombres(maquina._faltan_para(estado, tipo))
+        t_lista = medir(lambda: faltantes_lista(sesion, tipo), n)
+        t_mascara = medir(lambda: maquina._faltan_para(estado, tipo), n)
+        print(f"{tipo:<12}{t_lista:>10.0f}{t_mascara:>12.0f}")
+
+    guardada = json.dumps(sesion)
+    t_misma = medir(lambda: maquina.reanudar(json.loads(guardada)), n // 10)
+    legada = dict(json.loads(guardada))
+    del legada['maquina']
+    guardada_legada = json.dumps(legada)
+    t_legada = medir(lambda: maquina.reanudar(json.loads(guardada_legada)), n // 10)
+    t_json = medir(lambda: json.loads(guardada), n // 10)
+    print(f"\nsesión serializada: {len(guardada)} bytes (estado de la máquina: {len(json.dumps(estado))})")
+    print(f"reanudar (incluye json.loads {t_json:.0f} ns): misma firma {t_misma:.0f} ns, "
+          f"sesión sin estado de máquina {t_legada:.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
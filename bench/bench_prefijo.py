@@ -0,0 +1,69 @@
+"""
+Bytes de entrada por llamada al modelo con la parte fija del prompt
+(contexto.ContextoFijo) en tres modos, recorriendo conversaciones guionadas
+contra chat_isi y chat_complet:
+
+- todo en el turno: la parte fija pegada al prompt, como antes;
+- instrucción: como instrucción de sistema (lo que hace modelo.py sin
+  GEMINI_CACHE_CONTEXTO=1); el cliente de Gemini la reenvía en cada llamada;
+- CachedContent: registrada una sola vez (GEMINI_CACHE_CONTEXTO=1).
+
+Las consultas son únicas por conversación, así la caché de respuestas no
+evita llamadas, y las respuestas directas quedan apagadas.
+
+Uso: python -m bench.bench_prefijo [--conversaciones 20]
+"""
+import argparse
+import os
+from importlib import import_module
+
+os.environ.setdefault('GOOGLE_API_KEY', 'fake')
+# Todas las peticiones salen de la misma IP: sin límites de frecuencia (ver limites.py)
+os.environ.setdefault('LIMITE_IP_RAFAGA', '0')
+os.environ.setdefault('LIMITE_SESION_RAFAGA', '0')
+
+import modelo  # noqa: E402
+from app import FLUJOS, create_app  # noqa: E402
+from bench.escenarios import conversar  # noqa: E402
+from fake_gemini import FakeGenerativeModel  # noqa: E402
+from gateway import ModelGateway  # noqa: E402
+
+FLUJOS_PREFIJO = ('chat_isi', 'chat_complet')
+
+
+class SinRegistro:
+    """Modelo que no registra contextos: la parte fija viaja entera en cada llamada"""
+
+    def __init__(self, modelo):
+        self.modelo = modelo
+
+    def generate_content(self, prompt, contexto=None, **kwargs):
+        if contexto is not None:
+            prompt = contexto.texto + prompt
+        return self.modelo.generate_content(prompt, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--conversaciones', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app({flujo: FLUJOS[flujo] for flujo in FLUJOS_PREFIJO})
+    cliente = app.test_client()
+
+    print(f"{'flujo':<14}{'modo':<18}{'llamadas':>10}{'bytes/llamada':>15}{'contextos':>11}{'bytes fijos':>13}")
+    for flujo in FLUJOS_PREFIJO:
+        modulo = import_module(flujo)
+        modulo.respuestas_directas.umbral = float('inf')
+        for modo in ('todo en el turno', 'instrucción', 'CachedContent'):
+            modulo.respuestas._entradas.clear()
+            fake = FakeGenerativeModel(cachear_contexto=modo == 'CachedContent')
+            modelo._gateway = ModelGateway(SinRegistro(fake) if modo == 'todo en el turno' else fake)
+            for n in range(args.conversaciones):
+                conversar(cliente, flujo, n, unicas=True)
+            print(f"{flujo:<14}{modo:<18}{fake.llamadas:>10}{fake.bytes_turno / max(1, fake.llamadas):>15.0f}"
+                  f"{len(fake.contextos):>11}{fake.bytes_contexto:>13}")
+
+
+if __name__ == '__main__':
+    main()
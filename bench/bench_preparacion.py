@@ -0,0 +1,120 @@
+"""
+Primera petición después de arrancar un worker, con y sin calentamiento
+(preparacion.calentar), y costo de atender un preflight CORS con y sin el
+atajo de preparacion.preparar.
+
+Cada arranque corre en un intérprete nuevo, con el modelo falso: abrir su
+conexión tarda --conexion segundos (TLS, HTTP/2 y credenciales de Gemini)
+y responder --latencia segundos. La importación de google.generativeai se
+mide aparte, porque con el modelo falso no se importa.
+
+Uso: python -m bench.bench_preparacion [--repeticiones 5] [--conexion 0.3]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault('GOOGLE_API_KEY', 'fake')
+os.environ.setdefault('LIMITE_IP_RAFAGA', '0')
+os.environ.setdefault('LIMITE_SESION_RAFAGA', '0')
+
+# Corre en el intérprete nuevo: arranca la app, calienta o no, y mide dos consultas
+ARRANQUE = """
+import json, sys, time
+import modelo
+from fake_gemini import FakeGenerativeModel
+from gateway import ModelGateway
+modelo._gateway = ModelGateway(FakeGenerativeModel(retardo_inicial={latencia}, retardo_conexion={conexion}))
+from app import create_app
+from preparacion import calentar
+app = create_app()
+cliente = app.test_client()
+inicio = time.perf_counter()
+if {calentar}:
+    calentar(app)
+preparacion = time.perf_counter() - inicio
+
+def consulta(session_id, mensaje):
+    inicio = time.perf_counter()
+    respuesta = cliente.post('/chat-complet/api/chat', json={{'session_id': session_id, 'message': mensaje}}).get_json()
+    return time.perf_counter() - inicio, respuesta
+
+# Sesión con los datos ya pedidos, para que las dos consultas lleguen al modelo
+import chat_complet
+session_id = chat_complet.chat_sessions.crear_sesion({{
+    'estado': 'conversando', 'tienda': None,
+    'datos_cliente': {{'nombre': 'Ana', 'email': 'ana@correo.com', 'celular': '912345678'}}
+}})
+primera, _ = consulta(session_id, '¿Qué blazers tienen?')
+segunda, _ = consulta(session_id, '¿Tienen leggings negros?')
+print(json.dumps({{'preparacion': preparacion, 'primera': primera, 'segunda': segunda}}))
+"""
+
+PREFLIGHT = {
+    'Origin': 'https://tienda.ejemplo.com',
+    'Access-Control-Request-Method': 'POST',
+    'Access-Control-Request-Headers': 'content-type, x-tienda',
+}
+
+
+def arrancar(calentar, args):
+    codigo = ARRANQUE.format(calentar=calentar, latencia=args.latencia, conexion=args.conexion)
+    env = dict(os.environ, SESSION_STORE='memoria', HISTORIAL_DIR='')
+    salida = subprocess.run([sys.executable, '-W', 'ignore', '-c', codigo], capture_output=True, text=True,
+                            check=True, env=env)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def importar_genai():
+    salida = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c',
+         "import time; t = time.perf_counter(); import google.generativeai; print(time.perf_counter() - t)"],
+        capture_output=True, text=True
+    )
+    return float(salida.stdout.strip().splitlines()[-1]) if salida.returncode == 0 else None
+
+
+def medir_preflight(cliente, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        respuesta = cliente.options('/chat-complet/api/chat', headers=PREFLIGHT)
+    return 1e6 * (time.perf_counter() - inicio) / repeticiones, respuesta
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--conexion', type=float, default=0.3)
+    parser.add_argument('--latencia', type=float, default=0.05)
+    parser.add_argument('--preflights', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'arranque':<16}{'calentar ms':>12}{'1.ª consulta ms':>17}{'2.ª consulta ms':>17}")
+    for calentar in (False, True):
+        medidas = [arrancar(calentar, args) for _ in range(args.repeticiones)]
+        mediana = {clave: 1000 * statistics.median(m[clave] for m in medidas) for clave in medidas[0]}
+        print(f"{'con calentar' if calentar else 'sin calentar':<16}{mediana['preparacion']:>12.1f}"
+              f"{mediana['primera']:>17.1f}{mediana['segunda']:>17.1f}")
+    genai = importar_genai()
+    if genai is not None:
+        print(f"importar google.generativeai (lo hace calentar con el modelo real): {1000 * genai:.0f} ms")
+
+    # Preflight: con el atajo y sin él (pasando por métricas, tienda y la vista)
+    from app import create_app
+
+    app = create_app()
+    cliente = app.test_client()
+    con_atajo, respuesta = medir_preflight(cliente, args.preflights)
+    atajo = app.before_request_funcs[None].pop(0)
+    sin_atajo, _ = medir_preflight(cliente, args.preflights)
+    app.before_request_funcs[None].insert(0, atajo)
+    print(f"\npreflight OPTIONS: sin atajo {sin_atajo:.0f} µs, con atajo {con_atajo:.0f} µs "
+          f"(Access-Control-Max-Age: {respuesta.headers.get('Access-Control-Max-Age')})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Costo de obtener las promociones activas: recorrido lineal con strptime en
+cada pedido (como hacía formatear_contexto) frente a CalendarioPromociones.
+
+Uso: python -m bench.bench_promociones [--promociones 10,1000,100000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from cargador_catalogo import FORMATO_FECHA, Promocion
+from promociones import CalendarioPromociones
+
+
+def promociones_sinteticas(cantidad, semilla=1):
+    """Historial de promociones de pocos días, repartidas en varios años"""
+    aleatorio = random.Random(semilla)
+    base = datetime(2015, 1, 1)
+    registros = []
+    for i in range(cantidad):
+        inicio = base + timedelta(days=aleatorio.randrange(365 * 10))
+        fin = inicio + timedelta(days=aleatorio.randrange(1, 15))
+        registros.append({
+            'id': f'P{i}',
+            'descripcion': f'Promoción {i}',
+            'fecha_inicio': inicio.strftime(FORMATO_FECHA),
+            'fecha_fin': fin.strftime(FORMATO_FECHA)
+        })
+    return registros
+
+
+def lineal(registros, ahora):
+    return [
+        promo['descripcion']
+        for promo in registros
+        if datetime.strptime(promo['fecha_inicio'], FORMATO_FECHA) <= ahora
+        <= datetime.strptime(promo['fecha_fin'], FORMATO_FECHA)
+    ]
+
+
+def medir(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return 1e6 * (time.perf_counter() - inicio) / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--promociones', default='10,1000,100000')
+    args = parser.parse_args()
+
+    ahora = datetime(2020, 6, 15, 12, 0)
+    print(f"{'promociones':>12}{'lineal µs':>14}{'calendario µs':>15}{'construcción ms':>17}{'activas':>9}")
+    for n in (int(x) for x in args.promociones.split(',')):
+        registros = promociones_sinteticas(n)
+        inicio = time.perf_counter()
+        calendario = CalendarioPromociones([
+            Promocion(r['id'], r['descripcion'],
+                      datetime.strptime(r['fecha_inicio'], FORMATO_FECHA),
+                      datetime.strptime(r['fecha_fin'], FORMATO_FECHA))
+            for r in registros
+        ])
+        construccion = 1000 * (time.perf_counter() - inicio)
+
+        esperadas = lineal(registros, ahora)
+        assert [p.descripcion for p in calendario.activas(ahora)] == esperadas
+
+        repeticiones = max(3, 100000 // n)
+        t_lineal = medir(lambda: lineal(registros, ahora), repeticiones)
+        t_calendario = medir(lambda: calendario.activas(ahora), 10000)
+        print(f"{n:>12}{t_lineal:>14.1f}{t_calendario:>15.2f}{construccion:>17.1f}{len(esperadas):>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Mide el time-to-first-byte de /api/chat frente a /api/chat/stream usando el
+modelo falso (sin consumir cuota de la API).
+
+Uso: python -m bench.bench_streaming [--retardo-inicial 0.3] [--retardo-trozo 0.1]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('GOOGLE_API_KEY', 'fake')
+# Todas las peticiones salen de la misma IP: sin límites de frecuencia (ver limites.py)
+os.environ.setdefault('LIMITE_IP_RAFAGA', '0')
+os.environ.setdefault('LIMITE_SESION_RAFAGA', '0')
+
+from app import create_app  # noqa: E402
+import chat  # noqa: E402
+from fake_gemini import FakeGenerativeModel  # noqa: E402
+
+
+def medir(client, ruta, payload):
+    inicio = time.perf_counter()
+    response = client.post(ruta, json=payload, buffered=False)
+    iterador = iter(response.response)
+    next(iterador)
+    ttfb = time.perf_counter() - inicio
+    for _ in iterador:
+        pass
+    total = time.perf_counter() - inicio
+    response.close()
+    return ttfb, total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--retardo-inicial', type=float, default=0.3)
+    parser.add_argument('--retardo-trozo', type=float, default=0.1)
+    parser.add_argument('--trozos', type=int, default=10)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    chat.model = FakeGenerativeModel(
+        respuesta="Hola, soy el asistente de la tienda. " * 10,
+        trozos=args.trozos,
+        retardo_inicial=args.retardo_inicial,
+        retardo_trozo=args.retardo_trozo
+    )
+    client = create_app({'chat': ''}).test_client()
+
+    for ruta in ('/api/chat', '/api/chat/stream'):
+        ttfbs, totales = [], []
+        for i in range(args.repeticiones):
+            ttfb, total = medir(client, ruta, {'message': f'hola {i}'})
+            ttfbs.append(ttfb)
+            totales.append(total)
+        print(f"{ruta:20s} ttfb={1000 * sum(ttfbs) / len(ttfbs):8.1f} ms  "
+              f"total={1000 * sum(totales) / len(totales):8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
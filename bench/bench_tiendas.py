@@ -0,0 +1,109 @@
+"""
+Catálogos de muchas tiendas (tiendas.py): latencia de la primera petición de
+una tienda (lectura y formateo del catálogo) frente a las siguientes, y
+memoria en régimen con tráfico Zipf sobre todas las tiendas y el LRU acotado.
+
+Uso: python -m bench.bench_tiendas [--tiendas 1000] [--max-tiendas 200] [--peticiones 20000]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from tiendas import CatalogosTiendas
+
+CATEGORIAS = ["casual", "deportiva", "formal", "calzado", "accesorios"]
+MENSAJES = ["¿Tienen polos azules en talla M?", "Busco zapatillas para correr", "¿Qué vestidos formales hay?"]
+
+
+def generar(directorio, cantidad, semilla=1):
+    """Escribe `cantidad` catálogos de entre 20 y 400 productos"""
+    aleatorio = random.Random(semilla)
+    for t in range(cantidad):
+        productos = aleatorio.randint(20, 400)
+        catalogo = {
+            "info_general": {"nombre": f"Tienda {t}", "horario": "Lunes a Sábado 9:00-20:00",
+                             "metodos_pago": ["Tarjeta", "Débito"], "politica_devoluciones": "30 días"},
+            "categorias": {c: {"productos": []} for c in CATEGORIAS},
+            "promociones": [{"id": "P1", "descripcion": "20% en segunda prenda",
+                             "fecha_inicio": "2024-01-01", "fecha_fin": "2030-12-31"}]
+        }
+        for i in range(productos):
+            categoria = CATEGORIAS[i % len(CATEGORIAS)]
+            catalogo["categorias"][categoria]["productos"].append({
+                "id": f"T{t}-{i}", "nombre": f"Producto {categoria} {i}", "precio": round(aleatorio.uniform(10, 300), 2),
+                "tallas": ["S", "M", "L"], "colores": aleatorio.choice([["Azul", "Negro"], ["Rojo", "Blanco"]]),
+                "descripcion": f"Prenda {categoria} modelo {i} de la tienda {t}"
+            })
+        with open(os.path.join(directorio, f"t{t:04d}.json"), 'w', encoding='utf-8') as f:
+            json.dump(catalogo, f, ensure_ascii=False)
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def percentiles(tiempos):
+    cuantiles = statistics.quantiles(tiempos, n=100)
+    return 1000 * cuantiles[49], 1000 * cuantiles[94], 1000 * cuantiles[98]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tiendas', type=int, default=1000)
+    parser.add_argument('--max-tiendas', type=int, default=200)
+    parser.add_argument('--max-mb', type=float, default=256)
+    parser.add_argument('--peticiones', type=int, default=20000)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix='tiendas-')
+    try:
+        generar(directorio, args.tiendas)
+        rss_base = rss_mb()
+        tiendas = CatalogosTiendas(directorio, max_tiendas=args.max_tiendas, max_bytes=args.max_mb * 2 ** 20)
+        ids = [f"t{t:04d}" for t in range(args.tiendas)]
+        aleatorio = random.Random(2)
+
+        def peticion(tienda):
+            inicio = time.perf_counter()
+            tiendas.obtener(tienda).contexto_para(aleatorio.choice(MENSAJES))
+            return time.perf_counter() - inicio
+
+        # Primera petición de cada tienda (carga en frío) y una segunda enseguida (en caliente)
+        frias, calientes = [], []
+        for tienda in ids:
+            frias.append(peticion(tienda))
+            calientes.append(peticion(tienda))
+        print(f"{'':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        print(f"{'carga en frío':<22}" + "".join(f"{v:>9.2f}" for v in percentiles(frias)))
+        print(f"{'petición en caliente':<22}" + "".join(f"{v:>9.3f}" for v in percentiles(calientes)))
+
+        # Régimen: tráfico Zipf (pocas tiendas concentran casi todo)
+        pesos = [1 / (r + 1) ** args.zipf for r in range(args.tiendas)]
+        orden = ids[:]
+        aleatorio.shuffle(orden)
+        cargas_antes = tiendas.cargas
+        inicio = time.perf_counter()
+        tiempos = [peticion(t) for t in aleatorio.choices(orden, weights=pesos, k=args.peticiones)]
+        duracion = time.perf_counter() - inicio
+        stats = tiendas.estadisticas()
+        cargas = stats['cargas'] - cargas_antes
+        print(f"\nrégimen: {args.peticiones} peticiones Zipf({args.zipf}) sobre {args.tiendas} tiendas "
+              f"en {duracion:.1f} s")
+        print(f"  cargas en frío: {cargas} ({100 * cargas / args.peticiones:.1f}% de las peticiones), "
+              f"p50/p95/p99: " + "/".join(f"{v:.2f}" for v in percentiles(tiempos)) + " ms")
+        print(f"  tiendas en memoria: {stats['cargadas']} (máx. {args.max_tiendas}), "
+              f"memoria estimada: {stats['memoria_mb']:.1f} MB, "
+              f"RSS sobre la base: {rss_mb() - rss_base:.1f} MB, descartes: {stats['descartes']}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
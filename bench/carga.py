@@ -0,0 +1,172 @@
+"""
+Prueba de carga de los flujos de chat con el modelo falso detrás del gateway.
+
+Para cada nivel de concurrencia lanza conversaciones guionadas (ver
+bench/escenarios.py) en paralelo contra la app de create_app y reporta
+latencia p50/p95/p99 por turno, peticiones por segundo y crecimiento del RSS.
+Los resultados se guardan en JSON para comparar entre commits.
+
+Uso:
+    python -m bench.carga [--flujos chat_complet,chat_simple,chat_isi,chat]
+        [--concurrencia 1,8,32] [--conversaciones 200]
+        [--latencia lognormal] [--latencia-media 0.05] [--latencia-desviacion 0.02]
+        [--largo-respuesta 400] [--preguntas-unicas] [--salida bench_carga.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+os.environ.setdefault('GOOGLE_API_KEY', 'fake')
+# Todas las peticiones salen de la misma IP: sin límites de frecuencia (ver limites.py)
+os.environ.setdefault('LIMITE_IP_RAFAGA', '0')
+os.environ.setdefault('LIMITE_SESION_RAFAGA', '0')
+
+import modelo  # noqa: E402
+from app import FLUJOS, create_app  # noqa: E402
+from bench.escenarios import conversar  # noqa: E402
+from fake_gemini import FakeGenerativeModel, latencia  # noqa: E402
+from gateway import ModelGateway  # noqa: E402
+
+
+def rss_mb():
+    """RSS actual del proceso en MB (pico si no hay /proc)"""
+    try:
+        with open('/proc/self/statm') as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 2 ** 20 if sys.platform == 'darwin' else pico / 1024
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+def resumen_latencias(segundos):
+    ordenados = sorted(segundos)
+    return {
+        'cantidad': len(ordenados),
+        'p50_ms': round(1000 * percentil(ordenados, 50), 2),
+        'p95_ms': round(1000 * percentil(ordenados, 95), 2),
+        'p99_ms': round(1000 * percentil(ordenados, 99), 2),
+        'max_ms': round(1000 * ordenados[-1], 2) if ordenados else 0.0,
+    }
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def correr_nivel(app, flujo, concurrencia, conversaciones, unicas, desplazamiento):
+    """Ejecuta `conversaciones` conversaciones de `flujo` con `concurrencia` hilos"""
+
+    def trabajador(numeros):
+        cliente = app.test_client()
+        return [turno for n in numeros for turno in conversar(cliente, flujo, n, unicas)]
+
+    # Cada hilo recorre conversaciones distintas, con su propio cliente
+    numeros = range(desplazamiento, desplazamiento + conversaciones)
+    grupos = [numeros[i::concurrencia] for i in range(concurrencia)]
+
+    rss_inicial = rss_mb()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        turnos = [turno for lote in pool.map(trabajador, grupos) for turno in lote]
+    duracion = time.perf_counter() - inicio
+    rss_final = rss_mb()
+
+    por_tipo = {}
+    for tipo, segundos, _, _ in turnos:
+        por_tipo.setdefault(tipo, []).append(segundos)
+
+    return {
+        'flujo': flujo,
+        'concurrencia': concurrencia,
+        'conversaciones': conversaciones,
+        'peticiones': len(turnos),
+        'errores': sum(1 for *_, ok in turnos if not ok),
+        'duracion_s': round(duracion, 3),
+        'rps': round(len(turnos) / duracion, 1) if duracion else 0.0,
+        'latencia': resumen_latencias([segundos for _, segundos, _, _ in turnos]),
+        'latencia_por_tipo': {tipo: resumen_latencias(valores) for tipo, valores in sorted(por_tipo.items())},
+        'rss_inicial_mb': round(rss_inicial, 1),
+        'rss_final_mb': round(rss_final, 1),
+        'rss_crecimiento_mb': round(rss_final - rss_inicial, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--flujos', default=','.join(FLUJOS))
+    parser.add_argument('--concurrencia', default='1,8,32')
+    parser.add_argument('--conversaciones', type=int, default=200)
+    parser.add_argument('--latencia', default='lognormal',
+                        choices=['constante', 'uniforme', 'normal', 'lognormal', 'exponencial'])
+    parser.add_argument('--latencia-media', type=float, default=0.05)
+    parser.add_argument('--latencia-desviacion', type=float, default=0.02)
+    parser.add_argument('--largo-respuesta', type=int, default=400)
+    parser.add_argument('--max-en-vuelo', type=int, default=32)
+    parser.add_argument('--preguntas-unicas', action='store_true',
+                        help='consultas distintas en cada conversación, para no usar la caché de respuestas')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--salida', default='bench_carga.json')
+    args = parser.parse_args()
+
+    flujos = [f for f in args.flujos.split(',') if f]
+    niveles = [int(c) for c in args.concurrencia.split(',') if c]
+
+    fake = FakeGenerativeModel(
+        retardo_inicial=latencia(args.latencia, args.latencia_media, args.latencia_desviacion, args.semilla),
+        largo_respuesta=args.largo_respuesta,
+        semilla=args.semilla
+    )
+    # Todos los flujos usan el gateway compartido de modelo.py
+    modelo._gateway = ModelGateway(fake, max_en_vuelo=args.max_en_vuelo)
+    app = create_app({flujo: FLUJOS[flujo] for flujo in flujos})
+
+    rss_arranque = rss_mb()
+    resultados = []
+    desplazamiento = 0
+    print(f"{'flujo':<14}{'conc':>6}{'pet':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'err':>6}{'ΔRSS MB':>10}")
+    for flujo in flujos:
+        for concurrencia in niveles:
+            r = correr_nivel(app, flujo, concurrencia, args.conversaciones, args.preguntas_unicas, desplazamiento)
+            desplazamiento += args.conversaciones
+            resultados.append(r)
+            lat = r['latencia']
+            print(f"{flujo:<14}{concurrencia:>6}{r['peticiones']:>8}{r['rps']:>9.1f}{lat['p50_ms']:>9.2f}"
+                  f"{lat['p95_ms']:>9.2f}{lat['p99_ms']:>9.2f}{r['errores']:>6}{r['rss_crecimiento_mb']:>10.1f}")
+
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_actual(),
+        'python': platform.python_version(),
+        'parametros': vars(args),
+        'rss_arranque_mb': round(rss_arranque, 1),
+        'rss_final_mb': round(rss_mb(), 1),
+        'llamadas_modelo': fake.llamadas,
+        'resultados': resultados,
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"Resultados guardados en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Conversaciones guionadas para los benchmarks de carga.
+
+Cada conversación saluda, entrega los datos que el flujo pida (nombre, email,
+celular, ...) según el campo `waiting_for` de la respuesta y luego hace sus
+consultas. Así el mismo guion recorre las máquinas de estado de todos los
+flujos: nombre → email → celular → chat en chat_simple, solo el nombre en
+chat_isi y los datos que exija cada tipo de consulta en chat_complet.
+"""
+import time
+
+from app import FLUJOS
+
+PREGUNTAS = [
+    "¿Cuánto cuesta el polo básico?",
+    "¿Tienen jeans en talla 32?",
+    "¿Hay alguna promoción esta semana?",
+    "¿Cuál es el horario de atención?",
+]
+
+# Turnos permitidos además de las consultas (saludo y datos), por si un flujo nunca deja de pedir datos
+MAX_TURNOS = 20
+
+
+def persona(n):
+    """Datos válidos y distintos para la conversación número `n`"""
+    return {
+        'nombre': f"Cliente {n}",
+        'email': f"cliente{n}@correo.com",
+        'celular': f"9{n % 100000000:08d}",
+        'direccion': f"Av. Los Olivos {n}, Lima",
+        'numero_pedido': f"PED-{n:06d}",
+    }
+
+
+def preguntas(n, unicas=False):
+    """Consultas de la conversación `n`; con `unicas` no se repiten entre conversaciones"""
+    if not unicas:
+        return list(PREGUNTAS)
+    return [f"{pregunta} (consulta {n})" for pregunta in PREGUNTAS]
+
+
+def conversar(cliente, flujo, n, unicas=False, consultas=None):
+    """
+    Recorre una conversación completa contra `flujo` (montado por create_app),
+    con las consultas de `preguntas(n, unicas)` o las de `consultas`.
+
+    Devuelve la lista de turnos [(tipo, segundos, codigo_http, ok)], con
+    tipo 'saludo', 'dato' o 'consulta'.
+    """
+    ruta = f"{FLUJOS[flujo]}/api/chat"
+    datos = persona(n)
+    pendientes = list(consultas) if consultas is not None else preguntas(n, unicas)
+    limite = MAX_TURNOS + len(pendientes)
+    session_id = None
+    mensaje, tipo = "hola", 'saludo'
+    turnos = []
+
+    while len(turnos) < limite:
+        cuerpo = {'message': mensaje}
+        if session_id:
+            cuerpo['session_id'] = session_id
+
+        inicio = time.perf_counter()
+        response = cliente.post(ruta, json=cuerpo)
+        segundos = time.perf_counter() - inicio
+
+        respuesta = response.get_json(silent=True) or {}
+        ok = response.status_code < 400 and respuesta.get('status') == 'success'
+        turnos.append((tipo, segundos, response.status_code, ok))
+        if not ok:
+            break
+
+        session_id = respuesta.get('session_id', session_id)
+        esperando = respuesta.get('waiting_for')
+        if esperando:
+            mensaje, tipo = datos.get(esperando, f"dato {esperando}"), 'dato'
+        elif pendientes:
+            mensaje, tipo = pendientes.pop(0), 'consulta'
+        else:
+            break
+
+    return turnos
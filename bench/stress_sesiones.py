@@ -0,0 +1,77 @@
+"""
+Prueba de estrés de la creación de sesiones: abre miles de sesiones en
+paralelo (hilos y procesos) y verifica que ningún id se repita ni se pise.
+
+Uso: python -m bench.stress_sesiones [--sesiones 5000] [--hilos 64] [--procesos 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from sesiones import MemoriaStore, SQLiteStore
+
+
+def abrir_sesiones(store, cantidad, hilos):
+    def abrir(i):
+        return store.crear_sesion({'estado': 'pidiendo_nombre', 'n': i})
+
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        return list(pool.map(abrir, range(cantidad)))
+
+
+def verificar(store, ids, nombre, duracion):
+    duplicados = len(ids) - len(set(ids))
+    pisadas = sum(1 for i, session_id in enumerate(ids) if store.obtener(session_id)['n'] != i)
+    print(f"{nombre:28s} sesiones={len(ids):6d} duplicados={duplicados} "
+          f"pisadas={pisadas} {len(ids) / duracion:10.0f} sesiones/s")
+    return duplicados == 0 and pisadas == 0
+
+
+def _worker_sqlite(ruta, cantidad, hilos):
+    return abrir_sesiones(SQLiteStore(ruta), cantidad, hilos)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sesiones', type=int, default=5000)
+    parser.add_argument('--hilos', type=int, default=64)
+    parser.add_argument('--procesos', type=int, default=4)
+    args = parser.parse_args()
+    ok = True
+
+    store = MemoriaStore(max_sesiones=args.sesiones * 2)
+    inicio = time.perf_counter()
+    ids = abrir_sesiones(store, args.sesiones, args.hilos)
+    ok &= verificar(store, ids, 'memoria (hilos)', time.perf_counter() - inicio)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'sesiones.db')
+        por_proceso = args.sesiones // args.procesos
+        inicio = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+            futuros = [
+                pool.submit(_worker_sqlite, ruta, por_proceso, args.hilos // args.procesos or 1)
+                for _ in range(args.procesos)
+            ]
+            ids = [session_id for futuro in futuros for session_id in futuro.result()]
+        duracion = time.perf_counter() - inicio
+
+        store = SQLiteStore(ruta)
+        # Cada proceso numera sus sesiones desde 0; se verifica por bloques
+        duplicados = len(ids) - len(set(ids))
+        pisadas = sum(
+            1 for i, session_id in enumerate(ids)
+            if store.obtener(session_id)['n'] != i % por_proceso
+        )
+        print(f"{'sqlite (' + str(args.procesos) + ' procesos)':28s} sesiones={len(ids):6d} "
+              f"duplicados={duplicados} pisadas={pisadas} {len(ids) / duracion:10.0f} sesiones/s")
+        ok &= duplicados == 0 and pisadas == 0
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
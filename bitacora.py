@@ -0,0 +1,460 @@
+import atexit
+import bisect
+import fcntl
+import os
+import threading
+import time
+from array import array
+
+from json_rapido import dumps, loads
+
+# Cada turno se ubica con (segmento << _BITS_OFFSET) | offset, en un array('Q')
+_BITS_OFFSET = 40
+_MASCARA_OFFSET = (1 << _BITS_OFFSET) - 1
+
+PREFIJO_SEGMENTO = 'segmento-'
+# El mismo valor por defecto que el TTL de sesiones.py (que importa este módulo)
+TTL_SESIONES = 60 * 60 * 24
+EXTENSION_SEGMENTO = '.jsonl'
+
+
+def _linea(datos):
+    return dumps(datos) + b'\n'
+
+
+def _segmento(posicion):
+    return posicion >> _BITS_OFFSET
+
+
+class BitacoraConversaciones:
+    """
+    Historial de conversaciones durable, en segmentos JSONL de solo-agregado.
+
+    Cada turno se agrega como una línea {"s": sesión, "t": turno} al segmento
+    activo. Las escrituras se juntan en memoria y se vuelcan (con fsync) cada
+    `flush_cada` turnos o cada `intervalo_flush` segundos, no en cada turno.
+
+    En memoria solo se guarda un índice por sesión con la ubicación de cada
+    turno (8 + 4 bytes por turno), así leer una página cuesta lo mismo sin
+    importar lo larga que sea la conversación. Al arrancar, el índice se
+    reconstruye leyendo los segmentos.
+
+    Un hilo de fondo compacta los segmentos cerrados: los reescribe en uno
+    solo sin las sesiones eliminadas ni los turnos fuera de `max_turnos`, con
+    los turnos de cada sesión contiguos. Con `ttl`, antes elimina las sesiones
+    sin turnos ni lecturas en ese tiempo (como el TTL del store de sesiones),
+    así el índice y los segmentos no crecen sin límite.
+    """
+
+    def __init__(self, directorio, max_bytes_segmento=64 * 2 ** 20, flush_cada=64,
+                 intervalo_flush=1.0, fsync=True, max_turnos=None,
+                 compactar_desde=4, intervalo_compactacion=60.0, hilo_fondo=True, ttl=None):
+        self.directorio = directorio
+        self.max_bytes_segmento = max_bytes_segmento
+        self.flush_cada = flush_cada
+        self.intervalo_flush = intervalo_flush
+        self.fsync = fsync
+        self.max_turnos = max_turnos
+        self.compactar_desde = compactar_desde
+        self.intervalo_compactacion = intervalo_compactacion
+        self.ttl = ttl
+
+        self._lock = threading.RLock()
+        self._lock_compactacion = threading.Lock()
+        # sesión -> (posiciones array('Q'), largos array('I'))
+        self._indice = {}
+        # sesión -> turnos registrados (no baja al recortar por max_turnos)
+        self._agregados = {}
+        # sesión -> último uso (time.monotonic), para vencer las inactivas
+        self._uso = {}
+        self._lectores = {}
+        self._por_cerrar = []
+        self._pendientes = []
+        self._bytes_muertos = 0
+        self._cerrada = False
+
+        self.flushes = 0
+        self.compactaciones = 0
+        self.vencidas = 0
+
+        os.makedirs(directorio, exist_ok=True)
+        # Un solo proceso escribe en cada directorio; si ya está tomado lanza BlockingIOError
+        self._bloqueo = open(os.path.join(directorio, '.lock'), 'w')
+        try:
+            fcntl.flock(self._bloqueo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._bloqueo.close()
+            raise
+        self._segmentos = self._cargar()
+        # Al arrancar no se sabe cuándo se usó cada sesión: todas tienen un ttl completo
+        ahora = time.monotonic()
+        self._uso = dict.fromkeys(self._indice, ahora)
+        if not self._segmentos or self._tam_segmento(self._segmentos[-1]) >= max_bytes_segmento:
+            self._segmentos.append(self._segmentos[-1] + 1 if self._segmentos else 1)
+        self._activo = self._segmentos[-1]
+        self._archivo = open(self._ruta(self._activo), 'ab')
+        self._tam_activo = self._archivo.tell()
+        self._en_disco = self._tam_activo
+
+        self._detener = threading.Event()
+        self._hilo = None
+        if hilo_fondo:
+            self._hilo = threading.Thread(target=self._fondo, name='bitacora', daemon=True)
+            self._hilo.start()
+
+    # --- Archivos -----------------------------------------------------------
+
+    def _ruta(self, segmento, sufijo=''):
+        return os.path.join(self.directorio, f"{PREFIJO_SEGMENTO}{segmento:08d}{EXTENSION_SEGMENTO}{sufijo}")
+
+    def _tam_segmento(self, segmento):
+        return os.path.getsize(self._ruta(segmento))
+
+    def _lector(self, segmento):
+        fd = self._lectores.get(segmento)
+        if fd is None:
+            fd = self._lectores[segmento] = os.open(self._ruta(segmento), os.O_RDONLY)
+        return fd
+
+    def _listar_segmentos(self):
+        segmentos = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.startswith(PREFIJO_SEGMENTO) and nombre.endswith(EXTENSION_SEGMENTO):
+                segmentos.append(int(nombre[len(PREFIJO_SEGMENTO):-len(EXTENSION_SEGMENTO)]))
+            elif nombre.endswith('.compactando'):
+                # Compactación interrumpida: los segmentos originales siguen intactos
+                os.remove(os.path.join(self.directorio, nombre))
+        return sorted(segmentos)
+
+    def _cargar(self):
+        """Reconstruye el índice leyendo todos los segmentos en orden"""
+        segmentos = self._listar_segmentos()
+        reemplazados = set()
+        for segmento in segmentos:
+            if segmento in reemplazados:
+                continue
+            ruta = self._ruta(segmento)
+            offset = 0
+            with open(ruta, 'rb') as archivo:
+                for linea in archivo:
+                    try:
+                        registro = loads(linea) if linea.endswith(b'\n') else None
+                    except ValueError:
+                        registro = None
+                    if registro is None:
+                        # Línea incompleta de una caída: se descarta el resto del segmento
+                        break
+                    if 'compacta' in registro:
+                        # Cabecera de un segmento compactado: reemplaza a los que lista
+                        reemplazados.update(s for s in registro['compacta'] if s != segmento)
+                    elif registro.get('x'):
+                        self._indice.pop(registro['s'], None)
+                        self._agregados.pop(registro['s'], None)
+                    else:
+                        self._registrar(registro['s'], (segmento << _BITS_OFFSET) | offset, len(linea))
+                    offset += len(linea)
+            if offset < os.path.getsize(ruta):
+                with open(ruta, 'r+b') as archivo:
+                    archivo.truncate(offset)
+
+        # Si la compactación se cortó antes de borrar los segmentos reemplazados
+        for segmento in reemplazados:
+            if segmento in segmentos:
+                os.remove(self._ruta(segmento))
+        return [s for s in segmentos if s not in reemplazados]
+
+    # --- Escritura ----------------------------------------------------------
+
+    def _registrar(self, clave, posicion, largo):
+        entrada = self._indice.get(clave)
+        if entrada is None:
+            entrada = self._indice[clave] = (array('Q'), array('I'))
+        posiciones, largos = entrada
+        posiciones.append(posicion)
+        largos.append(largo)
+        self._agregados[clave] = self._agregados.get(clave, 0) + 1
+        if self.max_turnos and len(posiciones) > self.max_turnos + max(16, self.max_turnos // 8):
+            # Se recorta de a bloques para no mover el array en cada turno
+            sobran = len(posiciones) - self.max_turnos
+            self._bytes_muertos += sum(largos[:sobran])
+            del posiciones[:sobran]
+            del largos[:sobran]
+
+    def _volcar(self):
+        """Escribe los turnos pendientes en el segmento activo (con el lock tomado)"""
+        if not self._pendientes:
+            return
+        self._archivo.write(b''.join(self._pendientes))
+        self._archivo.flush()
+        if self.fsync:
+            os.fsync(self._archivo.fileno())
+        self._pendientes = []
+        self._en_disco = self._tam_activo
+        self.flushes += 1
+
+    def _rotar(self):
+        self._volcar()
+        self._archivo.close()
+        self._activo += 1
+        self._segmentos.append(self._activo)
+        self._archivo = open(self._ruta(self._activo), 'ab')
+        self._tam_activo = self._en_disco = 0
+
+    def _agregar_linea(self, linea):
+        if self._tam_activo and self._tam_activo + len(linea) > self.max_bytes_segmento:
+            self._rotar()
+        posicion = (self._activo << _BITS_OFFSET) | self._tam_activo
+        self._pendientes.append(linea)
+        self._tam_activo += len(linea)
+        if len(self._pendientes) >= self.flush_cada:
+            self._volcar()
+        return posicion
+
+    def agregar(self, clave, turno):
+        linea = _linea({'s': clave, 't': turno})
+        with self._lock:
+            self._registrar(clave, self._agregar_linea(linea), len(linea))
+            self._uso[clave] = time.monotonic()
+
+    def eliminar(self, clave):
+        with self._lock:
+            self._uso.pop(clave, None)
+            self._agregados.pop(clave, None)
+            entrada = self._indice.pop(clave, None)
+            if entrada is not None:
+                self._bytes_muertos += sum(entrada[1])
+                self._agregar_linea(_linea({'s': clave, 'x': 1}))
+
+    def flush(self):
+        with self._lock:
+            self._volcar()
+
+    def purgar_vencidas(self, ahora=None):
+        """Elimina las sesiones sin uso en `ttl` segundos; devuelve cuántas"""
+        if not self.ttl:
+            return 0
+        limite = (time.monotonic() if ahora is None else ahora) - self.ttl
+        with self._lock:
+            vencidas = [clave for clave, uso in self._uso.items() if uso <= limite]
+            for clave in vencidas:
+                self.eliminar(clave)
+            self.vencidas += len(vencidas)
+        return len(vencidas)
+
+    # --- Lectura ------------------------------------------------------------
+
+    def _visibles(self, posiciones):
+        """Índice del primer turno visible (los anteriores ya quedaron fuera de max_turnos)"""
+        if self.max_turnos and len(posiciones) > self.max_turnos:
+            return len(posiciones) - self.max_turnos
+        return 0
+
+    def cantidad(self, clave):
+        with self._lock:
+            entrada = self._indice.get(clave)
+            if entrada is None:
+                return 0
+            return len(entrada[0]) - self._visibles(entrada[0])
+
+    def rango(self, clave, inicio, fin):
+        """Turnos [inicio, fin) de la sesión, del más viejo al más nuevo"""
+        with self._lock:
+            entrada = self._indice.get(clave)
+            if entrada is None:
+                return []
+            desde = self._visibles(entrada[0])
+            posiciones = entrada[0][desde + max(0, inicio):desde + max(0, fin)]
+            largos = entrada[1][desde + max(0, inicio):desde + max(0, fin)]
+            if not posiciones:
+                return []
+            self._uso[clave] = time.monotonic()
+            # Los turnos que siguen en memoria se escriben antes de leerlos
+            ultima = posiciones[-1]
+            if _segmento(ultima) == self._activo and (ultima & _MASCARA_OFFSET) >= self._en_disco:
+                self._volcar()
+            lectores = {s: self._lector(s) for s in {_segmento(p) for p in posiciones}}
+
+        turnos = []
+        for posicion, largo in zip(posiciones, largos):
+            datos = os.pread(lectores[_segmento(posicion)], largo, posicion & _MASCARA_OFFSET)
+            turnos.append(loads(datos)['t'])
+        return turnos
+
+    def version(self, clave):
+        """
+        Cambia con cada turno agregado, también cuando `max_turnos` deja fija la
+        cantidad: la posición del último turno (las nuevas siempre van al final
+        del segmento activo) junto con los turnos registrados desde que se abrió.
+        """
+        with self._lock:
+            entrada = self._indice.get(clave)
+            if entrada is None:
+                return None
+            return self._agregados.get(clave, 0), entrada[0][-1]
+
+    def ultimos(self, clave, cantidad=None):
+        total = self.cantidad(clave)
+        return self.rango(clave, 0 if cantidad is None else total - cantidad, total)
+
+    # --- Compactación -------------------------------------------------------
+
+    def necesita_compactar(self):
+        with self._lock:
+            sellados = self._segmentos[:-1]
+            if len(sellados) >= self.compactar_desde:
+                return True
+            bytes_sellados = sum(self._tam_segmento(s) for s in sellados)
+            return bool(sellados) and self._bytes_muertos > bytes_sellados // 2
+
+    def compactar(self):
+        """
+        Reescribe los segmentos cerrados en uno solo, sin los turnos muertos.
+
+        La copia se hace fuera del lock (los segmentos cerrados no cambian);
+        solo la toma de la foto del índice y el cambio final lo bloquean.
+        """
+        with self._lock_compactacion:
+            with self._lock:
+                sellados = self._segmentos[:-1]
+                if not sellados:
+                    return False
+                limite = self._activo << _BITS_OFFSET
+                foto = {}
+                for clave, (posiciones, largos) in self._indice.items():
+                    # Las posiciones crecen con el tiempo: los turnos sellados son un prefijo
+                    k = bisect.bisect_left(posiciones, limite)
+                    if k:
+                        foto[clave] = (posiciones[:k], largos[:k])
+                lectores = {s: self._lector(s) for s in sellados}
+
+            destino = sellados[0]
+            temporal = self._ruta(destino, '.compactando')
+            nuevas = {}
+            with open(temporal, 'wb') as salida:
+                offset = salida.write(_linea({'compacta': sellados}))
+                for clave, (posiciones, largos) in foto.items():
+                    nuevas_posiciones = array('Q')
+                    for posicion, largo in zip(posiciones, largos):
+                        salida.write(os.pread(lectores[_segmento(posicion)], largo, posicion & _MASCARA_OFFSET))
+                        nuevas_posiciones.append((destino << _BITS_OFFSET) | offset)
+                        offset += largo
+                    nuevas[clave] = nuevas_posiciones
+                salida.flush()
+                os.fsync(salida.fileno())
+
+            with self._lock:
+                for clave, nuevas_posiciones in nuevas.items():
+                    entrada = self._indice.get(clave)
+                    if entrada is None:
+                        continue
+                    posiciones, largos = entrada
+                    # Mientras se copiaba pudieron recortarse turnos viejos (solo del inicio)
+                    k = bisect.bisect_left(posiciones, limite)
+                    posiciones[:k] = nuevas_posiciones[len(nuevas_posiciones) - k:]
+                os.replace(temporal, self._ruta(destino))
+                for segmento in sellados:
+                    fd = self._lectores.pop(segmento, None)
+                    if fd is not None:
+                        # Puede haber lecturas en curso con este descriptor: se cierra en la próxima
+                        self._por_cerrar.append(fd)
+                self._segmentos = [destino] + self._segmentos[len(sellados):]
+                self._bytes_muertos = 0
+
+            for segmento in sellados[1:]:
+                os.remove(self._ruta(segmento))
+            self.compactaciones += 1
+            return True
+
+    def _cerrar_viejos(self):
+        with self._lock:
+            viejos, self._por_cerrar = self._por_cerrar, []
+        for fd in viejos:
+            os.close(fd)
+
+    def _fondo(self):
+        ultima_compactacion = time.monotonic()
+        while not self._detener.wait(self.intervalo_flush):
+            self.flush()
+            if time.monotonic() - ultima_compactacion >= self.intervalo_compactacion:
+                ultima_compactacion = time.monotonic()
+                self._cerrar_viejos()
+                self.purgar_vencidas()
+                if self.necesita_compactar():
+                    self.compactar()
+
+    def cerrar(self):
+        if self._cerrada:
+            return
+        self._cerrada = True
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+        with self._lock:
+            self._volcar()
+            self._archivo.close()
+            for fd in list(self._lectores.values()) + self._por_cerrar:
+                os.close(fd)
+            self._lectores.clear()
+            self._por_cerrar = []
+        self._bloqueo.close()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'sesiones': len(self._indice),
+                'turnos': sum(len(p) for p, _ in self._indice.values()),
+                'segmentos': len(self._segmentos),
+                'pendientes': len(self._pendientes),
+                'bytes_muertos': self._bytes_muertos,
+                'flushes': self.flushes,
+                'compactaciones': self.compactaciones,
+                'vencidas': self.vencidas
+            }
+
+
+def crear_bitacora():
+    """
+    Crea la bitácora configurada en las variables de entorno: HISTORIAL_DIR
+    (sin definir o vacío, el historial queda en el store de sesiones),
+    HISTORIAL_FLUSH_CADA, HISTORIAL_FLUSH_INTERVALO y HISTORIAL_MAX_TURNOS.
+    Las sesiones vencen con el mismo SESSION_TTL que el store.
+
+    El índice vive en la memoria de un solo proceso, así que la bitácora es
+    para despliegues de un proceso (WEB_CONCURRENCY=1, o asgi.py). Con varios
+    workers el historial tiene que ir en el store compartido: si el directorio
+    ya lo tomó otro proceso se lanza RuntimeError en lugar de repartir el
+    historial de una sesión entre workers.
+    """
+    directorio = os.getenv('HISTORIAL_DIR', '')
+    if not directorio:
+        return None
+    try:
+        bitacora = BitacoraConversaciones(
+            directorio,
+            flush_cada=int(os.getenv('HISTORIAL_FLUSH_CADA', 64)),
+            intervalo_flush=float(os.getenv('HISTORIAL_FLUSH_INTERVALO', 1.0)),
+            max_turnos=int(os.getenv('HISTORIAL_MAX_TURNOS', 0)) or None,
+            ttl=float(os.getenv('SESSION_TTL', TTL_SESIONES))
+        )
+    except BlockingIOError:
+        raise RuntimeError(
+            f"HISTORIAL_DIR={directorio} está en uso por otro proceso: la bitácora es de un solo "
+            "proceso; con varios workers dejar HISTORIAL_DIR vacío"
+        ) from None
+    atexit.register(bitacora.cerrar)
+    return bitacora
+
+
+_lock_compartida = threading.Lock()
+_bitacora_compartida = None
+_resuelta = False
+
+
+def obtener_bitacora():
+    """Devuelve la bitácora del proceso (o None si está desactivada), creada en el primer uso"""
+    global _bitacora_compartida, _resuelta
+    with _lock_compartida:
+        if not _resuelta:
+            _bitacora_compartida = crear_bitacora()
+            _resuelta = True
+        return _bitacora_compartida
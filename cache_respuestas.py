@@ -0,0 +1,128 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from texto import normalizar
+
+
+def version_datos(datos):
+    """Hash corto de los datos de la tienda, para invalidar respuestas viejas"""
+    if not isinstance(datos, str):
+        datos = json.dumps(datos, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(datos.encode('utf-8')).hexdigest()[:16]
+
+
+def marcador(campo):
+    """Texto que reemplaza un dato personal en el prompt de una respuesta cacheable"""
+    return f"[[{campo}]]"
+
+
+_MARCADOR = re.compile(r"\[\[\w+\]\]")
+
+
+class CacheRespuestas:
+    """
+    Caché LRU+TTL de respuestas del modelo para preguntas frecuentes.
+
+    La clave es (pregunta normalizada, tipo de consulta, versión de los datos,
+    datos personales presentes). Los datos personales (nombre, email, ...) se
+    envían al modelo como marcadores y se sustituyen después de la búsqueda,
+    así una misma respuesta sirve para todos los clientes que tienen esos
+    mismos datos.
+    """
+
+    def __init__(self, max_entradas=1000, ttl=60 * 60, no_cachear=('reclamo',)):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.no_cachear = set(no_cachear)
+        self._lock = threading.Lock()
+        # clave -> (expira, texto, segundos que costó generarlo)
+        self._entradas = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.omitidas = 0
+        self.segundos_ahorrados = 0.0
+
+    def _buscar(self, clave, ahora):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[0] <= ahora:
+                self._entradas.pop(clave, None)
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            self.segundos_ahorrados += entrada[2]
+            return entrada[1]
+
+    def _guardar(self, clave, texto, costo, ahora):
+        with self._lock:
+            self._entradas[clave] = (ahora + self.ttl, texto, costo)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def _preparar(self, pregunta, tipo_consulta, version, personales):
+        """Devuelve (clave, marcadores); la clave es None si el tipo no se cachea"""
+        # Solo los datos que el cliente tiene: una respuesta que nombra su email no sirve a quien no lo dio
+        marcadores = {campo: marcador(campo) for campo, valor in personales.items() if valor}
+        if tipo_consulta in self.no_cachear:
+            with self._lock:
+                self.omitidas += 1
+            return None, marcadores
+        return (normalizar(pregunta), tipo_consulta, version, tuple(sorted(marcadores))), marcadores
+
+    @staticmethod
+    def _personalizar(texto, marcadores, personales):
+        for campo, marca in marcadores.items():
+            texto = texto.replace(marca, str(personales[campo]))
+        # Un marcador que el modelo inventó o copió de otro campo no llega al cliente
+        return _MARCADOR.sub('', texto)
+
+    def responder(self, pregunta, tipo_consulta, version, generar, personales=None):
+        """
+        Devuelve la respuesta cacheada o llama a `generar(marcadores)`.
+
+        `generar` recibe un dict campo -> marcador y debe armar el prompt con
+        esos marcadores en lugar de los datos reales del cliente.
+        """
+        personales = personales or {}
+        clave, marcadores = self._preparar(pregunta, tipo_consulta, version, personales)
+        if clave is None:
+            return generar(dict(personales))
+
+        texto = self._buscar(clave, time.monotonic())
+        if texto is None:
+            inicio = time.perf_counter()
+            texto = generar(marcadores)
+            self._guardar(clave, texto, time.perf_counter() - inicio, time.monotonic())
+        return self._personalizar(texto, marcadores, personales)
+
+    async def responder_async(self, pregunta, tipo_consulta, version, generar, personales=None):
+        """Como `responder`, pero `generar(marcadores)` es una corrutina"""
+        personales = personales or {}
+        clave, marcadores = self._preparar(pregunta, tipo_consulta, version, personales)
+        if clave is None:
+            return await generar(dict(personales))
+
+        texto = self._buscar(clave, time.monotonic())
+        if texto is None:
+            inicio = time.perf_counter()
+            texto = await generar(marcadores)
+            self._guardar(clave, texto, time.perf_counter() - inicio, time.monotonic())
+        return self._personalizar(texto, marcadores, personales)
+
+    def estadisticas(self):
+        consultas = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'omitidas': self.omitidas,
+            'hit_ratio': round(self.hits / consultas, 4) if consultas else 0.0,
+            'segundos_ahorrados': round(self.segundos_ahorrados, 3),
+            'entradas': len(self._entradas)
+        }
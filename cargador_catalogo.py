@@ -0,0 +1,358 @@
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from promociones import CalendarioPromociones
+
+FORMATO_FECHA = '%Y-%m-%d'
+TAM_BLOQUE = 1 << 20
+
+_ESPACIOS = re.compile(r'[ \t\n\r]*')
+
+
+class CatalogoInvalido(ValueError):
+    """El archivo no es un catálogo legible (JSON roto o estructura inesperada)"""
+
+
+@dataclass(slots=True)
+class ErrorRegistro:
+    """Un registro que no cumple el esquema; `ruta` indica dónde está en el JSON"""
+    ruta: str
+    problemas: list
+
+    def __str__(self):
+        return f"{self.ruta}: {'; '.join(self.problemas)}"
+
+
+@dataclass(slots=True)
+class Producto:
+    id: str
+    nombre: str
+    precio: float
+    tallas: tuple
+    colores: tuple
+    descripcion: str
+    categoria: str
+
+    def a_dict(self):
+        return {
+            'id': self.id, 'nombre': self.nombre, 'precio': self.precio,
+            'tallas': list(self.tallas), 'colores': list(self.colores),
+            'descripcion': self.descripcion, 'categoria': self.categoria
+        }
+
+
+@dataclass(slots=True)
+class Promocion:
+    id: str
+    descripcion: str
+    inicio: datetime
+    fin: datetime
+    # Vacías: la promoción es general
+    categorias: tuple = ()
+    productos: tuple = ()
+
+
+@dataclass(slots=True)
+class Catalogo:
+    """store_data.json cargado y validado"""
+    info: dict = field(default_factory=dict)
+    # categoría -> productos, en el orden del archivo
+    categorias: dict = field(default_factory=dict)
+    promociones: list = field(default_factory=list)
+    # Otras secciones del archivo (p. ej. envios), tal cual
+    extra: dict = field(default_factory=dict)
+    errores: list = field(default_factory=list)
+    calendario: CalendarioPromociones = None
+
+    @property
+    def productos(self):
+        return [producto for productos in self.categorias.values() for producto in productos]
+
+
+class _LectorJSON:
+    """
+    Recorre un documento JSON por partes, leyendo el archivo en bloques.
+
+    Los objetos y listas del esqueleto se recorren con `claves` y `elementos`;
+    cada hoja (un producto, una promoción) se decodifica entera con
+    JSONDecoder.raw_decode. Lo ya leído se descarta del buffer, así la memoria
+    no depende del tamaño del archivo.
+    """
+
+    def __init__(self, archivo, tam_bloque=TAM_BLOQUE):
+        self._archivo = archivo
+        self._tam_bloque = tam_bloque
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._descartados = 0
+        self._eof = False
+
+    @property
+    def posicion(self):
+        return self._descartados + self._pos
+
+    def _leer_mas(self, minimo=0):
+        if self._eof:
+            return False
+        bloque = self._archivo.read(max(self._tam_bloque, minimo))
+        if not bloque:
+            self._eof = True
+            return False
+        self._descartados += self._pos
+        self._buf = self._buf[self._pos:] + bloque
+        self._pos = 0
+        return True
+
+    def _siguiente(self):
+        """Siguiente carácter significativo, sin consumirlo ('' al final)"""
+        while True:
+            self._pos = _ESPACIOS.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._leer_mas():
+                return ''
+
+    def _error(self, mensaje):
+        return CatalogoInvalido(f"{mensaje} (carácter {self.posicion})")
+
+    def _esperar(self, caracter):
+        if self._siguiente() != caracter:
+            raise self._error(f"Se esperaba '{caracter}'")
+        self._pos += 1
+
+    def valor(self):
+        """Decodifica el próximo valor completo"""
+        self._siguiente()
+        while True:
+            try:
+                valor, fin = self._decoder.raw_decode(self._buf, self._pos)
+                # Un número al final del buffer podría seguir en el próximo bloque
+                if fin < len(self._buf) or self._eof:
+                    self._pos = fin
+                    return valor
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise self._error(f"JSON inválido: {e.msg}") from e
+            # El valor no entra en el buffer: se lee al menos otro tanto para no reintentar de a poco
+            self._leer_mas(len(self._buf) - self._pos)
+
+    def claves(self):
+        """Recorre un objeto; después de cada clave el llamador debe consumir su valor"""
+        self._esperar('{')
+        if self._siguiente() == '}':
+            self._pos += 1
+            return
+        while True:
+            if self._siguiente() != '"':
+                raise self._error("Se esperaba una clave")
+            clave = self.valor()
+            self._esperar(':')
+            yield clave
+            caracter = self._siguiente()
+            self._pos += 1
+            if caracter == '}':
+                return
+            if caracter != ',':
+                raise self._error("Se esperaba ',' o '}'")
+
+    def elementos(self):
+        """Recorre una lista; por cada índice el llamador debe consumir el elemento"""
+        self._esperar('[')
+        if self._siguiente() == ']':
+            self._pos += 1
+            return
+        i = 0
+        while True:
+            yield i
+            i += 1
+            caracter = self._siguiente()
+            self._pos += 1
+            if caracter == ']':
+                return
+            if caracter != ',':
+                raise self._error("Se esperaba ',' o ']'")
+
+    def terminar(self):
+        if self._siguiente() != '':
+            raise self._error("Contenido de más después del catálogo")
+
+
+# --- Esquema ------------------------------------------------------------------
+
+def _es_texto(valor, vacio=False):
+    return isinstance(valor, str) and (vacio or bool(valor.strip()))
+
+
+def _es_lista_textos(valor):
+    return isinstance(valor, list) and all(isinstance(v, str) for v in valor)
+
+
+def _es_numero(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+def _revisar(registro, reglas):
+    """Devuelve la lista de problemas de `registro` según `reglas` (campo -> (chequeo, descripción))"""
+    if not isinstance(registro, dict):
+        return [f"se esperaba un objeto, no {type(registro).__name__}"]
+    problemas = []
+    for campo, (chequeo, descripcion) in reglas.items():
+        if campo not in registro:
+            problemas.append(f"falta '{campo}'")
+        elif not chequeo(registro[campo]):
+            problemas.append(f"'{campo}' debe ser {descripcion}")
+    return problemas
+
+
+REGLAS_PRODUCTO = {
+    'nombre': (_es_texto, 'un texto no vacío'),
+    'precio': (lambda v: _es_numero(v) and v >= 0, 'un número mayor o igual a 0'),
+    'tallas': (_es_lista_textos, 'una lista de textos'),
+    'colores': (_es_lista_textos, 'una lista de textos'),
+    'descripcion': (lambda v: _es_texto(v, vacio=True), 'un texto'),
+}
+
+REGLAS_INFO = {
+    'nombre': (_es_texto, 'un texto no vacío'),
+    'horario': (_es_texto, 'un texto no vacío'),
+    'metodos_pago': (_es_lista_textos, 'una lista de textos'),
+    'politica_devoluciones': (lambda v: _es_texto(v, vacio=True), 'un texto'),
+}
+
+
+def _es_fecha(valor):
+    try:
+        datetime.strptime(valor, FORMATO_FECHA)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+REGLAS_PROMOCION = {
+    'descripcion': (_es_texto, 'un texto no vacío'),
+    'fecha_inicio': (_es_fecha, 'una fecha AAAA-MM-DD'),
+    'fecha_fin': (_es_fecha, 'una fecha AAAA-MM-DD'),
+}
+
+# Campos opcionales: a qué categorías o ids de producto se limita la promoción
+REGLAS_ALCANCE_PROMOCION = {
+    'categorias': (_es_lista_textos, 'una lista de textos'),
+    'productos': (_es_lista_textos, 'una lista de textos'),
+}
+
+INFO_POR_DEFECTO = {'nombre': '', 'horario': '', 'metodos_pago': [], 'politica_devoluciones': ''}
+
+
+class _Compartidos:
+    """Reutiliza textos y tuplas repetidos (tallas, colores) entre productos"""
+
+    def __init__(self):
+        self._tuplas = {}
+
+    def tupla(self, valores):
+        tupla = tuple(sys.intern(v) for v in valores)
+        return self._tuplas.setdefault(tupla, tupla)
+
+
+def _producto(registro, categoria, ruta, errores, compartidos):
+    problemas = _revisar(registro, REGLAS_PRODUCTO)
+    if problemas:
+        errores.append(ErrorRegistro(ruta, problemas))
+        return None
+    return Producto(
+        id=str(registro.get('id', '')),
+        nombre=registro['nombre'],
+        precio=registro['precio'],
+        tallas=compartidos.tupla(registro['tallas']),
+        colores=compartidos.tupla(registro['colores']),
+        descripcion=registro['descripcion'],
+        categoria=categoria
+    )
+
+
+def _promocion(registro, ruta, errores):
+    problemas = _revisar(registro, REGLAS_PROMOCION)
+    if not problemas:
+        alcance = {campo: regla for campo, regla in REGLAS_ALCANCE_PROMOCION.items() if campo in registro}
+        problemas = _revisar(registro, alcance)
+    if problemas:
+        errores.append(ErrorRegistro(ruta, problemas))
+        return None
+    inicio = datetime.strptime(registro['fecha_inicio'], FORMATO_FECHA)
+    fin = datetime.strptime(registro['fecha_fin'], FORMATO_FECHA)
+    if fin < inicio:
+        errores.append(ErrorRegistro(ruta, ["'fecha_fin' es anterior a 'fecha_inicio'"]))
+        return None
+    return Promocion(
+        str(registro.get('id', '')), registro['descripcion'], inicio, fin,
+        categorias=tuple(registro.get('categorias', ())),
+        productos=tuple(registro.get('productos', ()))
+    )
+
+
+def _info(registro, errores):
+    problemas = _revisar(registro, REGLAS_INFO)
+    if problemas:
+        errores.append(ErrorRegistro('info_general', problemas))
+    if not isinstance(registro, dict):
+        return dict(INFO_POR_DEFECTO)
+    # Los campos inválidos se reemplazan por valores vacíos para poder seguir formateando
+    return {
+        **registro,
+        **{campo: INFO_POR_DEFECTO[campo] for campo, (chequeo, _) in REGLAS_INFO.items()
+           if campo not in registro or not chequeo(registro[campo])}
+    }
+
+
+def cargar_catalogo(ruta, tam_bloque=TAM_BLOQUE):
+    """
+    Lee store_data.json producto por producto, validando cada registro.
+
+    Los registros que no cumplen el esquema se descartan y quedan todos en
+    `Catalogo.errores`; solo un JSON roto o una estructura inesperada lanzan
+    CatalogoInvalido.
+    """
+    catalogo = Catalogo()
+    errores = catalogo.errores
+    compartidos = _Compartidos()
+    secciones = set()
+
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        lector = _LectorJSON(archivo, tam_bloque)
+        for seccion in lector.claves():
+            secciones.add(seccion)
+            if seccion == 'categorias':
+                for categoria in lector.claves():
+                    categoria = sys.intern(categoria)
+                    productos = catalogo.categorias.setdefault(categoria, [])
+                    for campo in lector.claves():
+                        if campo != 'productos':
+                            lector.valor()
+                            continue
+                        for i in lector.elementos():
+                            producto = _producto(
+                                lector.valor(), categoria, f"categorias.{categoria}.productos[{i}]",
+                                errores, compartidos
+                            )
+                            if producto is not None:
+                                productos.append(producto)
+            elif seccion == 'promociones':
+                for i in lector.elementos():
+                    promocion = _promocion(lector.valor(), f"promociones[{i}]", errores)
+                    if promocion is not None:
+                        catalogo.promociones.append(promocion)
+            elif seccion == 'info_general':
+                catalogo.info = _info(lector.valor(), errores)
+            else:
+                catalogo.extra[seccion] = lector.valor()
+        lector.terminar()
+
+    if 'info_general' not in secciones:
+        errores.append(ErrorRegistro('info_general', ["falta la sección"]))
+        catalogo.info = dict(INFO_POR_DEFECTO)
+    catalogo.calendario = CalendarioPromociones(catalogo.promociones)
+    return catalogo
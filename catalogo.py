@@ -0,0 +1,241 @@
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+
+from cargador_catalogo import CatalogoInvalido, cargar_catalogo
+from indice_catalogo import IndiceCatalogo
+
+logger = logging.getLogger(__name__)
+
+# Cantidad de productos relevantes que se incluyen en el prompt
+TOP_K_PRODUCTOS = int(os.getenv('CATALOGO_TOP_K', 8))
+
+def formatear_info(datos):
+    """Formatea la información general de la tienda"""
+    info = datos.info
+    return "\n".join([
+        f"Tienda: {info['nombre']}",
+        f"Horario: {info['horario']}",
+        f"Métodos de pago: {', '.join(info['metodos_pago'])}",
+        f"Política de devoluciones: {info['politica_devoluciones']}"
+    ])
+
+
+def formatear_producto(producto):
+    return (
+        f"- {producto.nombre}: ${producto.precio}"
+        f"\n  Tallas: {', '.join(producto.tallas)}"
+        f"\n  Colores: {', '.join(producto.colores)}"
+        f"\n  {producto.descripcion}"
+    )
+
+
+def formatear_info_y_productos(datos):
+    """Formatea la parte estática del catálogo (información general y productos)"""
+    contexto = [formatear_info(datos)]
+
+    # Productos por categoría
+    for categoria, productos in datos.categorias.items():
+        contexto.append(f"\n{categoria.upper()}:")
+        for producto in productos:
+            contexto.append(formatear_producto(producto))
+
+    return "\n".join(contexto)
+
+
+def productos_catalogo(datos):
+    """Lista plana de productos (cada uno ya trae su categoría)"""
+    return datos.productos
+
+
+def describir_promocion(promo, nombres_producto=None):
+    """Descripción de la promoción, indicando a qué categorías o productos se limita"""
+    alcance = []
+    if promo.categorias:
+        alcance.append(f"categorías: {', '.join(promo.categorias)}")
+    if promo.productos:
+        nombres_producto = nombres_producto or {}
+        alcance.append(f"productos: {', '.join(nombres_producto.get(p, p) for p in promo.productos)}")
+    if not alcance:
+        return promo.descripcion
+    return f"{promo.descripcion} ({'; '.join(alcance)})"
+
+
+def formatear_promociones(descripciones):
+    """Formatea la lista de promociones activas"""
+    if not descripciones:
+        return ""
+    return "\n".join(["\nPromociones actuales:"] + [f"- {d}" for d in descripciones])
+
+
+class CatalogoCache:
+    """
+    Mantiene store_data.json parseado y formateado en memoria.
+
+    El archivo solo se vuelve a leer cuando cambia su mtime o su tamaño, y el
+    bloque de promociones solo se recalcula cuando alguna promoción empieza o
+    termina (el calendario de promociones indica exactamente cuándo). Los
+    registros inválidos se descartan y quedan en `errores`; si el archivo
+    nuevo está roto se sigue usando la última versión buena.
+    """
+
+    def __init__(self, ruta='store_data.json'):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._firma = None
+        self._datos = None
+        self._estatico = ""
+        self._info = ""
+        self._productos = []
+        self._textos_producto = []
+        self._indice = IndiceCatalogo([])
+        self._nombres_producto = {}
+        # nombre -> (datos con los que se calculó, valor); ver derivado()
+        self._derivados = {}
+        self._bloque_promociones = ""
+        self._contexto = None
+        # Ventana [desde, hasta) en la que el bloque de promociones es válido
+        self._desde = None
+        self._hasta = None
+        # Hash del contexto vigente; cambia con el archivo o con las promociones
+        self.version = None
+        self.errores = []
+
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _leer_firma(self):
+        st = os.stat(self.ruta)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _recargar(self, firma):
+        try:
+            datos = cargar_catalogo(self.ruta)
+        except CatalogoInvalido:
+            if self._datos is None:
+                raise
+            logger.exception("No se pudo recargar %s; se sigue usando la versión anterior", self.ruta)
+            self._firma = firma
+            return
+        for error in datos.errores:
+            logger.warning("Registro inválido en %s: %s", self.ruta, error)
+        self.errores = datos.errores
+        self._datos = datos
+        self._estatico = formatear_info_y_productos(datos)
+        self._info = formatear_info(datos)
+        self._productos = productos_catalogo(datos)
+        self._textos_producto = [formatear_producto(p) for p in self._productos]
+        self._indice = IndiceCatalogo(self._productos)
+        self._nombres_producto = {p.id: p.nombre for p in self._productos if p.id}
+        self._firma = firma
+        self._contexto = None
+        self.reloads += 1
+
+    def _recalcular_promociones(self, ahora):
+        calendario = self._datos.calendario
+        activas = calendario.activas(ahora)
+        desde, hasta = calendario.vigencia(ahora)
+
+        self._bloque_promociones = formatear_promociones(
+            [describir_promocion(promo, self._nombres_producto) for promo in activas]
+        )
+        self._contexto = self._estatico + self._bloque_promociones
+        self.version = hashlib.sha1(self._contexto.encode('utf-8')).hexdigest()[:16]
+        self._desde = desde
+        self._hasta = hasta
+
+    def datos(self):
+        """Devuelve los datos parseados, recargando si el archivo cambió"""
+        firma = self._leer_firma()
+        with self._lock:
+            if firma != self._firma:
+                self._recargar(firma)
+            return self._datos
+
+    def derivado(self, nombre, construir):
+        """`construir(datos)`, calculado una sola vez por versión del archivo"""
+        datos = self.datos()
+        with self._lock:
+            valor = self._derivados.get(nombre)
+            if valor is None or valor[0] is not datos:
+                valor = self._derivados[nombre] = (datos, construir(datos))
+            return valor[1]
+
+    def contexto(self, ahora=None):
+        """Devuelve el contexto formateado para el modelo"""
+        firma = self._leer_firma()
+        ahora = ahora or datetime.now()
+        with self._lock:
+            if firma != self._firma:
+                self._recargar(firma)
+
+            if self._contexto is not None and self._desde <= ahora < self._hasta:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._recalcular_promociones(ahora)
+            return self._contexto
+
+    def contexto_para(self, mensaje, k=TOP_K_PRODUCTOS, ahora=None):
+        """
+        Contexto con solo los `k` productos más relevantes para `mensaje`.
+
+        Si el catálogo tiene `k` productos o menos se devuelve completo.
+        """
+        completo = self.contexto(ahora)
+        with self._lock:
+            if len(self._productos) <= k:
+                return completo
+            indices = self._indice.buscar_indices(mensaje, k)
+            productos, textos = self._productos, self._textos_producto
+            info, nombres = self._info, self._nombres_producto
+            categorias = list(self._datos.categorias)
+            calendario = self._datos.calendario
+            ahora = ahora or datetime.now()
+
+        contexto = [info, f"Categorías: {', '.join(categorias)}"]
+        if indices:
+            # Se agrupan por categoría manteniendo el orden del catálogo
+            indices.sort()
+            categoria_actual = None
+            for i in indices:
+                if productos[i].categoria != categoria_actual:
+                    categoria_actual = productos[i].categoria
+                    contexto.append(f"\n{categoria_actual.upper()}:")
+                contexto.append(textos[i])
+        else:
+            contexto.append("\n(Ningún producto coincide con la consulta)")
+
+        # Promociones generales y las de las categorías y productos mostrados
+        promociones = calendario.activas_para(
+            ahora,
+            categorias={productos[i].categoria for i in indices},
+            productos=[productos[i].id for i in indices if productos[i].id]
+        )
+        bloque = formatear_promociones([describir_promocion(p, nombres) for p in promociones])
+        return "\n".join(contexto) + bloque
+
+    def estadisticas(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'registros_invalidos': len(self.errores),
+            'errores': [str(error) for error in self.errores[:10]],
+            'valido_hasta': self._hasta.isoformat() if self._hasta not in (None, datetime.max) else None
+        }
+
+
+_lock_catalogos = threading.Lock()
+_catalogos = {}
+
+
+def obtener_catalogo(ruta='store_data.json'):
+    """Devuelve la caché del catálogo de `ruta`, compartida por todos los flujos del proceso"""
+    with _lock_catalogos:
+        if ruta not in _catalogos:
+            _catalogos[ruta] = CatalogoCache(ruta)
+        return _catalogos[ruta]
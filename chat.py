@@ -1,25 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify
 from flask_cors import CORS
-import google.generativeai as genai
 from dotenv import load_dotenv
-import os
 from datetime import datetime
 
-# Inicialización
-app = Flask(__name__)
-CORS(app)
+from contexto import agregar_turno, estadisticas_prompt, nuevo_buffer, texto_buffer
+from gateway import GatewayError
+from limites import proteger
+from json_rapido import instalar_json, respuesta_json
+from metricas import etapa, instrumentar
+from modelo import modelo_compartido
+from sesiones import LIMITE_HISTORIAL, EspacioSesiones
+from streaming import quiere_stream, respuesta_sse
+
+# Rutas del flujo; create_app() en app.py las monta junto a los demás flujos
+bp = Blueprint('chat', __name__)
 
 # Cargar variables de entorno
 load_dotenv()
 
-# Configurar Gemini
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-model = genai.GenerativeModel('gemini-pro')
+# Gateway compartido de Gemini (concurrencia, plazos, reintentos y circuit breaker);
+# se crea en la primera llamada
+model = modelo_compartido
 
-# Almacenamiento simple para el historial
-chat_history = {}
+# Sesiones de este flujo dentro del store compartido (memoria, SQLite o Redis
+# según SESSION_STORE)
+chat_history = EspacioSesiones('chat')
 
-@app.route('/api/chat', methods=['POST'])
+@bp.route('/api/chat', methods=['POST'])
+@bp.route('/api/chat/stream', methods=['POST'])
+@proteger
 def chat():
     if not request.is_json:
         return jsonify({
@@ -35,22 +44,27 @@ def chat():
             'status': 'error'
         }), 400
 
+    if not isinstance(data['message'], str):
+        return jsonify({
+            'error': 'El campo "message" debe ser texto',
+            'status': 'error'
+        }), 400
+
     message = data['message']
     session_id = data.get('session_id')
 
+    session = chat_history.obtener(session_id) if session_id else None
+
     # Si no hay session_id o no existe en el historial, crear una nueva sesión
-    if not session_id or session_id not in chat_history:
-        session_id = f"session_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        chat_history[session_id] = []
+    if session is None:
+        session = {'contexto': nuevo_buffer()}
+        session_id = chat_history.crear_sesion(session)
 
     try:
-        # Construir el contexto con el historial reciente
-        context = "\n".join([
-            f"Usuario: {interaction['user']}\nAsistente: {interaction['assistant']}"
-            for interaction in chat_history[session_id][-5:]
-        ])
-
-        prompt = f"""
+        # Contexto con el historial reciente, mantenido turno a turno dentro del presupuesto
+        with etapa('prompt'):
+            context = texto_buffer(session['contexto'])
+            prompt = f"""
         Eres un asistente conversacional amigable y empático.
         
         Historial reciente de la conversación:
@@ -61,16 +75,26 @@ def chat():
         Responde de manera natural y amigable. Sé conciso pero útil.
         Mantén un tono conversacional agradable.
         """
-        
-        response = model.generate_content(prompt)
-        response_text = response.text
-
-        # Guardar en el historial
-        chat_history[session_id].append({
-            'user': message,
-            'assistant': response_text,
-            'timestamp': datetime.now().isoformat()
-        })
+        estadisticas_prompt.registrar('chat', prompt)
+
+        def guardar(response_text):
+            agregar_turno(session['contexto'], message, response_text)
+            chat_history.guardar(session_id, session)
+
+            # Guardar en el historial
+            chat_history.agregar_historial(session_id, {
+                'user': message,
+                'assistant': response_text,
+                'timestamp': datetime.now().isoformat()
+            })
+
+        if quiere_stream(request):
+            return respuesta_sse(model, prompt, guardar, {'session_id': session_id})
+
+        with etapa('modelo'):
+            response = model.generate_content(prompt)
+            response_text = response.text
+        guardar(response_text)
         
         return jsonify({
             'status': 'success',
@@ -78,13 +102,19 @@ def chat():
             'session_id': session_id
         })
         
+    except GatewayError as e:
+        return jsonify({
+            'error': e.respuesta,
+            'response': e.respuesta,
+            'status': 'error'
+        }), 503
     except Exception as e:
         return jsonify({
             'error': str(e),
             'status': 'error'
         }), 500
 
-@app.route('/api/chat-history', methods=['GET'])
+@bp.route('/api/chat-history', methods=['GET'])
 def get_chat_history():
     """Endpoint para ver el historial de chat"""
     session_id = request.args.get('session_id')
@@ -95,16 +125,25 @@ def get_chat_history():
             'status': 'error'
         }), 400
         
-    if session_id in chat_history:
-        return jsonify({
-            'status': 'success',
-            'history': chat_history[session_id]
-        })
+    if chat_history.existe(session_id):
+        # Paginado: ?cursor= (posición del primer turno) y ?limit=; sin cursor, los últimos turnos
+        cursor = request.args.get('cursor', type=int)
+        limite = request.args.get('limit', LIMITE_HISTORIAL, type=int)
+        # La versión del historial cambia con cada turno, aunque HISTORIAL_MAX_TURNOS deje fija la cantidad
+        return respuesta_json(
+            lambda: {'status': 'success', **chat_history.pagina_historial(session_id, cursor, limite)},
+            version=(session_id, chat_history.version_historial(session_id), cursor, limite)
+        )
         
     return jsonify({
         'status': 'error',
         'error': 'Sesión no encontrada'
     }), 404
 
+# App independiente para correr solo este flujo: python chat.py
 if __name__ == '__main__':
+    app = instalar_json(Flask(__name__))
+    CORS(app)
+    app.register_blueprint(bp)
+    instrumentar(app)
     app.run(debug=True)
\ No newline at end of file
@@ -1,14 +1,40 @@
-from flask import Flask, request, jsonify
-import google.generativeai as genai
-import json
+from flask import Blueprint, Flask, g, request, jsonify
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
 from dotenv import load_dotenv
 from flask_cors import CORS, cross_origin  # Importamos CORS y cross_origin
+import contextvars
 import os
 import re
 
-app = Flask(__name__)
-CORS(app, resources={
+from cache_respuestas import CacheRespuestas
+from catalogo import (
+    formatear_info_y_productos,
+    describir_promocion,
+    formatear_promociones,
+)
+from intenciones import identificar_tipo_consulta
+from limites import proteger
+from maquina_estados import Campo, Flujo, MaquinaEstados
+from contexto import MAX_CARACTERES_PROMPT, contexto_fijo, estadisticas_prompt, json_compacto, recortar
+from extractor_datos import ExtractorDatos
+from gateway import GatewayError
+from json_rapido import instalar_json, respuesta_json
+from metricas import contar_estado, contar_tipo_consulta, etapa, instrumentar, sumar_tiempos, tiempos_aparte
+from modelo import latencia_promedio_modelo, modelo_compartido
+from respuestas_directas import RespuestasDirectas, respuestas_de_tienda
+from sesiones import LIMITE_HISTORIAL, EspacioSesiones
+from streaming import quiere_stream, respuesta_sse
+from tiendas import (
+    CatalogoActual, TiendaDesconocida, crear_tiendas, resolver_tienda, restaurar_tienda, tienda_actual, usar_tienda
+)
+
+# Rutas del flujo; create_app() en app.py las monta junto a los demás flujos
+bp = Blueprint('chat_complet', __name__)
+
+# CORS de la app independiente de este flujo
+CORS_RESOURCES = {
     r"/api/*": {
         "origins": [
             "http://localhost",
@@ -21,14 +47,32 @@ CORS(app, resources={
         "methods": ["GET", "POST", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"]
     }
-})
+}
 load_dotenv()
 
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-model = genai.GenerativeModel('gemini-pro')
+# Gateway compartido de Gemini (concurrencia, plazos, reintentos y circuit breaker);
+# se crea en la primera llamada
+model = modelo_compartido
+
+# Sesiones de este flujo dentro del store compartido (memoria, SQLite o Redis
+# según SESSION_STORE)
+chat_sessions = EspacioSesiones('chat_complet')
+
+# Catálogos por tienda: store_data.json para la tienda por defecto y
+# tiendas/<tienda>.json para las demás, cargados al primer uso y en un LRU.
+# `catalogo` es siempre el de la tienda de la petición en curso.
+tiendas = crear_tiendas('store_data.json')
+catalogo = CatalogoActual(tiendas)
 
-# Almacenamiento de sesiones y estados
-chat_sessions = {}
+# Respuestas del modelo a preguntas frecuentes (los reclamos no se cachean)
+respuestas = CacheRespuestas(no_cachear=('reclamo',))
+
+# Respuestas sin el modelo para datos fijos; se arman con cada versión del catálogo
+respuestas_directas = RespuestasDirectas(latencia_modelo=latencia_promedio_modelo)
+
+# Límites del endpoint de procesamiento por lotes
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 500))
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', 8))
 
 # Define los datos requeridos para diferentes tipos de consultas
 REQUIRED_DATA = {
@@ -48,81 +92,261 @@ def validar_celular(celular):
     return re.match(patron, celular) is not None
 def cargar_datos():
     """Carga los datos del archivo JSON"""
-    with open('store_data.json', 'r', encoding='utf-8') as file:
-        return json.load(file)
+    return catalogo.datos()
 
 def formatear_contexto(datos):
     """Formatea los datos JSON en un contexto legible para el modelo"""
-    contexto = []
-    
-    # Información general
-    info = datos['info_general']
-    contexto.append(f"Tienda: {info['nombre']}")
-    contexto.append(f"Horario: {info['horario']}")
-    contexto.append(f"Métodos de pago: {', '.join(info['metodos_pago'])}")
-    contexto.append(f"Política de devoluciones: {info['politica_devoluciones']}")
-    
-    # Productos por categoría
-    for categoria, info in datos['categorias'].items():
-        contexto.append(f"\n{categoria.upper()}:")
-        for producto in info['productos']:
-            contexto.append(
-                f"- {producto['nombre']}: ${producto['precio']}"
-                f"\n  Tallas: {', '.join(producto['tallas'])}"
-                f"\n  Colores: {', '.join(producto['colores'])}"
-                f"\n  {producto['descripcion']}"
-            )
-    
-    # Promociones vigentes
-    fecha_actual = datetime.now()
-    promociones_activas = []
-    for promo in datos['promociones']:
-        fecha_inicio = datetime.strptime(promo['fecha_inicio'], '%Y-%m-%d')
-        fecha_fin = datetime.strptime(promo['fecha_fin'], '%Y-%m-%d')
-        if fecha_inicio <= fecha_actual <= fecha_fin:
-            promociones_activas.append(f"- {promo['descripcion']}")
-    
-    if promociones_activas:
-        contexto.append("\nPromociones actuales:")
-        contexto.extend(promociones_activas)
-    
-    return "\n".join(contexto)
-
-
-def identificar_tipo_consulta(mensaje):
-    """Identifica el tipo de consulta basado en palabras clave"""
-    mensaje = mensaje.lower()
-    if any(word in mensaje for word in ['precio', 'cuesta', 'valor']):
-        return 'precio'
-    elif any(word in mensaje for word in ['producto', 'artículo', 'tienen', 'stock']):
-        return 'producto'
-    elif any(word in mensaje for word in ['promoción', 'descuento', 'oferta']):
-        return 'promocion'
-    elif any(word in mensaje for word in ['envío', 'enviar', 'entrega', 'delivery']):
-        return 'envio'
-    elif any(word in mensaje for word in ['reclamo', 'queja', 'problema']):
-        return 'reclamo'
-    return 'general'
-
-def revisar_datos_faltantes(session_id, tipo_consulta):
+    contexto = formatear_info_y_productos(datos)
+
+    # Promociones vigentes, con el calendario armado al cargar el catálogo
+    promociones_activas = datos.calendario.activas(datetime.now())
+
+    return contexto + formatear_promociones([describir_promocion(p) for p in promociones_activas])
+
+
+# Lo que se reserva en el presupuesto del prompt para la parte del turno
+RESERVA_TURNO = 1200
+
+INSTRUCCIONES = """Eres un asistente virtual de tienda.
+Por favor, responde de manera amable y personalizada, usando solo la información proporcionada y usando el nombre del cliente
+Si te preguntan por algo que no está en los datos, indícalo amablemente, si no hay data no pongas esto [Tu nombre]."""
+
+# Parte fija cuando el catálogo es muy grande y va recortado en cada turno
+CONTEXTO_SOLO_INSTRUCCIONES = contexto_fijo('chat_complet', INSTRUCCIONES)
+
+def catalogo_en_contexto_fijo(ahora=None):
+    """Si el catálogo completo entra en el presupuesto del prompt, va en la parte fija"""
+    return len(catalogo.contexto(ahora)) + len(INSTRUCCIONES) + RESERVA_TURNO <= MAX_CARACTERES_PROMPT
+
+@lru_cache(maxsize=64)
+def _contexto_fijo_catalogo(completo):
+    return contexto_fijo('chat_complet', f"{INSTRUCCIONES}\n\nInformación de la tienda:\n{completo}")
+
+def contexto_fijo_tienda(ahora=None):
+    """
+    Parte fija del prompt: las instrucciones y, si entra, el catálogo completo.
+    Cambia solo con el catálogo (o las promociones vigentes), así que el modelo
+    la registra una vez por versión; cada turno manda solo sus datos.
+    """
+    if not catalogo_en_contexto_fijo(ahora):
+        return CONTEXTO_SOLO_INSTRUCCIONES
+    return _contexto_fijo_catalogo(catalogo.contexto(ahora))
+
+def contexto_turno(message, ahora=None):
+    """Productos relevantes para el mensaje; vacío si el catálogo ya va en la parte fija"""
+    if catalogo_en_contexto_fijo(ahora):
+        return ''
+    return catalogo.contexto_para(message, ahora=ahora)
+
+def generar_respuesta(prompt):
+    with etapa('modelo'):
+        return model.generate_content(prompt, contexto=contexto_fijo_tienda()).text
+
+def construir_prompt(datos_cliente, tipo_consulta, context, message):
+    with etapa('prompt'):
+        return _construir_prompt(datos_cliente, tipo_consulta, context, message)
+
+def _construir_prompt(datos_cliente, tipo_consulta, context, message):
+    """Parte del prompt propia del turno; instrucciones y catálogo van en contexto_fijo_tienda()"""
+    partes = [
+        f"Información del cliente: {json_compacto(datos_cliente)}",
+        f"Tipo de consulta identificada: {tipo_consulta}"
+    ]
+    if context:
+        # El catálogo es la única parte que se recorta si el prompt supera el presupuesto
+        fijo = len(INSTRUCCIONES) + len(message) + RESERVA_TURNO
+        partes.append(f"Información de la tienda:\n{recortar(context, max(0, MAX_CARACTERES_PROMPT - fijo))}")
+    partes.append(f"Mensaje del cliente: {message}")
+
+    prompt = "\n".join(partes)
+    estadisticas_prompt.registrar('chat_complet', prompt)
+    return prompt
+
+MENSAJES_SOLICITUD = {
+    'nombre': "Por favor, dime tu nombre:",
+    'email': "¿Me podrías proporcionar tu email?",
+    'celular': "Necesito tu número de celular (debe empezar con 9 y tener 9 dígitos):",
+    'direccion': "¿Podrías proporcionarme tu dirección de envío?",
+    'numero_pedido': "¿Me podrías proporcionar el número de pedido?"
+}
+
+VALIDACIONES = {
+    'email': (validar_email, "El formato del email no es válido. Por favor, ingresa un email válido."),
+    'celular': (validar_celular, "El número de celular debe tener 9 dígitos y empezar con 9. Por favor, intenta nuevamente.")
+}
+
+# Los datos se piden solo cuando la consulta los requiere; al completarlos se
+# responde la consulta que los hizo pedir
+FLUJO_CONSULTAS = Flujo(
+    nombre='chat_complet',
+    campos=tuple(
+        Campo(dato, pedir=mensaje, validar=VALIDACIONES.get(dato, (None, None))[0],
+              error=VALIDACIONES.get(dato, (None, None))[1])
+        for dato, mensaje in MENSAJES_SOLICITUD.items()
+    ),
+    requisitos=REQUIRED_DATA,
+    estado_pidiendo='recolectando_datos',
+    saludo="¡Hola! Para poder ayudarte mejor, ¿podrías decirme tu nombre?",
+    # Todos los datos reconocibles de cada mensaje se guardan de una vez
+    extraer=ExtractorDatos({'email': validar_email, 'celular': validar_celular})
+)
+maquina = MaquinaEstados(FLUJO_CONSULTAS)
+
+def revisar_datos_faltantes(session, tipo_consulta):
     """Revisa qué datos faltan para el tipo de consulta"""
-    if tipo_consulta not in REQUIRED_DATA:
+    return maquina.faltantes(session, tipo_consulta) or None
+
+def clasificar(message):
+    tipo_consulta = identificar_tipo_consulta(message)
+    contar_tipo_consulta(tipo_consulta)
+    return tipo_consulta
+
+def obtener_sesion(session_id):
+    """La sesión, si existe y es de la tienda de la petición"""
+    session = chat_sessions.obtener(session_id) if session_id else None
+    if session is None or session.get('tienda') != tienda_actual():
         return None
-    
-    datos_requeridos = REQUIRED_DATA[tipo_consulta]
-    datos_cliente = chat_sessions[session_id].get('datos_cliente', {})
-    
-    faltantes = []
-    for dato in datos_requeridos:
-        if dato not in datos_cliente or not datos_cliente[dato]:
-            faltantes.append(dato)
-    
-    return faltantes if faltantes else None
+    return session
+
+def procesar_mensaje(session_id, message):
+    """
+    Aplica la máquina de estados de la conversación a un mensaje.
+
+    Devuelve (respuesta, consulta): si el mensaje se resuelve sin el modelo
+    (saludo, validación, pedido de datos) `respuesta` trae el dict para el
+    cliente; si no, `consulta` trae lo necesario para `responder_consulta`.
+    """
+    session = obtener_sesion(session_id)
+
+    # Crear nueva sesión si no existe; si el primer mensaje ya trae datos, se usan
+    if session is None:
+        session, paso = maquina.nueva_sesion(message, clasificar)
+        session['tienda'] = tienda_actual()
+        session_id = chat_sessions.crear_sesion(session)
+    else:
+        contar_estado(session['estado'])
+        paso = maquina.procesar(session, message, clasificar)
+
+        # Dato inválido: se vuelve a pedir sin tocar la sesión
+        if paso.error:
+            return {
+                'status': 'error',
+                'response': paso.respuesta,
+                'waiting_for': paso.esperando
+            }, None
+
+        chat_sessions.guardar(session_id, session)
+
+    # Solicitar el siguiente dato faltante
+    if paso.respuesta is not None:
+        return {
+            'status': 'success',
+            'session_id': session_id,
+            'response': paso.respuesta,
+            'waiting_for': paso.esperando
+        }, None
+
+    consulta = {
+        'session_id': session_id,
+        'session': session,
+        'tipo_consulta': paso.tipo_consulta,
+        'message': paso.consulta
+    }
+
+    # Horario, pagos, devoluciones...: se responden con info_general, sin el modelo
+    with etapa('directa'):
+        directa = respuesta_directa(consulta)
+    if directa is not None:
+        return cerrar_consulta(consulta, directa), None
+
+    return None, consulta
+
+def _respuestas_tienda(datos):
+    return respuestas_de_tienda(datos.info)
+
+def respuesta_directa(consulta):
+    """Respuesta fija a partir de info_general, o None si la consulta necesita al modelo"""
+    return respuestas_directas.responder(
+        consulta['message'], consulta['tipo_consulta'], consulta['session']['datos_cliente'].get('nombre'),
+        catalogo.derivado('respuestas_directas', _respuestas_tienda)
+    )
 
-@app.route('/api/chat', methods=['POST', 'OPTIONS'])
+def calentar():
+    """
+    Arma el catálogo de la tienda por defecto y sus respuestas directas antes
+    de la primera consulta (ver preparacion.py); devuelve su contexto fijo
+    """
+    catalogo.derivado('respuestas_directas', _respuestas_tienda)
+    return [contexto_fijo_tienda()]
+
+def guardar_respuesta(consulta, response_text):
+    session = consulta['session']
+    session['estado'] = 'conversando'
+    chat_sessions.guardar(consulta['session_id'], session)
+    chat_sessions.agregar_historial(consulta['session_id'], {
+        'timestamp': datetime.now().isoformat(),
+        'message': consulta['message'],
+        'response': response_text
+    })
+
+def responder_consulta(consulta, context):
+    """Consulta al modelo (o a la caché de respuestas) y guarda el turno"""
+    tipo_consulta, message = consulta['tipo_consulta'], consulta['message']
+    datos_cliente = consulta['session']['datos_cliente']
+
+    # Los datos del cliente van como marcadores para que la respuesta sea reutilizable
+    response_text = respuestas.responder(
+        message, tipo_consulta, catalogo.version,
+        lambda datos: generar_respuesta(construir_prompt(datos, tipo_consulta, context, message)),
+        datos_cliente
+    )
+    return cerrar_consulta(consulta, response_text)
+
+def cerrar_consulta(consulta, response_text):
+    """Guarda el turno y arma la respuesta para el cliente"""
+    guardar_respuesta(consulta, response_text)
+
+    return {
+        'status': 'success',
+        'session_id': consulta['session_id'],
+        'response': response_text,
+        'collected_data': consulta['session']['datos_cliente']
+    }
+
+@bp.before_request
+def _fijar_tienda():
+    """Resuelve la tienda de la petición (header X-Tienda, campo "tienda" o subdominio)"""
+    if request.method == 'OPTIONS':
+        return None
+    data = None if 'X-Tienda' in request.headers else request.get_json(silent=True)
+    try:
+        tienda = resolver_tienda(request.headers, request.host, data)
+        if not tiendas.existe(tienda):
+            raise TiendaDesconocida(tienda)
+    except TiendaDesconocida:
+        return jsonify({
+            'error': 'Tienda desconocida',
+            'status': 'error'
+        }), 404
+    g.token_tienda = usar_tienda(tienda)
+    return None
+
+@bp.teardown_request
+def _soltar_tienda(_error=None):
+    token = g.pop('token_tienda', None)
+    if token is not None:
+        restaurar_tienda(token)
+
+@bp.route('/api/chat', methods=['POST', 'OPTIONS'])
+@bp.route('/api/chat/stream', methods=['POST', 'OPTIONS'])
 @cross_origin()  # Necesitarás importar esto de flask_cors
 
+@proteger
 def chat():
+    # Manejar la solicitud OPTIONS para CORS
+    if request.method == 'OPTIONS':
+        return '', 204
+
     if not request.is_json:
         return jsonify({
             'error': 'El contenido debe ser JSON',
@@ -137,144 +361,184 @@ def chat():
             'status': 'error'
         }), 400
 
-    session_id = data.get('session_id')
-    message = data['message']
-
-    # Crear nueva sesión si no existe
-    if not session_id or session_id not in chat_sessions:
-        session_id = f"session_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        chat_sessions[session_id] = {
-            'datos_cliente': {},
-            'estado': 'inicial',
-            'tipo_consulta': None,
-            'chat_history': []
-        }
+    if not isinstance(data['message'], str):
         return jsonify({
-            'status': 'success',
-            'session_id': session_id,
-            'response': "¡Hola! Para poder ayudarte mejor, ¿podrías decirme tu nombre?",
-            'waiting_for': 'nombre'
-        })
+            'error': 'El campo "message" debe ser texto',
+            'status': 'error'
+        }), 400
 
-    session = chat_sessions[session_id]
-    estado = session['estado']
-    datos_cliente = session['datos_cliente']
+    with etapa('estado'):
+        respuesta, consulta = procesar_mensaje(data.get('session_id'), data['message'])
+    if respuesta is not None:
+        return jsonify(respuesta)
 
-    # Si estamos esperando datos del cliente
-    if estado == 'recolectando_datos':
-        waiting_for = session.get('waiting_for')
-        
-        if waiting_for == 'email':
-            if not validar_email(message):
-                return jsonify({
-                    'status': 'error',
-                    'response': "El formato del email no es válido. Por favor, ingresa un email válido.",
-                    'waiting_for': 'email'
-                })
-            datos_cliente['email'] = message
-        elif waiting_for == 'celular':
-            if not validar_celular(message):
-                return jsonify({
-                    'status': 'error',
-                    'response': "El número de celular debe tener 9 dígitos y empezar con 9. Por favor, intenta nuevamente.",
-                    'waiting_for': 'celular'
-                })
-            datos_cliente['celular'] = message
-        else:
-            datos_cliente[waiting_for] = message
-    # Manejar la solicitud OPTIONS para CORS
-    if request.method == 'OPTIONS':
-        return '', 204
-    # Identificar tipo de consulta
-    tipo_consulta = identificar_tipo_consulta(message)
-    session['tipo_consulta'] = tipo_consulta
+    # Si tenemos todos los datos necesarios, procesamos la consulta
+    try:
+        # Solo los productos relevantes para el mensaje, si el catálogo no va en la parte fija
+        with etapa('catalogo'):
+            context = contexto_turno(consulta['message'])
 
-    # Verificar datos faltantes
-    datos_faltantes = revisar_datos_faltantes(session_id, tipo_consulta)
+        if quiere_stream(request):
+            prompt = construir_prompt(
+                consulta['session']['datos_cliente'], consulta['tipo_consulta'], context, consulta['message']
+            )
+            return respuesta_sse(
+                model, prompt, lambda response_text: guardar_respuesta(consulta, response_text), {
+                    'session_id': consulta['session_id'],
+                    'collected_data': consulta['session']['datos_cliente']
+                }, contexto_fijo_tienda()
+            )
 
-    if datos_faltantes:
-        # Solicitar el primer dato faltante
-        dato_requerido = datos_faltantes[0]
-        session['estado'] = 'recolectando_datos'
-        session['waiting_for'] = dato_requerido
-        
-        mensajes_solicitud = {
-            'nombre': "Por favor, dime tu nombre:",
-            'email': "¿Me podrías proporcionar tu email?",
-            'celular': "Necesito tu número de celular (debe empezar con 9 y tener 9 dígitos):",
-            'direccion': "¿Podrías proporcionarme tu dirección de envío?",
-            'numero_pedido': "¿Me podrías proporcionar el número de pedido?"
-        }
+        return jsonify(responder_consulta(consulta, context))
         
+    except GatewayError as e:
         return jsonify({
-            'status': 'success',
-            'session_id': session_id,
-            'response': mensajes_solicitud.get(dato_requerido, f"Por favor, proporciona tu {dato_requerido}:"),
-            'waiting_for': dato_requerido
-        })
+            'error': e.respuesta,
+            'response': e.respuesta,
+            'status': 'error'
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
 
-    # Si tenemos todos los datos necesarios, procesamos la consulta
+def procesar_item_batch(item, context_para):
+    """Procesa un item del lote; los errores quedan en el resultado del item"""
+    if not isinstance(item, dict) or not isinstance(item.get('message'), str):
+        return {
+            'error': 'Cada item debe tener un campo "message"',
+            'status': 'error'
+        }
     try:
-        store_data = cargar_datos()
-        context = formatear_contexto(store_data)
+        respuesta, consulta = procesar_mensaje(item.get('session_id'), item['message'])
+        if respuesta is not None:
+            return respuesta
+        return responder_consulta(consulta, context_para(consulta['message']))
+    except GatewayError as e:
+        return {'error': e.respuesta, 'response': e.respuesta, 'status': 'error'}
+    except Exception as e:
+        return {'error': str(e), 'status': 'error'}
 
+@bp.route('/api/chat/batch', methods=['POST'])
+@cross_origin()
 
-        prompt = f"""
-        Eres un asistente virtual de tienda.
-        
-        Información del cliente:
-        {json.dumps(datos_cliente, indent=2)}
-        
-        Tipo de consulta identificada: {tipo_consulta}
-        
-        Información de la tienda:
-        {context}
+def chat_batch():
+    """
+    Procesa muchos mensajes {session_id, message} en una sola llamada.
 
-        Mensaje del cliente: {message}
-        
-        Por favor, responde de manera amable y personalizada, usando solo la información proporcionada y usando el nombre del cliente
-        Si te preguntan por algo que no está en los datos, indícalo amablemente, si no hay data no pongas esto [Tu nombre].
-        """
-        
-        response = model.generate_content(prompt)
-        
-        session['estado'] = 'conversando'
-        session['chat_history'].append({
-            'timestamp': datetime.now().isoformat(),
-            'message': message,
-            'response': response.text
-        })
-        
+    Los mensajes de una misma sesión se procesan en orden; sesiones distintas
+    se reparten en un pool acotado de workers. Los resultados vuelven en el
+    mismo orden que los items.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list):
         return jsonify({
-            'status': 'success',
-            'session_id': session_id,
-            'response': response.text,
-            'collected_data': datos_cliente
-        })
-        
-    except Exception as e:
+            'error': 'El campo "items" debe ser una lista',
+            'status': 'error'
+        }), 400
+    if len(items) > BATCH_MAX_ITEMS:
         return jsonify({
-            'error': str(e),
+            'error': f'Máximo {BATCH_MAX_ITEMS} items por lote',
             'status': 'error'
-        }), 500
+        }), 400
+
+    # El catálogo se valida y formatea una sola vez para todo el lote
+    ahora = datetime.now()
+    catalogo.contexto(ahora)
+
+    def context_para(message):
+        return contexto_turno(message, ahora)
+
+    # Agrupar por sesión; los items sin session_id abren cada uno su propia sesión
+    grupos = {}
+    for i, item in enumerate(items):
+        session_id = item.get('session_id') if isinstance(item, dict) else None
+        grupos.setdefault(session_id or ('nueva', i), []).append(i)
+
+    resultados = [None] * len(items)
 
-@app.route('/api/chat-history', methods=['GET'])
+    def procesar_grupo(indices):
+        # Cada item mide sus etapas aparte: los hilos comparten el `g` de la petición
+        tiempos = []
+        for i in indices:
+            with tiempos_aparte() as tiempos_item:
+                resultados[i] = procesar_item_batch(items[i], context_para)
+            tiempos.append(tiempos_item)
+        return tiempos
+
+    # Cada hilo corre en una copia del contexto, para que vea la tienda de la petición
+    contexto = contextvars.copy_context()
+
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        futuros = [pool.submit(contexto.copy().run, procesar_grupo, indices) for indices in grupos.values()]
+        for futuro in as_completed(futuros):
+            for tiempos_item in futuro.result():
+                sumar_tiempos(tiempos_item)
+
+    return jsonify({
+        'status': 'success',
+        'results': resultados
+    })
+
+@bp.route('/api/chat-history', methods=['GET'])
 @cross_origin()
 
 def get_chat_history():
     session_id = request.args.get('session_id')
     
-    if not session_id or session_id not in chat_sessions:
+    session = obtener_sesion(session_id)
+    if session is None:
         return jsonify({
             'error': 'Sesión no válida',
             'status': 'error'
         }), 400
         
+    # Paginado: ?cursor= (posición del primer turno) y ?limit=; sin cursor, los últimos turnos
+    cursor = request.args.get('cursor', type=int)
+    limite = request.args.get('limit', LIMITE_HISTORIAL, type=int)
+    # La versión del historial cambia con cada turno (aunque HISTORIAL_MAX_TURNOS deje fija la cantidad);
+    # con ella y los datos del cliente alcanza para saber si cambió
+    return respuesta_json(
+        lambda: {
+            'status': 'success',
+            **chat_sessions.pagina_historial(session_id, cursor, limite),
+            'collected_data': session['datos_cliente']
+        },
+        version=(
+            session_id, chat_sessions.version_historial(session_id), cursor, limite,
+            json_compacto(session['datos_cliente'])
+        )
+    )
+
+@bp.route('/api/catalog-stats', methods=['GET'])
+@cross_origin()
+
+def get_catalog_stats():
+    return jsonify({
+        'status': 'success',
+        'stats': catalogo.estadisticas(),
+        'tiendas': tiendas.estadisticas()
+    })
+
+@bp.route('/api/cache-stats', methods=['GET'])
+@cross_origin()
+
+def get_cache_stats():
+    fijo = contexto_fijo_tienda()
     return jsonify({
         'status': 'success',
-        'history': chat_sessions[session_id]['chat_history'],
-        'collected_data': chat_sessions[session_id]['datos_cliente']
+        'stats': respuestas.estadisticas(),
+        'respuestas_directas': respuestas_directas.estadisticas(),
+        'prompts': estadisticas_prompt.resumen(),
+        'contexto_fijo': {'clave': fijo.clave, 'caracteres': len(fijo.texto)}
     })
 
+# App independiente para correr solo este flujo: python chat_complet.py
 if __name__ == '__main__':
+    app = instalar_json(Flask(__name__))
+    CORS(app, resources=CORS_RESOURCES)
+    app.register_blueprint(bp)
+    instrumentar(app)
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,149 @@
+"""
+Handlers asíncronos del flujo chat_complet, para servir con ASGI (ver asgi.py).
+
+Mientras el modelo responde, el handler queda en un await y el event loop
+sigue atendiendo otras conexiones. La máquina de estados, la caché de
+respuestas, el catálogo y el store de sesiones son los mismos del modo
+síncrono (chat_complet.py); lo que toca el store (sqlite o redis) corre en
+un hilo para no frenar el event loop. Los límites y la coalescencia son los
+de limites.py.
+
+Requiere quart y quart-cors (ver asgi.py).
+"""
+import asyncio
+
+from quart import Blueprint, jsonify, request
+
+import chat_complet
+from chat_complet import (
+    catalogo, cerrar_consulta, chat_sessions, construir_prompt, contexto_fijo_tienda, contexto_turno, obtener_sesion,
+    procesar_mensaje, respuestas, tiendas
+)
+from contexto import json_compacto
+from gateway import GatewayError
+from json_rapido import respuesta_json_async
+from limites import proteger_async
+from sesiones import LIMITE_HISTORIAL, CerrojosSesion
+from tiendas import TiendaDesconocida, resolver_tienda, usar_tienda
+
+bp = Blueprint('chat_complet_async', __name__)
+
+# Los mensajes de una misma sesión se atienden de a uno
+cerrojos = CerrojosSesion()
+
+
+def calentar():
+    """Lo mismo que en el modo síncrono (ver preparacion.py)"""
+    return chat_complet.calentar()
+
+
+def preparar_turno(message):
+    """
+    Lo que el turno lee del catálogo: los productos relevantes, la versión y
+    la parte fija del prompt. Puede releer store_data.json, así que corre en
+    un hilo.
+    """
+    return contexto_turno(message), catalogo.version, contexto_fijo_tienda()
+
+
+async def responder_consulta(consulta, turno):
+    """Versión asíncrona de chat_complet.responder_consulta; `turno` sale de preparar_turno"""
+    tipo_consulta, message = consulta['tipo_consulta'], consulta['message']
+    context, version, contexto_fijo = turno
+
+    async def generar(datos):
+        prompt = construir_prompt(datos, tipo_consulta, context, message)
+        response = await chat_complet.model.generate_content_async(prompt, contexto=contexto_fijo)
+        return response.text
+
+    response_text = await respuestas.responder_async(
+        message, tipo_consulta, version, generar, consulta['session']['datos_cliente']
+    )
+    return await asyncio.to_thread(cerrar_consulta, consulta, response_text)
+
+
+@bp.before_request
+async def _fijar_tienda():
+    """Como en chat_complet; cada petición corre en su propia tarea, así que no hace falta restaurarla"""
+    data = None if 'X-Tienda' in request.headers else await request.get_json(silent=True)
+    try:
+        tienda = resolver_tienda(request.headers, request.host, data)
+        if not tiendas.existe(tienda):
+            raise TiendaDesconocida(tienda)
+    except TiendaDesconocida:
+        return jsonify({
+            'error': 'Tienda desconocida',
+            'status': 'error'
+        }), 404
+    usar_tienda(tienda)
+    return None
+
+
+@bp.route('/api/chat', methods=['POST'])
+@proteger_async
+async def chat():
+    data = await request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({
+            'error': 'El contenido debe ser JSON',
+            'status': 'error'
+        }), 400
+
+    if 'message' not in data:
+        return jsonify({
+            'error': 'El campo "message" es requerido',
+            'status': 'error'
+        }), 400
+
+    if not isinstance(data['message'], str):
+        return jsonify({
+            'error': 'El campo "message" debe ser texto',
+            'status': 'error'
+        }), 400
+
+    session_id = data.get('session_id')
+    async with cerrojos.bloquear(session_id):
+        # asyncio.to_thread copia el contexto: la tienda de la petición sigue fijada en el hilo
+        respuesta, consulta = await asyncio.to_thread(procesar_mensaje, session_id, data['message'])
+        if respuesta is not None:
+            return jsonify(respuesta)
+
+        try:
+            turno = await asyncio.to_thread(preparar_turno, consulta['message'])
+            return jsonify(await responder_consulta(consulta, turno))
+        except GatewayError as e:
+            return jsonify({
+                'error': e.respuesta,
+                'response': e.respuesta,
+                'status': 'error'
+            }), 503
+        except Exception as e:
+            return jsonify({
+                'error': str(e),
+                'status': 'error'
+            }), 500
+
+
+@bp.route('/api/chat-history', methods=['GET'])
+async def get_chat_history():
+    session_id = request.args.get('session_id')
+
+    session = await asyncio.to_thread(obtener_sesion, session_id)
+    if session is None:
+        return jsonify({
+            'error': 'Sesión no válida',
+            'status': 'error'
+        }), 400
+
+    # Paginado y ETag como en chat_complet; la página se arma en un hilo y solo si no hay 304
+    cursor = request.args.get('cursor', type=int)
+    limite = request.args.get('limit', LIMITE_HISTORIAL, type=int)
+    version = await asyncio.to_thread(chat_sessions.version_historial, session_id)
+    return await respuesta_json_async(
+        lambda: {
+            'status': 'success',
+            **chat_sessions.pagina_historial(session_id, cursor, limite),
+            'collected_data': session['datos_cliente']
+        },
+        version=(session_id, version, cursor, limite, json_compacto(session['datos_cliente']))
+    )
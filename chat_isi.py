@@ -1,22 +1,33 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify
 from flask_cors import CORS
-import google.generativeai as genai
 from dotenv import load_dotenv
-import os
 
-# Inicialización
-app = Flask(__name__)
-CORS(app)
+from cache_respuestas import CacheRespuestas, version_datos
+from contexto import contexto_fijo
+from intenciones import identificar_tipo_consulta
+from limites import proteger
+from extractor_datos import ExtractorDatos
+from gateway import GatewayError
+from json_rapido import instalar_json
+from metricas import contar_estado, contar_tipo_consulta, etapa, instrumentar
+from modelo import latencia_promedio_modelo, modelo_compartido
+from respuestas_directas import RespuestasDirectas, respuestas_de_tienda
+from sesiones import EspacioSesiones
+from streaming import quiere_stream, respuesta_sse
+
+# Rutas del flujo; create_app() en app.py las monta junto a los demás flujos
+bp = Blueprint('chat_isi', __name__)
 
 # Cargar variables de entorno
 load_dotenv()
 
-# Configurar Gemini
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-model = genai.GenerativeModel('gemini-pro')
+# Gateway compartido de Gemini (concurrencia, plazos, reintentos y circuit breaker);
+# se crea en la primera llamada
+model = modelo_compartido
 
-# Almacenamiento de sesiones
-chat_sessions = {}
+# Sesiones de este flujo dentro del store compartido (memoria, SQLite o Redis
+# según SESSION_STORE)
+chat_sessions = EspacioSesiones('chat_isi')
 
 # Información básica de la tienda
 STORE_INFO = {
@@ -30,7 +41,65 @@ STORE_INFO = {
     "telefono": "01-234-5678"
 }
 
-@app.route('/api/chat', methods=['POST'])
+# Versión de STORE_INFO para la caché de respuestas
+VERSION_TIENDA = version_datos(STORE_INFO)
+
+# Respuestas del modelo a preguntas frecuentes
+respuestas = CacheRespuestas()
+
+# Respuestas sin el modelo para los datos fijos de STORE_INFO
+respuestas_directas = RespuestasDirectas(respuestas_de_tienda(STORE_INFO), latencia_modelo=latencia_promedio_modelo)
+
+# Instrucciones y datos de la tienda: iguales en todos los turnos, el modelo
+# los registra una sola vez
+CONTEXTO_FIJO = contexto_fijo('chat_isi', f"""
+        Eres un asistente amable de {STORE_INFO['nombre']}.
+        
+        Información de la tienda:
+        {STORE_INFO}
+        
+        Responde de manera amable y personalizada usando el nombre del cliente.
+        Solo proporciona información sobre los horarios y la ubicación de la tienda.
+        Si preguntan por otros temas, sugiere que visiten la tienda o llamen por teléfono.
+        """)
+
+# Saca el nombre del mensaje ("Hola, soy Ana" -> "Ana") sin llamar al modelo
+extractor = ExtractorDatos()
+
+def bienvenida(nombre):
+    """Mensaje de bienvenida con información de la tienda"""
+    return f"""
+                    ¡Hola {nombre}! 👋 
+                    Bienvenido(a) a {STORE_INFO['nombre']} 🏪
+
+                    📍 Estamos ubicados en: {STORE_INFO['direccion']}
+
+                    ⏰ Nuestros horarios son:
+                    - Lunes a Viernes: {STORE_INFO['horarios']['lunes_viernes']}
+                    - Sábados: {STORE_INFO['horarios']['sabados']}
+                    - Domingos: {STORE_INFO['horarios']['domingos']}
+
+                    📞 Teléfono: {STORE_INFO['telefono']}
+
+                    ¿En qué puedo ayudarte?
+                    """
+
+def calentar():
+    """Contexto fijo para registrar en el modelo antes de la primera consulta (ver preparacion.py)"""
+    return [CONTEXTO_FIJO]
+
+def generar_respuesta(prompt):
+    with etapa('modelo'):
+        return model.generate_content(prompt, contexto=CONTEXTO_FIJO).text
+
+def construir_prompt(nombre, message):
+    """Parte del prompt propia del turno; el resto va en CONTEXTO_FIJO"""
+    with etapa('prompt'):
+        return f"El cliente se llama: {nombre}\nSu pregunta es: {message}"
+
+@bp.route('/api/chat', methods=['POST'])
+@bp.route('/api/chat/stream', methods=['POST'])
+@proteger
 def chat():
     if not request.is_json:
         return jsonify({
@@ -46,16 +115,30 @@ def chat():
             'status': 'error'
         }), 400
 
+    if not isinstance(data['message'], str):
+        return jsonify({
+            'error': 'El campo "message" debe ser texto',
+            'status': 'error'
+        }), 400
+
     session_id = data.get('session_id')
     message = data['message']
 
-    # Nueva sesión
-    if not session_id or session_id not in chat_sessions:
-        session_id = f"session_{len(chat_sessions) + 1}"
-        chat_sessions[session_id] = {
-            'estado': 'pidiendo_nombre',
-            'nombre': None
-        }
+    session = chat_sessions.obtener(session_id) if session_id else None
+
+    # Nueva sesión; si el primer mensaje ya dice el nombre ("Hola, soy Ana") no se pregunta
+    if session is None:
+        nombre = extractor(message).get('nombre')
+        session_id = chat_sessions.crear_sesion({
+            'estado': 'chat_activo' if nombre else 'pidiendo_nombre',
+            'nombre': nombre
+        })
+        if nombre:
+            return jsonify({
+                'status': 'success',
+                'session_id': session_id,
+                'response': bienvenida(nombre)
+            })
         return jsonify({
             'status': 'success',
             'session_id': session_id,
@@ -63,63 +146,78 @@ def chat():
             'waiting_for': 'nombre'
         })
 
-    session = chat_sessions[session_id]
-    print('session>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>')    
-    print(session)
+    contar_estado(session['estado'])
     # Si aún no tenemos el nombre
     if session['estado'] == 'pidiendo_nombre':
-        session['nombre'] = message
+        # El mensaje entero es el nombre solo si no trae otro dato ("mi correo es ...")
+        datos = extractor(message, 'nombre')
+        nombre = datos.get('nombre') or (message.strip() if not datos else None)
+        if not nombre:
+            return jsonify({
+                'status': 'error',
+                'response': "Por ahora solo necesito tu nombre 😊 ¿Cómo te llamas?",
+                'waiting_for': 'nombre'
+            })
+        session['nombre'] = nombre
         session['estado'] = 'chat_activo'
-        
-        # Mensaje de bienvenida con información de la tienda
-        bienvenida = f"""
-                    ¡Hola {message}! 👋 
-                    Bienvenido(a) a {STORE_INFO['nombre']} 🏪
-
-                    📍 Estamos ubicados en: {STORE_INFO['direccion']}
-
-                    ⏰ Nuestros horarios son:
-                    - Lunes a Viernes: {STORE_INFO['horarios']['lunes_viernes']}
-                    - Sábados: {STORE_INFO['horarios']['sabados']}
-                    - Domingos: {STORE_INFO['horarios']['domingos']}
-
-                    📞 Teléfono: {STORE_INFO['telefono']}
-
-                    ¿En qué puedo ayudarte?
-                    """
+        chat_sessions.guardar(session_id, session)
         return jsonify({
             'status': 'success',
-            'response': bienvenida
+            'response': bienvenida(session['nombre'])
         })
 
     # Para cualquier otra consulta
     try:
-        prompt = f"""
-        Eres un asistente amable de {STORE_INFO['nombre']}.
-        
-        Información de la tienda:
-        {STORE_INFO}
-        
-        El cliente se llama: {session['nombre']}
-        Su pregunta es: {message}
-        
-        Responde de manera amable y personalizada usando el nombre del cliente.
-        Solo proporciona información sobre los horarios y la ubicación de la tienda.
-        Si preguntan por otros temas, sugiere que visiten la tienda o llamen por teléfono.
-        """
-        
-        response = model.generate_content(prompt)
+        tipo_consulta = identificar_tipo_consulta(message)
+        contar_tipo_consulta(tipo_consulta)
+
+        # Horario, dirección, teléfono...: se responden con STORE_INFO, sin el modelo
+        with etapa('directa'):
+            directa = respuestas_directas.responder(message, tipo_consulta, session['nombre'])
+        if directa is not None:
+            return jsonify({
+                'status': 'success',
+                'response': directa
+            })
+
+        if quiere_stream(request):
+            return respuesta_sse(model, construir_prompt(session['nombre'], message), contexto=CONTEXTO_FIJO)
+
+        response_text = respuestas.responder(
+            message, tipo_consulta, VERSION_TIENDA,
+            lambda datos: generar_respuesta(construir_prompt(datos['nombre'], message)),
+            {'nombre': session['nombre']}
+        )
         
         return jsonify({
             'status': 'success',
-            'response': response.text
+            'response': response_text
         })
         
+    except GatewayError as e:
+        return jsonify({
+            'error': e.respuesta,
+            'response': e.respuesta,
+            'status': 'error'
+        }), 503
     except Exception as e:
         return jsonify({
             'error': str(e),
             'status': 'error'
         }), 500
 
+@bp.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        'status': 'success',
+        'stats': respuestas.estadisticas(),
+        'respuestas_directas': respuestas_directas.estadisticas()
+    })
+
+# App independiente para correr solo este flujo: python chat_isi.py
 if __name__ == '__main__':
+    app = instalar_json(Flask(__name__))
+    CORS(app)
+    app.register_blueprint(bp)
+    instrumentar(app)
     app.run(debug=True)
\ No newline at end of file
@@ -1,24 +1,37 @@
-from flask import Flask, request, jsonify
-import google.generativeai as genai
-from datetime import datetime
+from flask import Blueprint, Flask, request, jsonify
 from dotenv import load_dotenv
 from flask_cors import CORS, cross_origin
-import os
 import re
 
-# Inicialización
-app = Flask(__name__)
-CORS(app)
+from cache_respuestas import CacheRespuestas, version_datos
+from intenciones import identificar_tipo_consulta
+from limites import proteger
+from maquina_estados import Campo, Flujo, MaquinaEstados
+from catalogo import TOP_K_PRODUCTOS
+from contexto import json_compacto
+from extractor_datos import ExtractorDatos
+from gateway import GatewayError
+from indice_catalogo import IndiceCatalogo
+from json_rapido import instalar_json
+from metricas import contar_estado, contar_tipo_consulta, etapa, instrumentar
+from modelo import latencia_promedio_modelo, modelo_compartido
+from respuestas_directas import RespuestasDirectas, respuestas_de_tienda
+from sesiones import EspacioSesiones
+from streaming import quiere_stream, respuesta_sse
+
+# Rutas del flujo; create_app() en app.py las monta junto a los demás flujos
+bp = Blueprint('chat_simple', __name__)
 
 # Cargar variables de entorno
 load_dotenv()
 
-# Configurar Gemini
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-model = genai.GenerativeModel('gemini-pro')
+# Gateway compartido de Gemini (concurrencia, plazos, reintentos y circuit breaker);
+# se crea en la primera llamada
+model = modelo_compartido
 
-# Almacenamiento de sesiones
-chat_sessions = {}
+# Sesiones de este flujo dentro del store compartido (memoria, SQLite o Redis
+# según SESSION_STORE)
+chat_sessions = EspacioSesiones('chat_simple')
 
 # Información de la tienda
 STORE_INFO = {
@@ -48,6 +61,48 @@ STORE_INFO = {
     "horario": "Lunes a Sábado de 10:00 AM a 8:00 PM"
 }
 
+# Versión de STORE_INFO para la caché de respuestas
+VERSION_TIENDA = version_datos(STORE_INFO)
+
+# Respuestas del modelo a preguntas frecuentes
+respuestas = CacheRespuestas()
+
+# Respuestas sin el modelo para los datos fijos de STORE_INFO
+respuestas_directas = RespuestasDirectas(respuestas_de_tienda(STORE_INFO), latencia_modelo=latencia_promedio_modelo)
+
+# Índice de productos, para enviar al modelo solo los relevantes
+indice_productos = IndiceCatalogo(STORE_INFO['productos'])
+
+def contexto_tienda(message):
+    productos = STORE_INFO['productos']
+    if len(productos) > TOP_K_PRODUCTOS:
+        productos = indice_productos.buscar(message, TOP_K_PRODUCTOS)
+    return json_compacto({**STORE_INFO, 'productos': productos})
+
+def generar_respuesta(prompt):
+    with etapa('modelo'):
+        return model.generate_content(prompt).text
+
+def construir_prompt(datos_cliente, message):
+    with etapa('prompt'):
+        return f"""
+        Eres un asistente virtual de {STORE_INFO['nombre']}.
+        
+        Información del cliente:
+        Nombre: {datos_cliente['nombre']}
+        Email: {datos_cliente['email']}
+        Celular: {datos_cliente['celular']}
+        
+        Información de la tienda (STORE_INFO):
+        {contexto_tienda(message)}
+        
+        Pregunta del cliente: {message}
+        
+        Por favor, responde de manera amable y personalizada, usando el nombre del cliente.
+        Usa solo la información proporcionada en STORE_INFO.
+        Si te preguntan por algo que no está en los datos, menciona amablemente que no tienes esa información.
+        """
+
 def validar_email(email):
     """Valida el formato del email"""
     patron = r'^[\w\.-]+@[\w\.-]+\.\w+$'
@@ -58,8 +113,51 @@ def validar_celular(celular):
     patron = r'^9\d{8}$'
     return re.match(patron, celular) is not None
 
-@app.route('/api/chat', methods=['POST'])
+def clasificar(message):
+    tipo_consulta = identificar_tipo_consulta(message)
+    contar_tipo_consulta(tipo_consulta)
+    return tipo_consulta
+
+# Registro: se piden nombre, email y celular antes de conversar
+FLUJO_REGISTRO = Flujo(
+    nombre='chat_simple',
+    campos=(
+        Campo('nombre', pedir="¡Hola! 👋 Para comenzar, ¿podrías decirme tu nombre?"),
+        Campo(
+            'email', validar=validar_email,
+            pedir="Gracias {nombre}! ¿Me podrías proporcionar tu email?",
+            error="Por favor, ingresa un email válido (ejemplo: usuario@dominio.com)"
+        ),
+        Campo(
+            'celular', validar=validar_celular,
+            pedir="Perfecto! Por último, ¿me das tu número de celular? (debe empezar con 9 y tener 9 dígitos)",
+            error="El número debe empezar con 9 y tener 9 dígitos. Por favor, intenta nuevamente."
+        ),
+    ),
+    requisitos={'*': ('nombre', 'email', 'celular')},
+    estado_activo='chat_activo',
+    # Si el cliente escribe varios datos juntos se guardan todos de una vez
+    extraer=ExtractorDatos({'email': validar_email, 'celular': validar_celular}),
+    # Mensaje de bienvenida con resumen de datos
+    al_completar="""
+¡Registro completado! 🎉
+Tus datos registrados son:
+- Nombre: {nombre}
+- Email: {email}
+- Celular: {celular}
+
+¿En qué puedo ayudarte? Puedes preguntarme sobre:
+1. Productos y precios
+2. Promociones actuales
+3. Horario de atención
+        """
+)
+maquina = MaquinaEstados(FLUJO_REGISTRO)
+
+@bp.route('/api/chat', methods=['POST'])
+@bp.route('/api/chat/stream', methods=['POST'])
 @cross_origin()
+@proteger
 def chat():
     if not request.is_json:
         return jsonify({
@@ -75,114 +173,100 @@ def chat():
             'status': 'error'
         }), 400
 
+    if not isinstance(data['message'], str):
+        return jsonify({
+            'error': 'El campo "message" debe ser texto',
+            'status': 'error'
+        }), 400
+
     session_id = data.get('session_id')
     message = data['message']
 
-    # Nueva sesión
-    if not session_id or session_id not in chat_sessions:
-        session_id = f"session_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        chat_sessions[session_id] = {
-            'estado': 'pidiendo_nombre',
-            'datos_cliente': {}
-        }
+    session = chat_sessions.obtener(session_id) if session_id else None
+
+    # Nueva sesión (si el primer mensaje ya trae datos, se usan)
+    if session is None:
+        session, paso = maquina.nueva_sesion(message, clasificar)
+        session_id = chat_sessions.crear_sesion(session)
         return jsonify({
             'status': 'success',
             'session_id': session_id,
-            'response': "¡Hola! 👋 Para comenzar, ¿podrías decirme tu nombre?",
-            'waiting_for': 'nombre'
+            'response': paso.respuesta,
+            'waiting_for': paso.esperando
         })
 
-    session = chat_sessions[session_id]
-    estado = session['estado']
-    datos_cliente = session['datos_cliente']
+    contar_estado(session['estado'])
 
-    # Máquina de estados para recolectar información
-    if estado == 'pidiendo_nombre':
-        datos_cliente['nombre'] = message
-        session['estado'] = 'pidiendo_email'
-        return jsonify({
-            'status': 'success',
-            'response': f"Gracias {message}! ¿Me podrías proporcionar tu email?",
-            'waiting_for': 'email'
-        })
+    try:
+        with etapa('estado'):
+            paso = maquina.procesar(session, message, clasificar)
+        datos_cliente = session['datos_cliente']
 
-    elif estado == 'pidiendo_email':
-        if not validar_email(message):
-            return jsonify({
-                'status': 'error',
-                'response': "Por favor, ingresa un email válido (ejemplo: usuario@dominio.com)",
-                'waiting_for': 'email'
-            })
-        datos_cliente['email'] = message
-        session['estado'] = 'pidiendo_celular'
-        return jsonify({
-            'status': 'success',
-            'response': "Perfecto! Por último, ¿me das tu número de celular? (debe empezar con 9 y tener 9 dígitos)",
-            'waiting_for': 'celular'
-        })
+        # Registro: pedido de datos, error de validación o bienvenida
+        if paso.respuesta is not None:
+            if not paso.error:
+                chat_sessions.guardar(session_id, session)
+            respuesta = {
+                'status': 'error' if paso.error else 'success',
+                'response': paso.respuesta
+            }
+            if paso.esperando:
+                respuesta['waiting_for'] = paso.esperando
+            return jsonify(respuesta)
+
+        # Chat activo - responder consultas
+        tipo_consulta = paso.tipo_consulta
 
-    elif estado == 'pidiendo_celular':
-        if not validar_celular(message):
+        # Horario, dirección, teléfono...: se responden con STORE_INFO, sin el modelo
+        with etapa('directa'):
+            directa = respuestas_directas.responder(message, tipo_consulta, datos_cliente['nombre'])
+        if directa is not None:
             return jsonify({
-                'status': 'error',
-                'response': "El número debe empezar con 9 y tener 9 dígitos. Por favor, intenta nuevamente.",
-                'waiting_for': 'celular'
+                'status': 'success',
+                'response': directa
             })
-        datos_cliente['celular'] = message
-        session['estado'] = 'chat_activo'
-        
-        # Mensaje de bienvenida con resumen de datos
-        bienvenida = f"""
-¡Registro completado! 🎉
-Tus datos registrados son:
-- Nombre: {datos_cliente['nombre']}
-- Email: {datos_cliente['email']}
-- Celular: {datos_cliente['celular']}
 
-¿En qué puedo ayudarte? Puedes preguntarme sobre:
-1. Productos y precios
-2. Promociones actuales
-3. Horario de atención
-        """
-        return jsonify({
-            'status': 'success',
-            'response': bienvenida
-        })
+        if quiere_stream(request):
+            return respuesta_sse(model, construir_prompt(datos_cliente, message))
 
-    # Chat activo - responder consultas
-    try:
-        prompt = f"""
-        Eres un asistente virtual de {STORE_INFO['nombre']}.
-        
-        Información del cliente:
-        Nombre: {datos_cliente['nombre']}
-        Email: {datos_cliente['email']}
-        Celular: {datos_cliente['celular']}
-        
-        Información de la tienda:
-        {STORE_INFO}
-        
-        Pregunta del cliente: {message}
-        
-        Por favor, responde de manera amable y personalizada, usando el nombre del cliente.
-        Usa solo la información proporcionada en STORE_INFO.
-        Si te preguntan por algo que no está en los datos, menciona amablemente que no tienes esa información.
-        """
-        
-        response = model.generate_content(prompt)
+        response_text = respuestas.responder(
+            message, tipo_consulta, VERSION_TIENDA,
+            lambda datos: generar_respuesta(construir_prompt(datos, message)),
+            datos_cliente
+        )
         
         return jsonify({
             'status': 'success',
-            'response': response.text
+            'response': response_text
         })
         
+    except GatewayError as e:
+        return jsonify({
+            'error': e.respuesta,
+            'response': e.respuesta,
+            'status': 'error'
+        }), 503
     except Exception as e:
         return jsonify({
             'error': str(e),
             'status': 'error'
         }), 500
 
+@bp.route('/api/cache-stats', methods=['GET'])
+@cross_origin()
+def get_cache_stats():
+    return jsonify({
+        'status': 'success',
+        'stats': respuestas.estadisticas(),
+        'respuestas_directas': respuestas_directas.estadisticas()
+    })
+
+# App independiente para correr solo este flujo: python chat_simple.py
 if __name__ == '__main__':
+    app = instalar_json(Flask(__name__))
+    CORS(app)
+    app.register_blueprint(bp)
+    instrumentar(app)
     app.run(debug=True)
 
 
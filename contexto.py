@@ -0,0 +1,124 @@
+import hashlib
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+from json_rapido import dumps
+
+logger = logging.getLogger(__name__)
+
+MAX_CARACTERES_HISTORIAL = int(os.getenv('HISTORIAL_MAX_CARACTERES', 2000))
+MAX_CARACTERES_PROMPT = int(os.getenv('PROMPT_MAX_CARACTERES', 16000))
+MAX_CARACTERES_TURNO = 600
+MAX_TEMAS_RESUMEN = 8
+MAX_CARACTERES_TEMA = 60
+
+
+def json_compacto(datos):
+    """JSON sin indentación ni espacios, para gastar menos tokens en el prompt"""
+    return dumps(datos).decode('utf-8')
+
+
+@dataclass(frozen=True)
+class ContextoFijo:
+    """
+    Parte del prompt que no cambia entre turnos (instrucciones y datos de la
+    tienda). El modelo la registra una sola vez por `clave` y en cada turno
+    se manda solo lo que cambia (ver modelo.GeminiConContexto).
+    """
+    clave: str
+    texto: str
+
+
+def contexto_fijo(modulo, texto):
+    """ContextoFijo de `modulo`; la clave cambia cuando cambia el texto (p. ej. otra versión del catálogo)"""
+    return ContextoFijo(f"{modulo}-{hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]}", texto)
+
+
+def estimar_tokens(texto):
+    """Aproximación barata: ~4 caracteres por token"""
+    return len(texto) // 4 + 1
+
+
+def recortar(texto, max_caracteres):
+    """Recorta `texto` a `max_caracteres`, cortando en un salto de línea si se puede"""
+    if len(texto) <= max_caracteres:
+        return texto
+    corte = texto.rfind('\n', 0, max_caracteres)
+    if corte < max_caracteres // 2:
+        corte = max_caracteres
+    return texto[:corte].rstrip() + "\n…"
+
+
+def _acortar(texto, max_caracteres):
+    texto = ' '.join(texto.split())
+    return texto if len(texto) <= max_caracteres else texto[:max_caracteres - 1] + "…"
+
+
+def nuevo_buffer():
+    """Buffer de historial para guardar en el estado de la sesión (serializable)"""
+    return {'turnos': [], 'largo': 0, 'temas': []}
+
+
+def agregar_turno(buffer, usuario, asistente, max_caracteres=MAX_CARACTERES_HISTORIAL):
+    """
+    Agrega un turno al buffer y lo mantiene dentro del presupuesto.
+
+    Los turnos más viejos que no entran se resumen como una lista corta de los
+    temas que preguntó el usuario.
+    """
+    turno = (
+        f"Usuario: {_acortar(usuario, MAX_CARACTERES_TURNO)}\n"
+        f"Asistente: {_acortar(asistente, MAX_CARACTERES_TURNO)}"
+    )
+    buffer['turnos'].append([usuario[:MAX_CARACTERES_TEMA], turno])
+    buffer['largo'] += len(turno) + 1
+
+    while buffer['largo'] > max_caracteres and len(buffer['turnos']) > 1:
+        tema, viejo = buffer['turnos'].pop(0)
+        buffer['largo'] -= len(viejo) + 1
+        buffer['temas'].append(_acortar(tema, MAX_CARACTERES_TEMA))
+        del buffer['temas'][:-MAX_TEMAS_RESUMEN]
+    return buffer
+
+
+def texto_buffer(buffer):
+    """Texto del historial listo para el prompt"""
+    partes = []
+    if buffer['temas']:
+        partes.append(f"(Temas anteriores: {'; '.join(buffer['temas'])})")
+    partes.extend(turno for _, turno in buffer['turnos'])
+    return "\n".join(partes)
+
+
+class EstadisticasPrompt:
+    """Tamaño de los prompts enviados al modelo, por módulo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_modulo = {}
+
+    def registrar(self, modulo, prompt):
+        caracteres = len(prompt)
+        with self._lock:
+            datos = self._por_modulo.setdefault(modulo, {'prompts': 0, 'caracteres': 0, 'max_caracteres': 0})
+            datos['prompts'] += 1
+            datos['caracteres'] += caracteres
+            datos['max_caracteres'] = max(datos['max_caracteres'], caracteres)
+        logger.info("prompt %s: %d caracteres (~%d tokens)", modulo, caracteres, estimar_tokens(prompt))
+        return caracteres
+
+    def resumen(self):
+        with self._lock:
+            return {
+                modulo: {
+                    **datos,
+                    'promedio_caracteres': round(datos['caracteres'] / datos['prompts'], 1),
+                    'promedio_tokens': round(datos['caracteres'] / datos['prompts'] / 4, 1)
+                }
+                for modulo, datos in self._por_modulo.items()
+            }
+
+
+estadisticas_prompt = EstadisticasPrompt()
@@ -0,0 +1,83 @@
+import re
+
+from texto import normalizar
+
+# Patrones compilados una vez; cada uno se busca sobre lo que dejaron los anteriores
+_EMAIL = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+_PEDIDO = re.compile(
+    r'\b(?:PED|ORD)-?\d{3,}\b'
+    r'|\b(?:pedido|orden)\s*(?:n[°º.]?|nro\.?|n[uú]mero|#)?\s*:?\s*#?([A-Za-z]{0,4}-?\d{4,})\b',
+    re.IGNORECASE
+)
+# 9 dígitos que empiezan con 9, con o sin separadores (987 654 321, 987-654-321)
+_CELULAR = re.compile(r'(?<![\d-])9(?:[ .-]?\d){8}(?![\d-])')
+_DIRECCION = re.compile(
+    r'\b(?i:av(?:enida)?\.?|calle|jr\.?|jir[oó]n|pasaje|psje\.?|mz\.?)\s+'
+    r'[^\d,;\n]{1,40}?\d+[A-Za-z]?'
+    r'(?:\s*,\s*[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)?)?'
+)
+_PALABRA_NOMBRE = r"[A-ZÁÉÍÓÚÑ][a-záéíóúüñ'-]+"
+_NOMBRE = re.compile(
+    rf"\b(?i:me llamo|mi nombre es|soy)\s+({_PALABRA_NOMBRE}(?:\s+(?:de\s+(?:la\s+|los\s+)?)?{_PALABRA_NOMBRE}){{0,3}})"
+)
+# Lo que sobra cuando se espera el nombre: 1 a 4 palabras solo con letras
+_SOLO_NOMBRE = re.compile(r"^[^\W\d_]+(?:[ '-][^\W\d_]+){0,3}$")
+_SEPARADORES = re.compile(r"[\s,;:.!¡¿?()]+")
+
+# Palabras que acompañan a los datos y no son parte del nombre
+_RELLENO = frozenset("""
+hola buenas buenos dias tardes noches soy me llamo mi nombre es email correo mail celular cel
+telefono numero movil whatsapp direccion pedido orden y mis datos son gracias
+""".split())
+
+
+class ExtractorDatos:
+    """
+    Saca de un mensaje todos los datos del cliente que reconoce (email,
+    celular, número de pedido, dirección y nombre) sin llamar al modelo, así
+    un cliente que escribe varios datos juntos no tiene que mandarlos de a uno.
+
+    `validadores` (campo -> función) confirma los candidatos, p. ej. con
+    validar_email y validar_celular del flujo. Si se indica `esperando`,
+    lo que sobra del mensaje cuenta como ese dato cuando se puede (hoy solo
+    el nombre: de 1 a 4 palabras solo con letras).
+    """
+
+    def __init__(self, validadores=None):
+        self.validadores = dict(validadores or {})
+
+    def _valido(self, campo, valor):
+        validar = self.validadores.get(campo)
+        return validar is None or validar(valor)
+
+    def extraer(self, mensaje, esperando=None):
+        """Diccionario campo -> valor con lo que se encontró (vacío si nada)"""
+        datos = {}
+        if not isinstance(mensaje, str):
+            return datos
+        resto = mensaje
+
+        def buscar(campo, patron, normalizar_valor=str.strip):
+            nonlocal resto
+            for coincidencia in patron.finditer(resto):
+                valor = normalizar_valor(coincidencia.group(coincidencia.lastindex or 0))
+                if self._valido(campo, valor):
+                    datos[campo] = valor
+                    resto = resto[:coincidencia.start()] + ' ' + resto[coincidencia.end():]
+                    return
+
+        buscar('email', _EMAIL)
+        buscar('numero_pedido', _PEDIDO, lambda valor: valor.strip().upper())
+        buscar('celular', _CELULAR, lambda valor: re.sub(r'\D', '', valor))
+        buscar('direccion', _DIRECCION)
+        buscar('nombre', _NOMBRE)
+
+        if esperando == 'nombre' and 'nombre' not in datos:
+            # Lo que queda sin las palabras de relleno, si parece un nombre
+            palabras = [p for p in _SEPARADORES.split(resto) if p and normalizar(p) not in _RELLENO]
+            candidato = ' '.join(palabras)
+            if _SOLO_NOMBRE.match(candidato):
+                datos['nombre'] = candidato
+        return datos
+
+    __call__ = extraer
@@ -0,0 +1,204 @@
+import asyncio
+import itertools
+import math
+import random
+import threading
+import time
+
+
+_TEXTO_RELLENO = (
+    "Claro, con gusto te ayudo. Tenemos varias opciones disponibles en distintas "
+    "tallas y colores; si me cuentas qué buscas te recomiendo la mejor. "
+)
+
+
+def texto_de_largo(largo):
+    """Texto de relleno de exactamente `largo` caracteres"""
+    repeticiones = largo // len(_TEXTO_RELLENO) + 1
+    return (_TEXTO_RELLENO * repeticiones)[:largo]
+
+
+def latencia(distribucion='constante', media=0.0, desviacion=0.0, semilla=None):
+    """
+    Devuelve una función sin argumentos que sortea una latencia en segundos,
+    para usar como `retardo_inicial`. Con la misma `semilla` la secuencia de
+    latencias es siempre la misma.
+
+    Distribuciones: constante, uniforme (media ± desviacion), normal,
+    lognormal (con esa media y desviación) y exponencial (con esa media).
+    """
+    aleatorio = random.Random(semilla)
+    lock = threading.Lock()
+
+    if distribucion == 'constante':
+        sortear = lambda: media  # noqa: E731
+    elif distribucion == 'uniforme':
+        sortear = lambda: aleatorio.uniform(media - desviacion, media + desviacion)  # noqa: E731
+    elif distribucion == 'normal':
+        sortear = lambda: aleatorio.gauss(media, desviacion)  # noqa: E731
+    elif distribucion == 'lognormal':
+        if media <= 0:
+            raise ValueError('La distribución lognormal necesita una media positiva')
+        # Parámetros de la normal subyacente para obtener la media y desviación pedidas
+        sigma = math.sqrt(math.log(1 + (desviacion / media) ** 2))
+        mu = math.log(media) - sigma ** 2 / 2
+        sortear = lambda: aleatorio.lognormvariate(mu, sigma)  # noqa: E731
+    elif distribucion == 'exponencial':
+        sortear = lambda: aleatorio.expovariate(1 / media) if media > 0 else 0.0  # noqa: E731
+    else:
+        raise ValueError(f'Distribución de latencia desconocida: {distribucion}')
+
+    def siguiente():
+        with lock:
+            return max(0.0, sortear())
+
+    return siguiente
+
+
+class FakeResponse:
+    """Imita la respuesta de google.generativeai (solo el atributo .text)"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResourceExhausted(Exception):
+    """Imita el 429 de google.api_core (cuota agotada)"""
+    code = 429
+
+
+class FakeServiceUnavailable(Exception):
+    """Imita el 503 de google.api_core"""
+    code = 503
+
+
+class FakeGenerativeModel:
+    """
+    Modelo local que imita GenerativeModel.generate_content sin llamar a la API.
+
+    La respuesta se entrega en `trozos` fragmentos; `retardo_inicial` simula la
+    espera hasta el primer token (un número o una función sin argumentos que
+    devuelve segundos) y `retardo_trozo` el tiempo entre fragmentos.
+
+    Si se indica `largo_respuesta`, la respuesta es un texto de relleno de ese
+    largo (para medir el costo de respuestas grandes).
+
+    Para probar fallas, `errores` es una secuencia de excepciones (o None) que
+    se lanzan en llamadas sucesivas, y `tasa_error` la probabilidad de lanzar
+    `error` en cualquier llamada.
+
+    `retardo_conexion` simula abrir la conexión (TLS, HTTP/2, credenciales):
+    lo paga solo la primera llamada, o `calentar()` si se llama antes.
+
+    Como modelo.GeminiConContexto, acepta `contexto=ContextoFijo`: cada
+    contexto se registra una sola vez por clave. `bytes_turno` suma los bytes
+    de entrada que se mandan en cada llamada y `bytes_contexto` los de los
+    contextos registrados. Con `cachear_contexto=False` se comporta como la
+    instrucción de sistema de Gemini (sin GEMINI_CACHE_CONTEXTO): el contexto
+    se vuelve a mandar en cada llamada y cuenta en `bytes_turno`.
+    """
+
+    def __init__(self, respuesta="Respuesta de prueba del asistente.", trozos=5,
+                 retardo_inicial=0.0, retardo_trozo=0.0, errores=None,
+                 tasa_error=0.0, error=FakeResourceExhausted, semilla=None,
+                 largo_respuesta=None, retardo_conexion=0.0, cachear_contexto=True):
+        self.respuesta = respuesta if largo_respuesta is None else texto_de_largo(largo_respuesta)
+        self.trozos = max(1, trozos)
+        self.retardo_conexion = retardo_conexion
+        self.cachear_contexto = cachear_contexto
+        self._conectado = threading.Event()
+        self._lock_conexion = threading.Lock()
+        self.retardo_inicial = retardo_inicial
+        self.retardo_trozo = retardo_trozo
+        self.tasa_error = tasa_error
+        self.error = error
+        self._errores = iter(errores or ())
+        self._random = random.Random(semilla)
+        self._lock = threading.Lock()
+        self._contador = itertools.count(1)
+        self.llamadas = 0
+        self.contextos = {}
+        self.bytes_turno = 0
+        self.bytes_contexto = 0
+
+    def _espera_inicial(self):
+        if callable(self.retardo_inicial):
+            return max(0.0, self.retardo_inicial())
+        return self.retardo_inicial
+
+    def _tal_vez_fallar(self):
+        with self._lock:
+            error = next(self._errores, None)
+            if error is None and self.tasa_error and self._random.random() < self.tasa_error:
+                error = self.error('Fallo simulado del modelo')
+        if error is not None:
+            raise error
+
+    def _conectar(self):
+        if self._conectado.is_set():
+            return
+        with self._lock_conexion:
+            if not self._conectado.is_set():
+                time.sleep(self.retardo_conexion)
+                self._conectado.set()
+
+    def calentar(self, contextos=()):
+        """Abre la conexión y registra `contextos`, como GeminiConContexto.calentar"""
+        self._conectar()
+        for contexto in contextos:
+            self._recibir('', contexto, llamada=False)
+
+    def _recibir(self, prompt, contexto, llamada=True):
+        with self._lock:
+            self.bytes_turno += len(prompt.encode('utf-8'))
+            if contexto is None:
+                return
+            if contexto.clave not in self.contextos:
+                self.contextos[contexto.clave] = contexto.texto
+                self.bytes_contexto += len(contexto.texto.encode('utf-8'))
+            if llamada and not self.cachear_contexto:
+                self.bytes_turno += len(contexto.texto.encode('utf-8'))
+
+    def _fragmentos(self):
+        tam = max(1, -(-len(self.respuesta) // self.trozos))
+        return [self.respuesta[i:i + tam] for i in range(0, len(self.respuesta), tam)]
+
+    def _stream(self, espera):
+        time.sleep(espera)
+        for i, fragmento in enumerate(self._fragmentos()):
+            if i:
+                time.sleep(self.retardo_trozo)
+            yield FakeResponse(fragmento)
+
+    def generate_content(self, prompt, stream=False, contexto=None, **kwargs):
+        self.llamadas = next(self._contador)
+        self._conectar()
+        self._recibir(prompt, contexto)
+        espera = self._espera_inicial()
+        if stream:
+            self._tal_vez_fallar()
+            return self._stream(espera)
+        time.sleep(espera + self.retardo_trozo * (self.trozos - 1))
+        self._tal_vez_fallar()
+        return FakeResponse(self.respuesta)
+
+    async def _stream_async(self, espera):
+        await asyncio.sleep(espera)
+        for i, fragmento in enumerate(self._fragmentos()):
+            if i:
+                await asyncio.sleep(self.retardo_trozo)
+            yield FakeResponse(fragmento)
+
+    async def generate_content_async(self, prompt, stream=False, contexto=None, **kwargs):
+        """Como generate_content, pero espera con asyncio.sleep sin bloquear el loop"""
+        self.llamadas = next(self._contador)
+        if not self._conectado.is_set():
+            await asyncio.to_thread(self._conectar)
+        self._recibir(prompt, contexto)
+        espera = self._espera_inicial()
+        if stream:
+            self._tal_vez_fallar()
+            return self._stream_async(espera)
+        await asyncio.sleep(espera + self.retardo_trozo * (self.trozos - 1))
+        self._tal_vez_fallar()
+        return FakeResponse(self.respuesta)
@@ -0,0 +1,513 @@
+import asyncio
+import random
+import weakref
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+RESPUESTA_NO_DISPONIBLE = (
+    "En este momento no puedo responder tu consulta. "
+    "Por favor, intenta nuevamente en unos minutos."
+)
+
+# Errores de google.api_core que vale la pena reintentar
+_ERRORES_REINTENTABLES = {
+    'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable',
+    'DeadlineExceeded', 'InternalServerError', 'GatewayTimeout'
+}
+_CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class GatewayError(Exception):
+    """Falla del modelo que ya fue manejada; `respuesta` es el texto para el cliente"""
+
+    def __init__(self, motivo, respuesta=RESPUESTA_NO_DISPONIBLE):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.respuesta = respuesta
+
+
+def es_reintentable(error):
+    if isinstance(error, (TimeoutError, FutureTimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in _ERRORES_REINTENTABLES:
+        return True
+    codigo = getattr(error, 'code', None)
+    codigo = getattr(codigo, 'value', codigo)
+    return codigo in _CODIGOS_REINTENTABLES
+
+
+class CircuitBreaker:
+    """
+    Abre el circuito tras `umbral` fallas seguidas; mientras está abierto las
+    llamadas fallan de inmediato. Pasado `enfriamiento` deja pasar una llamada
+    de prueba (semiabierto) y se cierra si esa llamada funciona.
+    """
+
+    def __init__(self, umbral=5, enfriamiento=30.0):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self._lock = threading.Lock()
+        self._fallas = 0
+        self._abierto_desde = None
+        self._prueba_en_curso = False
+
+    @property
+    def estado(self):
+        if self._abierto_desde is None:
+            return 'cerrado'
+        if time.monotonic() - self._abierto_desde >= self.enfriamiento:
+            return 'semiabierto'
+        return 'abierto'
+
+    def permitir(self):
+        with self._lock:
+            estado = self.estado
+            if estado == 'cerrado':
+                return True
+            if estado == 'semiabierto' and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            self._fallas = 0
+            self._abierto_desde = None
+            self._prueba_en_curso = False
+
+    def cancelar(self):
+        """La llamada permitida no llegó al modelo; libera el turno de prueba"""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def falla(self):
+        with self._lock:
+            self._fallas += 1
+            if self._prueba_en_curso or self._fallas >= self.umbral:
+                self._abierto_desde = time.monotonic()
+            self._prueba_en_curso = False
+
+
+class _Metrica:
+    """Acumulador simple de duraciones (en segundos)"""
+
+    def __init__(self):
+        self.cantidad = 0
+        self.total = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        self.cantidad += 1
+        self.total += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def resumen(self):
+        return {
+            'cantidad': self.cantidad,
+            'promedio_ms': round(1000 * self.total / self.cantidad, 2) if self.cantidad else 0.0,
+            'max_ms': round(1000 * self.maximo, 2)
+        }
+
+
+_FIN = object()
+
+
+class _Flujo:
+    """
+    Respuesta en streaming del modelo. Conserva el cupo del gateway hasta que
+    se agota o se cierra, y el plazo de la llamada vale para todo el flujo.
+    Al terminar anota el resultado en el circuito: una falla a mitad del
+    flujo cuenta como falla del modelo.
+    """
+
+    def __init__(self, gateway, plazo, inicio=None):
+        self._gateway = gateway
+        self._plazo = plazo
+        self._inicio = time.perf_counter() if inicio is None else inicio
+        self._abierto = True
+
+    def _restante(self):
+        return max(0.0, self._plazo - time.monotonic())
+
+    def _liberar(self):
+        raise NotImplementedError
+
+    def _soltar(self):
+        """Devuelve el cupo sin tocar el circuito (la apertura falló)"""
+        if not self._abierto:
+            return False
+        self._abierto = False
+        with self._gateway._lock:
+            self._gateway.latencia.registrar(time.perf_counter() - self._inicio)
+        self._liberar()
+        return True
+
+    def _terminar(self, error=None):
+        if self._soltar():
+            self._gateway._fin_de_flujo(error)
+
+    def _fallar(self, error):
+        self._terminar(error)
+        raise GatewayError(f'{type(error).__name__}: {error}') from error
+
+
+class _FlujoSincrono(_Flujo):
+    """Cada fragmento se espera en el pool del gateway, dentro del plazo"""
+
+    def __init__(self, gateway, plazo):
+        super().__init__(gateway, plazo)
+        self._respuesta = None
+        self._iterador = None
+        self._pendiente = None
+
+    def _esperar(self, funcion, *args, **kwargs):
+        self._pendiente = self._gateway._pool.submit(funcion, *args, **kwargs)
+        valor = self._gateway._en_plazo(self._pendiente, self._plazo)
+        self._pendiente = None
+        return valor
+
+    def abrir(self, prompt, kwargs):
+        self._respuesta = self._esperar(self._gateway.model.generate_content, prompt, **kwargs)
+        self._iterador = iter(self._respuesta)
+
+    def _liberar(self):
+        # Si un fragmento sigue en vuelo tras vencer el plazo, el cupo se
+        # devuelve cuando el hilo termina de verdad
+        if self._pendiente is not None:
+            self._pendiente.add_done_callback(lambda _: self._gateway._semaforo.release())
+        else:
+            self._gateway._semaforo.release()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._abierto:
+            raise StopIteration
+        try:
+            fragmento = self._esperar(next, self._iterador, _FIN)
+        except Exception as e:
+            self._fallar(e)
+        if fragmento is _FIN:
+            self._terminar()
+            raise StopIteration
+        return fragmento
+
+    def close(self):
+        """El cliente dejó de leer: libera el cupo y cierra la respuesta del modelo"""
+        if self._pendiente is None:
+            cerrar = getattr(self._iterador, 'close', None)
+            if cerrar is not None:
+                cerrar()
+        self._terminar()
+
+    __del__ = close
+
+    def __getattr__(self, nombre):
+        # El resto de la API de la respuesta (p. ej. `text` tras consumirla)
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        return getattr(self._respuesta, nombre)
+
+
+class _FlujoAsincrono(_Flujo):
+    """Versión para `generate_content_async(stream=True)`"""
+
+    def __init__(self, gateway, plazo, semaforo, respuesta, inicio):
+        super().__init__(gateway, plazo, inicio)
+        self._semaforo = semaforo
+        self._respuesta = respuesta
+        self._asincrono = hasattr(respuesta, '__aiter__')
+        self._iterador = respuesta.__aiter__() if self._asincrono else iter(respuesta)
+
+    def _liberar(self):
+        self._semaforo.release()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._abierto:
+            raise StopAsyncIteration
+        try:
+            if self._asincrono:
+                siguiente = self._iterador.__anext__()
+            else:
+                # Modelo sin API asíncrona: cada fragmento se espera en el pool
+                siguiente = asyncio.get_running_loop().run_in_executor(
+                    self._gateway._pool, next, self._iterador, _FIN
+                )
+            fragmento = await asyncio.wait_for(siguiente, self._restante())
+        except StopAsyncIteration:
+            fragmento = _FIN
+        except asyncio.TimeoutError:
+            self._gateway._contar('timeouts')
+            self._fallar(TimeoutError('El modelo no respondió dentro del plazo'))
+        except Exception as e:
+            self._fallar(e)
+        if fragmento is _FIN:
+            self._terminar()
+            raise StopAsyncIteration
+        return fragmento
+
+    async def aclose(self):
+        cerrar = getattr(self._iterador, 'aclose', None)
+        if self._abierto and cerrar is not None:
+            await cerrar()
+        self._terminar()
+
+    def __del__(self):
+        self._terminar()
+
+    def __getattr__(self, nombre):
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        return getattr(self._respuesta, nombre)
+
+
+class ModelGateway:
+    """
+    Envoltura de GenerativeModel compartida por todos los módulos de chat.
+
+    Limita las llamadas simultáneas al modelo, aplica un plazo por llamada,
+    reintenta con backoff exponencial con jitter los errores transitorios
+    (429, 503, timeouts) y, si el modelo sigue fallando, abre un circuit
+    breaker que responde de inmediato con un mensaje amable.
+    """
+
+    def __init__(self, model, max_en_vuelo=8, timeout=30.0, espera_maxima=10.0,
+                 reintentos=2, backoff_base=0.5, backoff_max=8.0, breaker=None,
+                 max_en_vuelo_async=None):
+        self.model = model
+        self.timeout = timeout
+        self.espera_maxima = espera_maxima
+        self.reintentos = reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._semaforo = threading.BoundedSemaphore(max_en_vuelo)
+        # Un hilo por llamada en vuelo, para poder cortar la espera al vencer el plazo
+        self._pool = ThreadPoolExecutor(max_workers=max_en_vuelo, thread_name_prefix='gemini')
+        # En modo asíncrono las llamadas no ocupan hilos, así que el límite puede ser mayor
+        self.max_en_vuelo_async = max_en_vuelo_async or max_en_vuelo
+        self._semaforos_async = weakref.WeakKeyDictionary()
+
+        self._lock = threading.Lock()
+        self.espera_cola = _Metrica()
+        self.latencia = _Metrica()
+        self.contadores = {
+            'llamadas': 0, 'exitos': 0, 'reintentos': 0, 'timeouts': 0,
+            'errores': 0, 'rechazadas_circuito': 0, 'rechazadas_cola': 0
+        }
+
+    def _contar(self, nombre):
+        with self._lock:
+            self.contadores[nombre] += 1
+
+    def _adquirir(self, plazo):
+        inicio = time.perf_counter()
+        ok = self._semaforo.acquire(timeout=max(0.0, min(self.espera_maxima, plazo - time.monotonic())))
+        with self._lock:
+            self.espera_cola.registrar(time.perf_counter() - inicio)
+        if not ok:
+            self._contar('rechazadas_cola')
+            raise GatewayError('Demasiadas consultas simultáneas al modelo')
+
+    def _llamar(self, prompt, plazo, kwargs):
+        """Una llamada al modelo dentro del plazo; libera el cupo cuando termina de verdad"""
+        self._adquirir(plazo)
+        inicio = time.perf_counter()
+        try:
+            futuro = self._pool.submit(self.model.generate_content, prompt, **kwargs)
+        except BaseException:
+            self._semaforo.release()
+            raise
+        futuro.add_done_callback(lambda _: self._semaforo.release())
+        try:
+            return self._en_plazo(futuro, plazo)
+        finally:
+            with self._lock:
+                self.latencia.registrar(time.perf_counter() - inicio)
+
+    def _en_plazo(self, futuro, plazo):
+        try:
+            return futuro.result(timeout=max(0.0, plazo - time.monotonic()))
+        except FutureTimeoutError:
+            self._contar('timeouts')
+            raise TimeoutError('El modelo no respondió dentro del plazo')
+
+    def _llamar_stream(self, prompt, plazo, kwargs):
+        """Como `_llamar`, pero el cupo queda tomado hasta que el flujo termina"""
+        self._adquirir(plazo)
+        flujo = _FlujoSincrono(self, plazo)
+        try:
+            flujo.abrir(prompt, kwargs)
+        except BaseException:
+            flujo._soltar()
+            raise
+        return flujo
+
+    def _fin_de_flujo(self, error):
+        """Anota en el circuito cómo terminó una respuesta en streaming"""
+        if error is None:
+            self.breaker.exito()
+            self._contar('exitos')
+            return
+        self._contar('errores')
+        # A mitad del flujo no se puede reintentar: solo se registra la falla
+        if es_reintentable(error):
+            self.breaker.falla()
+        else:
+            self.breaker.cancelar()
+
+    def _espera_backoff(self, intento):
+        techo = min(self.backoff_max, self.backoff_base * (2 ** intento))
+        return random.uniform(0, techo)
+
+    def _error_o_espera(self, error, intento, plazo):
+        """Cuenta la falla y devuelve cuánto esperar antes de reintentar, o lanza GatewayError"""
+        self._contar('errores')
+        if not es_reintentable(error):
+            # El modelo respondió (p. ej. un prompt inválido): no dice nada de
+            # su salud, así que el circuito queda como estaba
+            self.breaker.cancelar()
+            raise GatewayError(f'{type(error).__name__}: {error}') from error
+        espera = self._espera_backoff(intento)
+        if intento >= self.reintentos or time.monotonic() + espera >= plazo:
+            self.breaker.falla()
+            raise GatewayError(f'{type(error).__name__}: {error}') from error
+        self._contar('reintentos')
+        return espera
+
+    def generate_content(self, prompt, stream=False, timeout=None, **kwargs):
+        if not self.breaker.permitir():
+            self._contar('rechazadas_circuito')
+            raise GatewayError('Circuito abierto')
+
+        self._contar('llamadas')
+        plazo = time.monotonic() + (timeout or self.timeout)
+        if stream:
+            kwargs['stream'] = True
+
+        intento = 0
+        while True:
+            try:
+                if stream:
+                    # El circuito y los contadores se actualizan al terminar el flujo
+                    return self._llamar_stream(prompt, plazo, kwargs)
+                response = self._llamar(prompt, plazo, kwargs)
+                self.breaker.exito()
+                self._contar('exitos')
+                return response
+            except GatewayError:
+                self.breaker.cancelar()
+                raise
+            except Exception as e:
+                espera = self._error_o_espera(e, intento, plazo)
+                intento += 1
+                time.sleep(espera)
+
+    def _semaforo_async(self):
+        # Los primitivos de asyncio pertenecen a un event loop: uno por loop
+        loop = asyncio.get_running_loop()
+        semaforo = self._semaforos_async.get(loop)
+        if semaforo is None:
+            semaforo = self._semaforos_async[loop] = asyncio.Semaphore(self.max_en_vuelo_async)
+        return semaforo
+
+    async def _llamar_async(self, prompt, plazo, kwargs):
+        semaforo = self._semaforo_async()
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                semaforo.acquire(), max(0.0, min(self.espera_maxima, plazo - time.monotonic()))
+            )
+        except asyncio.TimeoutError:
+            self._contar('rechazadas_cola')
+            raise GatewayError('Demasiadas consultas simultáneas al modelo')
+        finally:
+            with self._lock:
+                self.espera_cola.registrar(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        try:
+            llamar = getattr(self.model, 'generate_content_async', None)
+            if llamar is not None:
+                llamada = llamar(prompt, **kwargs)
+            else:
+                # Modelo sin API asíncrona: se espera en el pool sin bloquear el loop
+                llamada = asyncio.get_running_loop().run_in_executor(
+                    self._pool, lambda: self.model.generate_content(prompt, **kwargs)
+                )
+            respuesta = await asyncio.wait_for(llamada, max(0.0, plazo - time.monotonic()))
+        except asyncio.TimeoutError:
+            self._contar('timeouts')
+            self._soltar_async(semaforo, inicio)
+            raise TimeoutError('El modelo no respondió dentro del plazo')
+        except BaseException:
+            self._soltar_async(semaforo, inicio)
+            raise
+        if kwargs.get('stream'):
+            # El cupo queda tomado hasta que el flujo termina; la latencia se
+            # mide hasta entonces
+            return _FlujoAsincrono(self, plazo, semaforo, respuesta, inicio)
+        self._soltar_async(semaforo, inicio)
+        return respuesta
+
+    def _soltar_async(self, semaforo, inicio):
+        semaforo.release()
+        with self._lock:
+            self.latencia.registrar(time.perf_counter() - inicio)
+
+    async def generate_content_async(self, prompt, stream=False, timeout=None, **kwargs):
+        """
+        Versión asíncrona de `generate_content`: espera al modelo sin ocupar un
+        hilo, con el mismo circuito, plazo, reintentos y contadores.
+        """
+        if not self.breaker.permitir():
+            self._contar('rechazadas_circuito')
+            raise GatewayError('Circuito abierto')
+
+        self._contar('llamadas')
+        plazo = time.monotonic() + (timeout or self.timeout)
+        if stream:
+            kwargs['stream'] = True
+
+        intento = 0
+        while True:
+            try:
+                response = await self._llamar_async(prompt, plazo, kwargs)
+                if stream:
+                    # El circuito y los contadores se actualizan al terminar el flujo
+                    return response
+                self.breaker.exito()
+                self._contar('exitos')
+                return response
+            except GatewayError:
+                self.breaker.cancelar()
+                raise
+            except Exception as e:
+                espera = self._error_o_espera(e, intento, plazo)
+                intento += 1
+                await asyncio.sleep(espera)
+
+    def calentar(self, contextos=()):
+        """
+        Abre la conexión con el modelo y registra `contextos` (ContextoFijo)
+        antes de la primera consulta, si el modelo lo permite. No pasa por el
+        circuito ni cuenta como llamada.
+        """
+        calentar = getattr(self.model, 'calentar', None)
+        if calentar is not None:
+            self._pool.submit(calentar, contextos).result(timeout=self.timeout)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                **self.contadores,
+                'circuito': self.breaker.estado,
+                'espera_cola': self.espera_cola.resumen(),
+                'latencia_modelo': self.latencia.resumen()
+            }
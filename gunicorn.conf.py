@@ -0,0 +1,44 @@
+# Modo síncrono en producción: pip install gunicorn; gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+
+# Varios procesos con hilos: las llamadas a Gemini pasan la mayor parte del tiempo esperando I/O
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# La bitácora de historial (bitacora.py) es de un solo proceso: con varios workers
+# cada uno vería solo sus turnos, así que el historial tiene que ir en el store
+if workers > 1 and os.getenv('HISTORIAL_DIR'):
+    raise RuntimeError("HISTORIAL_DIR requiere WEB_CONCURRENCY=1; con varios workers dejarlo vacío")
+
+# La app se importa una vez en el proceso maestro y los workers la heredan al hacer fork.
+# El modelo, el store y el catálogo se crean perezosamente dentro de cada worker,
+# así ningún hilo ni conexión se comparte a través del fork.
+preload_app = True
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_worker_init(worker):
+    # Cada worker se calienta después del fork y antes de aceptar conexiones
+    # (ver preparacion.calentar): así la primera petición no paga la conexión con Gemini
+    from preparacion import calentar
+
+    calentar(worker.wsgi)
+
+
+def when_ready(server):
+    from limites import tipo_backend_limites
+
+    if workers > 1 and tipo_backend_limites() != 'redis':
+        server.log.warning(
+            "Límites de frecuencia en memoria con %d workers: cada uno lleva su cuenta y el límite real "
+            "es %d veces el configurado. Usar LIMITES_BACKEND=redis (y REDIS_URL).", workers, workers
+        )
+    if not int(os.getenv('PROXIES_CONFIABLES', 0)):
+        server.log.info("PROXIES_CONFIABLES=0: detrás de nginx todos los clientes comparten la cubeta de su IP")
@@ -0,0 +1,79 @@
+import heapq
+import math
+from collections import defaultdict
+
+from texto import tokens
+
+# Peso de cada campo del producto al puntuar una coincidencia
+PESOS_CAMPOS = {
+    'nombre': 3.0,
+    'categoria': 2.0,
+    'colores': 2.0,
+    'tallas': 1.5,
+    'descripcion': 1.0
+}
+
+
+def _texto_campo(producto, campo):
+    # Acepta dicts (STORE_INFO) y los Producto de cargador_catalogo
+    valor = producto.get(campo, '') if isinstance(producto, dict) else getattr(producto, campo, '')
+    if isinstance(valor, (list, tuple)):
+        return ' '.join(str(v) for v in valor)
+    return str(valor)
+
+
+class IndiceCatalogo:
+    """
+    Índice invertido token -> productos, construido una vez por versión del
+    catálogo. `buscar` devuelve los k productos más relevantes para un mensaje
+    sin recorrer el catálogo completo.
+    """
+
+    # Listas de más de este tamaño se consideran palabras comunes
+    LIMITE_COMUN = 500
+
+    def __init__(self, productos):
+        self.productos = productos
+        postings = defaultdict(dict)
+        for i, producto in enumerate(productos):
+            for campo, peso in PESOS_CAMPOS.items():
+                for token in tokens(_texto_campo(producto, campo)):
+                    anterior = postings[token].get(i, 0.0)
+                    if peso > anterior:
+                        postings[token][i] = peso
+
+        # Las palabras que aparecen en pocos productos pesan más (idf)
+        total = len(productos) or 1
+        self._postings = {
+            token: (math.log(1 + total / len(docs)), docs)
+            for token, docs in postings.items()
+        }
+
+    def __len__(self):
+        return len(self.productos)
+
+    def buscar_indices(self, mensaje, k=5):
+        """Posiciones (en `productos`) de los k productos más relevantes"""
+        entradas = [self._postings[t] for t in set(tokens(mensaje)) if t in self._postings]
+        # Primero las palabras raras (listas cortas); las muy comunes (colores,
+        # tallas) solo suman puntos a los candidatos que ya se encontraron
+        entradas.sort(key=lambda entrada: len(entrada[1]))
+        comun = max(self.LIMITE_COMUN, len(self.productos) // 20)
+
+        puntajes = defaultdict(float)
+        for idf, docs in entradas:
+            if puntajes and len(docs) > comun:
+                for i in puntajes:
+                    peso = docs.get(i)
+                    if peso:
+                        puntajes[i] += peso * idf
+            else:
+                for i, peso in docs.items():
+                    puntajes[i] += peso * idf
+
+        mejores = heapq.nlargest(k, puntajes.items(), key=lambda par: (par[1], -par[0]))
+        return [i for i, _ in mejores]
+
+    def buscar(self, mensaje, k=5):
+        """Devuelve hasta `k` productos ordenados por relevancia"""
+        return [self.productos[i] for i in self.buscar_indices(mensaje, k)]
@@ -0,0 +1,107 @@
+import re
+
+_SIN_TILDES = str.maketrans('áéíóúüàèìòù', 'aeiouuaeiou')
+
+
+def plegar(texto):
+    """Minúsculas y sin tildes (la ñ se conserva)"""
+    return texto.lower().translate(_SIN_TILDES)
+
+
+# Palabras clave por tipo de consulta, en orden de prioridad (se usa para desempatar)
+PALABRAS_CLAVE = {
+    'precio': [
+        'precio', 'cuesta', 'cuestan', 'valor', 'costo', 'cuanto sale', 'cuanto es',
+        'tarifa', 'barato', 'caro', 'soles'
+    ],
+    'producto': [
+        'producto', 'artículo', 'tienen', 'stock', 'modelo', 'disponible',
+        'catálogo', 'colección', 'novedades'
+    ],
+    'promocion': [
+        'promoción', 'promo', 'descuento', 'oferta', 'rebaja', 'liquidación', 'cupón',
+        '2x1', 'black friday', 'cyber'
+    ],
+    'envio': [
+        'envío', 'enviar', 'entrega', 'delivery', 'despacho', 'courier', 'llega',
+        'demora', 'domicilio', 'recojo'
+    ],
+    'reclamo': [
+        'reclamo', 'queja', 'problema', 'reembolso', 'falla',
+        'defectuoso', 'dañado', 'roto', 'no llegó', 'mal estado'
+    ]
+}
+
+
+# Terminaciones admitidas después de una palabra clave: plurales ("envíos",
+# "promociones") y formas verbales ("entregan", "enviaron", "entregado").
+# Lista cerrada: con cualquier terminación "caro" encontraba "Carolina" y
+# "valor", "valoración"
+_SUFIJOS = r'(?:s|es|n|r|on|ron|an|en|mos|dos?|das?)?'
+
+
+def _regex_trie(palabras):
+    """
+    Arma una expresión regular con forma de trie ("pre(?:cio|mio)" en lugar de
+    "precio|premio"): en cada posición el motor descarta las alternativas por
+    su primer carácter, así el costo no crece con la cantidad de palabras.
+    """
+    trie = {}
+    for palabra in palabras:
+        nodo = trie
+        for caracter in palabra:
+            nodo = nodo.setdefault(caracter, {})
+        nodo[''] = None
+
+    def armar(nodo):
+        termina = '' in nodo
+        ramas = [re.escape(c) + armar(hijo) for c, hijo in sorted(nodo.items()) if c]
+        if not ramas:
+            return ''
+        if len(ramas) == 1 and not termina:
+            return ramas[0]
+        patron = '(?:' + '|'.join(ramas) + ')'
+        return patron + '?' if termina else patron
+
+    return armar(trie)
+
+
+class ClasificadorIntenciones:
+    """
+    Clasifica un mensaje en una sola pasada.
+
+    Todas las palabras clave se compilan una vez en una única expresión
+    regular con forma de trie. El mensaje se pliega a minúsculas sin tildes y
+    cada palabra clave encontrada como palabra completa, o con una de las
+    terminaciones de _SUFIJOS ("envíos", "promociones", "entregan"), suma un
+    punto a su tipo de consulta.
+    """
+
+    def __init__(self, palabras_clave=PALABRAS_CLAVE):
+        self.prioridad = {tipo: i for i, tipo in enumerate(palabras_clave)}
+        self._tipo_de = {}
+        for tipo, palabras in palabras_clave.items():
+            for palabra in palabras:
+                self._tipo_de.setdefault(plegar(palabra), tipo)
+        self._patron = re.compile(r'\b(' + _regex_trie(self._tipo_de) + r')' + _SUFIJOS + r'\b')
+
+    def puntajes(self, mensaje):
+        """Devuelve [(tipo, puntaje), ...] de mayor a menor puntaje"""
+        tipo_de = self._tipo_de
+        conteo = {}
+        for encontrada in self._patron.finditer(plegar(mensaje)):
+            tipo = tipo_de[encontrada.group(1)]
+            conteo[tipo] = conteo.get(tipo, 0) + 1
+        return sorted(conteo.items(), key=lambda par: (-par[1], self.prioridad[par[0]]))
+
+    def clasificar(self, mensaje):
+        puntajes = self.puntajes(mensaje)
+        return puntajes[0][0] if puntajes else 'general'
+
+
+clasificador = ClasificadorIntenciones()
+
+
+def identificar_tipo_consulta(mensaje):
+    """Identifica el tipo de consulta basado en palabras clave"""
+    return clasificador.clasificar(mensaje)
@@ -0,0 +1,152 @@
+import asyncio
+import gzip
+import hashlib
+import json
+from decimal import Decimal
+from uuid import UUID
+
+from flask import current_app, request
+from flask.json.provider import JSONProvider
+
+# orjson es opcional: sin él se usa json de la biblioteca estándar
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Respuestas más chicas no se comprimen: no vale el costo
+MIN_BYTES_COMPRIMIR = 1024
+
+# Codificación -> función que comprime, en orden de preferencia del servidor
+COMPRESORES = {}
+if zstandard is not None:
+    _zstd = zstandard.ZstdCompressor(level=3)
+    COMPRESORES['zstd'] = _zstd.compress
+if brotli is not None:
+    COMPRESORES['br'] = lambda datos: brotli.compress(datos, quality=4)
+COMPRESORES['gzip'] = lambda datos: gzip.compress(datos, compresslevel=5)
+
+
+def _por_defecto(valor):
+    """Tipos que Flask sabe serializar y orjson no"""
+    if isinstance(valor, (Decimal, UUID)):
+        return str(valor)
+    if isinstance(valor, (set, frozenset)):
+        return list(valor)
+    if hasattr(valor, '__html__'):
+        return str(valor.__html__())
+    raise TypeError(f"Object of type {type(valor).__name__} is not JSON serializable")
+
+
+def dumps(datos):
+    """JSON compacto en UTF-8, como bytes"""
+    if orjson is not None:
+        return orjson.dumps(datos, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(datos, default=_por_defecto, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(datos):
+    if orjson is not None:
+        return orjson.loads(datos)
+    return json.loads(datos)
+
+
+class ProveedorJSON(JSONProvider):
+    """
+    Proveedor JSON de Flask con orjson: lo usan jsonify y request.get_json.
+    Si se piden opciones de json.dumps (p. ej. indent) se usa json.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault('default', _por_defecto)
+            kwargs.setdefault('ensure_ascii', False)
+            return json.dumps(obj, **kwargs)
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        datos = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(datos), mimetype='application/json')
+
+
+def instalar_json(app):
+    """Usa ProveedorJSON en `app`"""
+    app.json = ProveedorJSON(app)
+    return app
+
+
+def _etag(contenido):
+    if not isinstance(contenido, bytes):
+        contenido = repr(contenido).encode('utf-8')
+    return hashlib.blake2b(contenido, digest_size=12).hexdigest()
+
+
+def _cuerpo(request, construir, etag, minimo_comprimir):
+    """
+    (cuerpo, etag, codificación) de la respuesta; el cuerpo es None si el
+    cliente ya tiene esa versión (304)
+    """
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        return None, etag, None
+    cuerpo = dumps(construir())
+    etag = etag or _etag(cuerpo)
+    if request.if_none_match.contains_weak(etag):
+        return None, etag, None
+    codificacion = None
+    if len(cuerpo) >= minimo_comprimir:
+        codificacion = request.accept_encodings.best_match(list(COMPRESORES))
+    if codificacion:
+        cuerpo = COMPRESORES[codificacion](cuerpo)
+    return cuerpo, etag, codificacion
+
+
+def _armar(response_class, cuerpo, etag, codificacion):
+    if cuerpo is None:
+        respuesta = response_class(status=304)
+    else:
+        respuesta = response_class(cuerpo, mimetype='application/json')
+        if codificacion:
+            respuesta.headers['Content-Encoding'] = codificacion
+    respuesta.set_etag(etag, weak=True)
+    respuesta.vary.add('Accept-Encoding')
+    return respuesta
+
+
+def respuesta_json(construir, version=None, minimo_comprimir=MIN_BYTES_COMPRIMIR):
+    """
+    Respuesta JSON con ETag y compresión según Accept-Encoding (zstd, br o gzip).
+
+    `construir()` devuelve los datos. Si se indica `version` (algo que cambia
+    cuando cambian los datos), la ETag sale de ella y un If-None-Match que
+    coincide se responde con 304 sin armar ni serializar nada; si no, la
+    ETag es el hash del cuerpo.
+    """
+    etag = _etag(version) if version is not None else None
+    return _armar(current_app.response_class, *_cuerpo(request, construir, etag, minimo_comprimir))
+
+
+async def respuesta_json_async(construir, version=None, minimo_comprimir=MIN_BYTES_COMPRIMIR):
+    """
+    Como `respuesta_json`, para los handlers de Quart: `construir`, la
+    serialización y la compresión corren en un hilo, fuera del event loop.
+    """
+    from quart import current_app, request
+
+    etag = _etag(version) if version is not None else None
+    cuerpo = await asyncio.to_thread(_cuerpo, request, construir, etag, minimo_comprimir)
+    return _armar(current_app.response_class, *cuerpo)
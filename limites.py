@@ -0,0 +1,492 @@
+import asyncio
+import functools
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, jsonify, request
+
+from metricas import contar_coalescida, contar_limitada
+from streaming import quiere_stream
+from tiendas import tienda_actual
+
+MAX_CLAVES_POR_DEFECTO = 100000
+VENTANA_POR_DEFECTO = 2.0
+ESPERA_MAXIMA_POR_DEFECTO = 35.0
+
+MENSAJE_LIMITE = "Estás enviando mensajes muy rápido. Espera unos segundos e intenta nuevamente."
+
+# Proxies delante de la app (nginx, balanceador) que agregan su salto a X-Forwarded-For
+PROXIES_CONFIABLES = int(os.getenv('PROXIES_CONFIABLES', 0))
+
+
+class MemoriaLimites:
+    """
+    Backend en memoria: cubetas y vuelos de un solo proceso. Sirve con un
+    worker; con varios, cada uno lleva su propia cuenta.
+    """
+
+    # Solo toma un lock: en modo asíncrono se llama directo desde el event loop
+    bloquea = False
+
+    def __init__(self, max_claves=MAX_CLAVES_POR_DEFECTO):
+        self.max_claves = max_claves
+        self._lock = threading.Lock()
+        # clave -> [tokens, último instante]
+        self._cubetas = OrderedDict()
+        self._vuelos = {}
+        # clave -> (expira, resultado)
+        self._resultados = OrderedDict()
+
+    def consumir(self, clave, capacidad, por_segundo):
+        """Saca un token de la cubeta; devuelve 0 si había, o los segundos hasta que haya uno"""
+        ahora = time.monotonic()
+        with self._lock:
+            cubeta = self._cubetas.get(clave)
+            if cubeta is None:
+                cubeta = self._cubetas[clave] = [capacidad, ahora]
+                # Olvidar una cubeta equivale a devolverla llena
+                while len(self._cubetas) > self.max_claves:
+                    self._cubetas.popitem(last=False)
+            else:
+                self._cubetas.move_to_end(clave)
+                cubeta[0] = min(capacidad, cubeta[0] + (ahora - cubeta[1]) * por_segundo)
+                cubeta[1] = ahora
+            if cubeta[0] >= 1:
+                cubeta[0] -= 1
+                return 0.0
+            return (1 - cubeta[0]) / por_segundo
+
+    def reclamar(self, clave, ttl):
+        ahora = time.monotonic()
+        with self._lock:
+            if self._vuelos.get(clave, 0) > ahora:
+                return False
+            self._vuelos[clave] = ahora + ttl
+            return True
+
+    def publicar(self, clave, resultado, ventana):
+        ahora = time.monotonic()
+        with self._lock:
+            self._vuelos.pop(clave, None)
+            if ventana > 0:
+                self._resultados[clave] = (ahora + ventana, resultado)
+                self._resultados.move_to_end(clave)
+            while self._resultados and next(iter(self._resultados.values()))[0] <= ahora:
+                self._resultados.popitem(last=False)
+
+    def resultado(self, clave):
+        with self._lock:
+            entrada = self._resultados.get(clave)
+        if entrada is None or entrada[0] <= time.monotonic():
+            return None
+        return entrada[1]
+
+    def liberar(self, clave):
+        with self._lock:
+            self._vuelos.pop(clave, None)
+
+
+# KEYS[1] = cubeta; ARGV = capacidad, tokens por segundo, ahora (s)
+_SCRIPT_CUBETA = """
+local capacidad = tonumber(ARGV[1])
+local por_segundo = tonumber(ARGV[2])
+local ahora = tonumber(ARGV[3])
+local cubeta = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(cubeta[1]) or capacidad
+local ts = tonumber(cubeta[2]) or ahora
+tokens = math.min(capacidad, tokens + math.max(0, ahora - ts) * por_segundo)
+local espera = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    espera = (1 - tokens) / por_segundo
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(ahora))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacidad / por_segundo * 1000) + 1000)
+return tostring(espera)
+"""
+
+
+class RedisLimites:
+    """
+    Backend compartido entre workers y servidores, sobre cualquier cliente con
+    la interfaz de redis-py. Cada cubeta se actualiza con un script Lua, así
+    la lectura y la escritura son atómicas.
+    """
+
+    # Hace I/O: en modo asíncrono se llama en un hilo
+    bloquea = True
+
+    def __init__(self, cliente, prefijo='limites:'):
+        self.cliente = cliente
+        self.prefijo = prefijo
+        self._script = cliente.register_script(_SCRIPT_CUBETA)
+
+    def consumir(self, clave, capacidad, por_segundo):
+        espera = self._script(
+            keys=[f"{self.prefijo}cubeta:{clave}"], args=[capacidad, por_segundo, time.time()]
+        )
+        return float(espera)
+
+    def reclamar(self, clave, ttl):
+        return bool(self.cliente.set(
+            f"{self.prefijo}vuelo:{clave}", '1', nx=True, px=max(1, int(ttl * 1000))
+        ))
+
+    def publicar(self, clave, resultado, ventana):
+        pipe = self.cliente.pipeline()
+        if ventana > 0:
+            pipe.set(f"{self.prefijo}resultado:{clave}", json.dumps(resultado), px=int(ventana * 1000))
+        pipe.delete(f"{self.prefijo}vuelo:{clave}")
+        pipe.execute()
+
+    def resultado(self, clave):
+        valor = self.cliente.get(f"{self.prefijo}resultado:{clave}")
+        return None if valor is None else json.loads(valor)
+
+    def liberar(self, clave):
+        self.cliente.delete(f"{self.prefijo}vuelo:{clave}")
+
+
+class Limitador:
+    """
+    Token buckets por sesión y por IP. Cada límite es (ráfaga, por minuto):
+    se admiten `ráfaga` mensajes seguidos y después se recupera un mensaje
+    cada 60/`por minuto` segundos. Un límite con ráfaga 0 no se aplica.
+    """
+
+    def __init__(self, backend, por_sesion=(5, 20), por_ip=(30, 120)):
+        self.backend = backend
+        self.por_sesion = por_sesion
+        self.por_ip = por_ip
+
+    def _consumir(self, clave, limite):
+        rafaga, por_minuto = limite
+        if rafaga <= 0 or por_minuto <= 0:
+            return 0.0
+        return self.backend.consumir(clave, rafaga, por_minuto / 60)
+
+    def revisar(self, flujo, session_id, ip):
+        """None si se admite el mensaje; si no, (alcance, segundos de espera)"""
+        espera = self._consumir(f"ip:{ip}", self.por_ip)
+        if espera:
+            return 'ip', espera
+        if session_id:
+            espera = self._consumir(f"sesion:{flujo}:{session_id}", self.por_sesion)
+            if espera:
+                return 'sesion', espera
+        return None
+
+
+async def _sin_bloquear(backend, funcion, *args):
+    """Llama a `funcion` desde el event loop, en un hilo si el backend hace I/O"""
+    if getattr(backend, 'bloquea', True):
+        return await asyncio.to_thread(funcion, *args)
+    return funcion(*args)
+
+
+class _Vuelo:
+    __slots__ = ('evento', 'resultado', 'error')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class UnSoloVuelo:
+    """
+    Coalescencia de peticiones idénticas: mientras una clave está en vuelo,
+    las demás con la misma clave esperan su resultado en lugar de repetir el
+    trabajo.
+
+    Dentro del proceso los hilos esperan un Event. Entre procesos el primero
+    reclama la clave en el backend y publica el resultado (que debe ser
+    serializable a JSON); el resultado queda `ventana` segundos, así también
+    se absorbe un doble envío que llega justo después, salvo que
+    `conservar(resultado)` sea falso (p. ej. un error). Si quien reclamó la
+    clave falla o muere, otro la reclama al vencer y la hace él.
+    """
+
+    def __init__(self, backend, ventana=VENTANA_POR_DEFECTO, espera_maxima=ESPERA_MAXIMA_POR_DEFECTO,
+                 conservar=None):
+        self.backend = backend
+        self.ventana = ventana
+        self.espera_maxima = espera_maxima
+        self.conservar = conservar
+        self._lock = threading.Lock()
+        self._vuelos = {}
+        # Del modo asíncrono: solo los toca el event loop, no hace falta lock
+        self._vuelos_async = {}
+
+    def hacer(self, clave, funcion):
+        """Devuelve (resultado, compartido); `compartido` indica que lo calculó otra petición"""
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+
+        if not lider:
+            if vuelo.evento.wait(self.espera_maxima):
+                if vuelo.error is not None:
+                    raise vuelo.error
+                return vuelo.resultado, True
+            return funcion(), False
+
+        try:
+            resultado = self._entre_procesos(clave, funcion)
+            vuelo.resultado = resultado[0]
+            return resultado
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            vuelo.evento.set()
+            with self._lock:
+                self._vuelos.pop(clave, None)
+
+    def _entre_procesos(self, clave, funcion):
+        limite = time.monotonic() + self.espera_maxima
+        pausa = 0.01
+        while True:
+            previo = self.backend.resultado(clave)
+            if previo is not None:
+                return previo, True
+            if self.backend.reclamar(clave, self.espera_maxima):
+                try:
+                    resultado = funcion()
+                except BaseException:
+                    self.backend.liberar(clave)
+                    raise
+                conservar = self.conservar is None or self.conservar(resultado)
+                self.backend.publicar(clave, resultado, self.ventana if conservar else 0)
+                return resultado, False
+            if time.monotonic() >= limite:
+                return funcion(), False
+            # Otro worker la está resolviendo
+            time.sleep(pausa)
+            pausa = min(pausa * 2, 0.1)
+
+    async def hacer_async(self, clave, funcion):
+        """Como `hacer`, con `funcion` una corrutina y sin bloquear el event loop"""
+        vuelo = self._vuelos_async.get(clave)
+        if vuelo is not None:
+            # asyncio.wait no cancela el vuelo si se vence la espera
+            await asyncio.wait({vuelo}, timeout=self.espera_maxima)
+            if vuelo.done() and not vuelo.cancelled():
+                return vuelo.result()[0], True
+            return await funcion(), False
+
+        vuelo = self._vuelos_async[clave] = asyncio.get_running_loop().create_future()
+        try:
+            resultado = await self._entre_procesos_async(clave, funcion)
+            vuelo.set_result(resultado)
+            return resultado
+        except Exception as e:
+            vuelo.set_exception(e)
+            # Si nadie más la esperaba, que asyncio no la reporte como no leída
+            vuelo.exception()
+            raise
+        finally:
+            if not vuelo.done():
+                vuelo.cancel()
+            self._vuelos_async.pop(clave, None)
+
+    async def _entre_procesos_async(self, clave, funcion):
+        limite = time.monotonic() + self.espera_maxima
+        pausa = 0.01
+        while True:
+            previo = await _sin_bloquear(self.backend, self.backend.resultado, clave)
+            if previo is not None:
+                return previo, True
+            if await _sin_bloquear(self.backend, self.backend.reclamar, clave, self.espera_maxima):
+                try:
+                    resultado = await funcion()
+                except BaseException:
+                    await _sin_bloquear(self.backend, self.backend.liberar, clave)
+                    raise
+                conservar = self.conservar is None or self.conservar(resultado)
+                await _sin_bloquear(self.backend, self.backend.publicar, clave, resultado,
+                                    self.ventana if conservar else 0)
+                return resultado, False
+            if time.monotonic() >= limite:
+                return await funcion(), False
+            await asyncio.sleep(pausa)
+            pausa = min(pausa * 2, 0.1)
+
+
+def tipo_backend_limites():
+    return os.getenv('LIMITES_BACKEND', os.getenv('SESSION_STORE', 'memoria')).lower()
+
+
+def crear_backend_limites():
+    """
+    Backend de las variables de entorno: LIMITES_BACKEND=memoria|redis (por
+    defecto redis si SESSION_STORE=redis) y REDIS_URL.
+
+    Con varios workers hay que usar redis: en memoria cada worker lleva su
+    propia cuenta y el límite real queda multiplicado por la cantidad de
+    workers (gunicorn.conf.py lo advierte al arrancar).
+    """
+    tipo = tipo_backend_limites()
+    if tipo == 'redis':
+        import redis
+        return RedisLimites(redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0')))
+    return MemoriaLimites(int(os.getenv('LIMITES_MAX_CLAVES', MAX_CLAVES_POR_DEFECTO)))
+
+
+_lock_compartido = threading.Lock()
+_limitador = None
+_un_solo_vuelo = None
+
+
+def obtener_limitador():
+    """Limitador y coalescencia del proceso, creados en el primer uso con el mismo backend"""
+    global _limitador, _un_solo_vuelo
+    with _lock_compartido:
+        if _limitador is None:
+            backend = crear_backend_limites()
+            _limitador = Limitador(
+                backend,
+                por_sesion=(int(os.getenv('LIMITE_SESION_RAFAGA', 5)), float(os.getenv('LIMITE_SESION_POR_MINUTO', 20))),
+                por_ip=(int(os.getenv('LIMITE_IP_RAFAGA', 30)), float(os.getenv('LIMITE_IP_POR_MINUTO', 120)))
+            )
+            _un_solo_vuelo = UnSoloVuelo(
+                backend,
+                ventana=float(os.getenv('COALESCER_VENTANA', VENTANA_POR_DEFECTO)),
+                # Los errores no se reutilizan: un reintento debe volver a intentarlo
+                conservar=lambda resultado: resultado['codigo'] < 500
+            )
+        return _limitador, _un_solo_vuelo
+
+
+def confiar_proxies(app, cantidad=PROXIES_CONFIABLES):
+    """
+    Detrás de `cantidad` proxies, toma la IP del cliente de X-Forwarded-For
+    (y el esquema de X-Forwarded-Proto); si no, todos los clientes comparten
+    la cubeta de la IP del proxy. Sin proxies se deja remote_addr: ese header
+    lo puede inventar cualquiera.
+    """
+    if cantidad > 0:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=cantidad, x_proto=cantidad)
+    return app
+
+
+def _clave_vuelo(flujo, session_id, message):
+    clave = f"{flujo}\0{tienda_actual()}\0{session_id}\0{message}"
+    return hashlib.sha1(clave.encode('utf-8')).hexdigest()
+
+
+def _cabeceras(response):
+    """
+    Todas las cabeceras de la respuesta (ETag, Cache-Control, Vary...), para
+    repetirlas a quienes esperaban el mismo vuelo. El largo se recalcula.
+    """
+    return [[nombre, valor] for nombre, valor in response.headers.items() if nombre.lower() != 'content-length']
+
+
+def proteger(vista):
+    """
+    Aplica a un endpoint de chat los límites por IP y por sesión (429 con
+    Retry-After) y coalesce los (session_id, message) idénticos en vuelo:
+    comparten una sola llamada al modelo y reciben la misma respuesta.
+
+    Los mensajes sin session_id (crean sesión) y las respuestas en streaming
+    no se coalescen.
+    """
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        if request.method == 'OPTIONS':
+            return vista(*args, **kwargs)
+
+        flujo = request.blueprint or 'app'
+        data = request.get_json(silent=True)
+        data = data if isinstance(data, dict) else {}
+        session_id = data.get('session_id')
+        message = data.get('message')
+
+        limitador, un_solo_vuelo = obtener_limitador()
+        limitada = limitador.revisar(flujo, session_id, request.remote_addr)
+        if limitada is not None:
+            alcance, espera = limitada
+            contar_limitada(alcance)
+            response = jsonify({'error': MENSAJE_LIMITE, 'response': MENSAJE_LIMITE, 'status': 'error'})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, math.ceil(espera)))
+            return response
+
+        if not session_id or not isinstance(message, str) or quiere_stream(request):
+            return vista(*args, **kwargs)
+
+        def ejecutar():
+            response = current_app.make_response(vista(*args, **kwargs))
+            return {
+                'codigo': response.status_code,
+                'cuerpo': response.get_data(as_text=True),
+                'cabeceras': _cabeceras(response)
+            }
+
+        resultado, compartido = un_solo_vuelo.hacer(_clave_vuelo(flujo, session_id, message), ejecutar)
+        if compartido:
+            contar_coalescida()
+        return current_app.response_class(resultado['cuerpo'], status=resultado['codigo'], headers=resultado['cabeceras'])
+
+    return envoltura
+
+
+def proteger_async(vista):
+    """
+    Como `proteger`, para los handlers de Quart (chat_complet_async.py): los
+    mismos límites y la misma coalescencia, con el backend consultado sin
+    bloquear el event loop.
+    """
+    from quart import current_app, jsonify, request
+
+    @functools.wraps(vista)
+    async def envoltura(*args, **kwargs):
+        if request.method == 'OPTIONS':
+            return await vista(*args, **kwargs)
+
+        flujo = request.blueprint or 'app'
+        data = await request.get_json(silent=True)
+        data = data if isinstance(data, dict) else {}
+        session_id = data.get('session_id')
+        message = data.get('message')
+
+        limitador, un_solo_vuelo = obtener_limitador()
+        limitada = await _sin_bloquear(
+            limitador.backend, limitador.revisar, flujo, session_id, request.remote_addr
+        )
+        if limitada is not None:
+            alcance, espera = limitada
+            contar_limitada(alcance, flujo)
+            response = jsonify({'error': MENSAJE_LIMITE, 'response': MENSAJE_LIMITE, 'status': 'error'})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, math.ceil(espera)))
+            return response
+
+        if not session_id or not isinstance(message, str):
+            return await vista(*args, **kwargs)
+
+        async def ejecutar():
+            response = await current_app.make_response(await vista(*args, **kwargs))
+            return {
+                'codigo': response.status_code,
+                'cuerpo': await response.get_data(as_text=True),
+                'cabeceras': _cabeceras(response)
+            }
+
+        resultado, compartido = await un_solo_vuelo.hacer_async(_clave_vuelo(flujo, session_id, message), ejecutar)
+        if compartido:
+            contar_coalescida(flujo)
+        return current_app.response_class(resultado['cuerpo'], status=resultado['codigo'], headers=resultado['cabeceras'])
+
+    return envoltura
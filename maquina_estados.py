@@ -0,0 +1,287 @@
+import hashlib
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True, slots=True)
+class Campo:
+    """
+    Un dato del cliente que el flujo puede pedir.
+
+    `pedir` y `error` son plantillas que se formatean con los datos ya
+    recolectados (p. ej. "Gracias {nombre}!").
+    """
+    nombre: str
+    pedir: str
+    validar: object = None
+    error: str = None
+
+
+@dataclass(frozen=True, slots=True)
+class Flujo:
+    """
+    Declaración de un flujo de conversación.
+
+    - `campos`: datos que se pueden pedir.
+    - `requisitos`: tipo de consulta -> campos que necesita, en el orden en
+      que se piden (los de '*' primero). El tipo '*' aplica a cualquier
+      consulta; si está, se pide todo antes de conversar.
+    - `estado_pidiendo`: nombre del estado mientras se espera un campo
+      (admite '{campo}').
+    - `saludo`: respuesta al crear la sesión; si es None se empieza pidiendo
+      el primer campo requerido.
+    - `al_completar`: respuesta al terminar de recolectar los datos; si es
+      None se responde la consulta que los hizo pedir.
+    - `extraer`: función (mensaje, campo esperado o None) -> {campo: valor}
+      que saca de cualquier mensaje los datos que reconozca (ver
+      extractor_datos.py); así se completan varios en un solo turno.
+    """
+    nombre: str
+    campos: tuple
+    requisitos: dict = field(default_factory=dict)
+    estado_inicial: str = 'inicial'
+    estado_pidiendo: str = 'pidiendo_{campo}'
+    estado_activo: str = 'conversando'
+    saludo: str = None
+    al_completar: str = None
+    extraer: object = None
+
+
+@dataclass(slots=True)
+class Paso:
+    """
+    Resultado de procesar un mensaje. Si `respuesta` es None hay que
+    responder `consulta` (con el modelo o la caché) según `tipo_consulta`.
+    """
+    respuesta: str = None
+    esperando: str = None
+    error: bool = False
+    consulta: str = None
+    tipo_consulta: str = None
+
+
+class MaquinaEstados:
+    """
+    Ejecuta un Flujo. La declaración se compila una vez en tablas:
+
+    - cada campo tiene un bit; los requisitos de cada tipo de consulta son
+      una máscara (más su orden), y la sesión guarda la máscara de campos
+      que le faltan, así saber qué falta es un AND;
+    - cada estado apunta directo a su manejador (y al campo que espera).
+
+    El estado de la máquina vive en la sesión como enteros y textos cortos
+    (`sesion['maquina']`), de modo que pausar y reanudar una sesión guardada
+    en un store externo no requiere recalcular nada. Si la declaración del
+    flujo cambió desde que se guardó, la firma no coincide y el estado se
+    reconstruye a partir de los datos del cliente.
+    """
+
+    def __init__(self, flujo):
+        self.flujo = flujo
+        self.extraer = flujo.extraer
+        self.campos = tuple(flujo.campos)
+        if len(self.campos) > 64:
+            raise ValueError("Un flujo admite hasta 64 campos")
+        self._indice = {campo.nombre: i for i, campo in enumerate(self.campos)}
+        self.todos = (1 << len(self.campos)) - 1
+
+        self.requisitos = {
+            tipo: self.mascara(nombres) for tipo, nombres in flujo.requisitos.items()
+        }
+        self._siempre = self.requisitos.get('*', 0)
+        # Orden en que se piden los campos de cada tipo: los de '*' y después los del tipo
+        siempre = tuple(flujo.requisitos.get('*', ()))
+        self._orden = {
+            tipo: tuple(self._indice[nombre] for nombre in dict.fromkeys(siempre + tuple(nombres)))
+            for tipo, nombres in flujo.requisitos.items()
+        }
+
+        # Tabla de despacho: estado -> (manejador, índice del campo esperado o -1)
+        self._estados_campo = tuple(
+            flujo.estado_pidiendo.format(campo=campo.nombre) for campo in self.campos
+        )
+        self._despacho = {
+            flujo.estado_inicial: (self._consultar, -1),
+            flujo.estado_activo: (self._consultar, -1),
+        }
+        for i, estado in enumerate(self._estados_campo):
+            # Si varios campos comparten estado ('recolectando_datos') el campo sale de la sesión
+            campo = -1 if self._estados_campo.count(estado) > 1 else i
+            self._despacho[estado] = (self._recibir_campo, campo)
+
+        declaracion = repr((
+            [c.nombre for c in self.campos], sorted(flujo.requisitos.items()),
+            flujo.estado_inicial, flujo.estado_pidiendo, flujo.estado_activo
+        ))
+        self.firma = hashlib.blake2b(declaracion.encode('utf-8'), digest_size=4).hexdigest()
+
+    def mascara(self, nombres):
+        mascara = 0
+        for nombre in nombres:
+            mascara |= 1 << self._indice[nombre]
+        return mascara
+
+    def nombres(self, mascara):
+        return [campo.nombre for i, campo in enumerate(self.campos) if mascara >> i & 1]
+
+    # --- Sesión -----------------------------------------------------------------
+
+    def nueva_sesion(self, mensaje=None, clasificar=None):
+        """
+        (sesion, paso) de una conversación que empieza. Si el primer
+        `mensaje` ya trae el primer dato que se pediría, se sigue como si lo
+        hubiera respondido (hace falta `clasificar`, ver `procesar`).
+        """
+        sesion = {'datos_cliente': {}, 'estado': self.flujo.estado_inicial, 'tipo_consulta': None}
+        maquina = sesion['maquina'] = {'firma': self.firma, 'faltan': self.todos, 'esperando': -1, 'pendiente': None}
+        primero = self._siguiente(self._siempre or self.todos, '*')
+        if mensaje and self._extraer(sesion, maquina, mensaje, None) >> primero & 1:
+            return sesion, self._continuar(sesion, maquina, mensaje, clasificar)
+        if self.flujo.saludo is not None:
+            return sesion, Paso(self._formatear(self.flujo.saludo, sesion), self.campos[primero].nombre)
+        return sesion, self._pedir(sesion, primero)
+
+    def reanudar(self, sesion):
+        """
+        Estado de la máquina de una sesión recién leída del store. Con la misma
+        firma es O(1); si no, se reconstruye desde `datos_cliente` y el estado.
+        """
+        maquina = sesion.get('maquina')
+        if maquina is not None and maquina.get('firma') == self.firma:
+            return maquina
+
+        datos = sesion.setdefault('datos_cliente', {})
+        faltan = self.todos
+        for nombre, valor in datos.items():
+            if valor and nombre in self._indice:
+                faltan &= ~(1 << self._indice[nombre])
+
+        estado = sesion.get('estado', self.flujo.estado_inicial)
+        esperando = -1
+        if estado in self._despacho and self._despacho[estado][1] >= 0:
+            esperando = self._despacho[estado][1]
+        elif sesion.get('waiting_for') in self._indice:
+            esperando = self._indice[sesion.pop('waiting_for')]
+        elif estado not in self._despacho:
+            sesion['estado'] = self.flujo.estado_inicial
+
+        maquina = {'firma': self.firma, 'faltan': faltan, 'esperando': esperando, 'pendiente': None}
+        sesion['maquina'] = maquina
+        return maquina
+
+    def esperando(self, sesion):
+        i = self.reanudar(sesion)['esperando']
+        return self.campos[i].nombre if i >= 0 else None
+
+    def faltantes(self, sesion, tipo_consulta):
+        """Campos que le faltan a la sesión para ese tipo de consulta"""
+        return self.nombres(self._faltan_para(self.reanudar(sesion), tipo_consulta))
+
+    # --- Transiciones -----------------------------------------------------------
+
+    def procesar(self, sesion, mensaje, clasificar):
+        """
+        Aplica un mensaje a la sesión (que se modifica en el lugar) y devuelve
+        el Paso. `clasificar(mensaje)` da el tipo de consulta y solo se llama
+        cuando el mensaje es una consulta.
+        """
+        maquina = self.reanudar(sesion)
+        manejador, _ = self._despacho.get(sesion['estado'], (self._consultar, -1))
+        return manejador(sesion, maquina, mensaje, clasificar)
+
+    def _consultar(self, sesion, maquina, mensaje, clasificar):
+        self._extraer(sesion, maquina, mensaje, None)
+        tipo = clasificar(mensaje)
+        sesion['tipo_consulta'] = tipo
+        faltan = self._faltan_para(maquina, tipo)
+        if faltan:
+            maquina['pendiente'] = [mensaje, tipo]
+            return self._pedir(sesion, self._siguiente(faltan, tipo))
+        return Paso(consulta=mensaje, tipo_consulta=tipo)
+
+    def _recibir_campo(self, sesion, maquina, mensaje, clasificar):
+        i = maquina['esperando']
+        if i < 0:
+            return self._consultar(sesion, maquina, mensaje, clasificar)
+        campo = self.campos[i]
+        # Si el mensaje trae datos reconocibles se guardan los que faltan; el
+        # mensaje entero es el dato pedido solo si no trae ninguno (un email
+        # escrito cuando se pedía el nombre no queda como nombre)
+        datos = self._extraidos(mensaje, campo.nombre)
+        if datos:
+            self._guardar(sesion, maquina, datos)
+        else:
+            if campo.validar is not None and not campo.validar(mensaje):
+                return Paso(self._formatear(campo.error, sesion), campo.nombre, error=True)
+            sesion['datos_cliente'][campo.nombre] = mensaje
+            maquina['faltan'] &= ~(1 << i)
+        return self._continuar(sesion, maquina, mensaje, clasificar)
+
+    def _continuar(self, sesion, maquina, mensaje, clasificar):
+        """Después de guardar datos: pide el siguiente que falte o retoma la conversación"""
+        pendiente = maquina['pendiente']
+        tipo = pendiente[1] if pendiente else None
+        faltan = self._faltan_para(maquina, tipo)
+        if faltan:
+            return self._pedir(sesion, self._siguiente(faltan, tipo))
+
+        maquina['esperando'] = -1
+        maquina['pendiente'] = None
+        sesion['estado'] = self.flujo.estado_activo
+        if self.flujo.al_completar is not None:
+            return Paso(self._formatear(self.flujo.al_completar, sesion))
+        if pendiente:
+            # Se responde la consulta que hizo pedir los datos, no el último dato
+            sesion['tipo_consulta'] = tipo
+            return Paso(consulta=pendiente[0], tipo_consulta=tipo)
+        return self._consultar(sesion, maquina, mensaje, clasificar)
+
+    # --- Auxiliares -------------------------------------------------------------
+
+    def _extraidos(self, mensaje, esperando):
+        return self.extraer(mensaje, esperando) if self.extraer is not None else {}
+
+    def _extraer(self, sesion, maquina, mensaje, esperando):
+        """Guarda los datos que faltaban y trae el mensaje; devuelve la máscara de los guardados"""
+        return self._guardar(sesion, maquina, self._extraidos(mensaje, esperando))
+
+    def _guardar(self, sesion, maquina, datos):
+        guardados = 0
+        for nombre, valor in datos.items():
+            i = self._indice.get(nombre)
+            if i is not None and maquina['faltan'] >> i & 1:
+                sesion['datos_cliente'][nombre] = valor
+                guardados |= 1 << i
+        maquina['faltan'] &= ~guardados
+        return guardados
+
+    def _faltan_para(self, maquina, tipo):
+        return (self._siempre | self.requisitos.get(tipo, 0)) & maquina['faltan']
+
+    @staticmethod
+    def _primero(mascara):
+        return (mascara & -mascara).bit_length() - 1
+
+    def _siguiente(self, faltan, tipo):
+        """El campo que falta que va primero en el orden del requisito del tipo"""
+        for i in self._orden.get(tipo, self._orden.get('*', ())):
+            if faltan >> i & 1:
+                return i
+        return self._primero(faltan)
+
+    def _pedir(self, sesion, i):
+        maquina = sesion['maquina']
+        maquina['esperando'] = i
+        sesion['estado'] = self._estados_campo[i]
+        campo = self.campos[i]
+        return Paso(self._formatear(campo.pedir, sesion), campo.nombre)
+
+    @staticmethod
+    def _formatear(plantilla, sesion):
+        return plantilla.format_map(_Datos(sesion['datos_cliente']))
+
+
+class _Datos(dict):
+    """Los campos que aún no se tienen quedan vacíos en las plantillas"""
+
+    def __missing__(self, clave):
+        return ''
@@ -0,0 +1,222 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import Response, g, has_request_context, request
+
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ''
+    pares = ','.join(f'{n}="{str(v)}"' for n, v in zip(nombres, valores))
+    return '{' + pares + '}'
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def inc(self, *valores, cantidad=1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def exponer(self, tipo='counter'):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {tipo}"]
+        with self._lock:
+            for valores, total in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {total}")
+        return lineas
+
+
+class Gauge(Contador):
+    def dec(self, *valores, cantidad=1):
+        self.inc(*valores, cantidad=-cantidad)
+
+    def exponer(self, tipo='gauge'):
+        return super().exponer(tipo)
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # valores de etiquetas -> [conteo por bucket..., +Inf], suma
+        self._series = {}
+
+    def observar(self, segundos, *valores):
+        posicion = bisect.bisect_left(self.buckets, segundos)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][posicion] += 1
+            serie[1] += segundos
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        nombres = self.etiquetas + ('le',)
+        with self._lock:
+            for valores, (conteos, suma) in sorted(self._series.items()):
+                acumulado = 0
+                for limite, conteo in zip(self.buckets + ('+Inf',), conteos):
+                    acumulado += conteo
+                    lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres, valores + (limite,))} {acumulado}")
+                etiquetas = _etiquetas(self.etiquetas, valores)
+                lineas.append(f"{self.nombre}_sum{etiquetas} {suma:.6f}")
+                lineas.append(f"{self.nombre}_count{etiquetas} {acumulado}")
+        return lineas
+
+
+peticiones = Histograma('chat_request_seconds', 'Duración de las peticiones HTTP', ('flujo', 'endpoint', 'codigo'))
+etapas = Histograma('chat_stage_seconds', 'Duración de cada etapa del procesamiento de un mensaje', ('flujo', 'etapa'))
+en_vuelo = Gauge('chat_requests_in_flight', 'Peticiones en curso', ('flujo',))
+estados = Contador('chat_state_total', 'Mensajes procesados por estado de la conversación', ('flujo', 'estado'))
+tipos_consulta = Contador('chat_query_type_total', 'Consultas por tipo identificado', ('flujo', 'tipo'))
+limitadas = Contador('chat_rate_limited_total', 'Mensajes rechazados por límite de frecuencia', ('flujo', 'alcance'))
+coalescidas = Contador('chat_coalesced_total', 'Mensajes repetidos que reutilizaron una respuesta en vuelo', ('flujo',))
+
+_metricas = [peticiones, etapas, en_vuelo, estados, tipos_consulta, limitadas, coalescidas]
+_recolectores = []
+
+
+def registrar_recolector(funcion):
+    """`funcion()` devuelve un dict nombre -> valor numérico que se expone como gauge al consultar /metrics"""
+    _recolectores.append(funcion)
+    return funcion
+
+
+# Flujo de la petición en curso fuera de Flask: los handlers de Quart lo fijan
+# con fijar_flujo (ver asgi.py) y asyncio.to_thread lo copia a sus hilos
+_flujo_actual = ContextVar('flujo_actual', default=None)
+
+
+def _flujo():
+    if has_request_context():
+        return request.blueprint or 'app'
+    return _flujo_actual.get() or 'batch'
+
+
+def fijar_flujo(flujo):
+    """Etiqueta con `flujo` las métricas de lo que queda de la petición (modo ASGI)"""
+    _flujo_actual.set(flujo)
+
+
+# Tiempos por etapa de un trabajo que corre en otro hilo de la misma petición (ver tiempos_aparte)
+_tiempos_aparte = ContextVar('tiempos_aparte', default=None)
+
+
+@contextmanager
+def etapa(nombre):
+    """Mide una etapa del procesamiento y la agrega al header Server-Timing"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        etapas.observar(duracion, _flujo(), nombre)
+        tiempos = _tiempos_aparte.get()
+        if tiempos is None and has_request_context():
+            tiempos = g.setdefault('tiempos_etapas', {})
+        if tiempos is not None:
+            tiempos[nombre] = tiempos.get(nombre, 0.0) + duracion
+
+
+@contextmanager
+def tiempos_aparte():
+    """
+    Las etapas medidas adentro se suman a un dict propio en lugar del de la
+    petición: los hilos de un lote comparten `g`. Al terminar, el hilo de la
+    petición los suma con `sumar_tiempos`.
+    """
+    tiempos = {}
+    token = _tiempos_aparte.set(tiempos)
+    try:
+        yield tiempos
+    finally:
+        _tiempos_aparte.reset(token)
+
+
+def sumar_tiempos(tiempos):
+    if has_request_context():
+        acumulados = g.setdefault('tiempos_etapas', {})
+        for nombre, segundos in tiempos.items():
+            acumulados[nombre] = acumulados.get(nombre, 0.0) + segundos
+
+
+def contar_estado(estado):
+    estados.inc(_flujo(), estado)
+
+
+def contar_tipo_consulta(tipo):
+    tipos_consulta.inc(_flujo(), tipo)
+
+
+def contar_limitada(alcance, flujo=None):
+    limitadas.inc(flujo or _flujo(), alcance)
+
+
+def contar_coalescida(flujo=None):
+    coalescidas.inc(flujo or _flujo())
+
+
+def exponer():
+    lineas = []
+    for metrica in _metricas:
+        lineas.extend(metrica.exponer())
+    for recolector in _recolectores:
+        for nombre, valor in sorted(recolector().items()):
+            lineas.append(f"# TYPE {nombre} gauge")
+            lineas.append(f"{nombre} {valor}")
+    return "\n".join(lineas) + "\n"
+
+
+def instrumentar(app):
+    """Mide todas las peticiones de `app`, agrega Server-Timing y expone GET /metrics"""
+
+    @app.before_request
+    def _inicio():
+        g.inicio_peticion = time.perf_counter()
+        g.flujo_peticion = request.blueprint or 'app'
+        en_vuelo.inc(g.flujo_peticion)
+        if request.is_json:
+            # El cuerpo se parsea acá, antes que cualquier otro hook: proteger, la
+            # tienda y la vista leen después la copia que Flask cachea
+            with etapa('json'):
+                request.get_json(silent=True)
+
+    @app.after_request
+    def _fin(response):
+        inicio = g.pop('inicio_peticion', None)
+        if inicio is None:
+            return response
+        duracion = time.perf_counter() - inicio
+        peticiones.observar(duracion, g.flujo_peticion, request.endpoint or '-', response.status_code)
+
+        tiempos = g.get('tiempos_etapas', {})
+        partes = [f"{nombre};dur={1000 * segundos:.1f}" for nombre, segundos in tiempos.items()]
+        partes.append(f"total;dur={1000 * duracion:.1f}")
+        response.headers['Server-Timing'] = ", ".join(partes)
+        return response
+
+    @app.teardown_request
+    def _liberar(_error=None):
+        flujo = g.pop('flujo_peticion', None)
+        if flujo is not None:
+            en_vuelo.dec(flujo)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(exponer(), mimetype='text/plain; version=0.0.4')
+
+    return app
@@ -0,0 +1,174 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from gateway import CircuitBreaker, ModelGateway
+from metricas import registrar_recolector
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_gateway = None
+
+MAX_CONTEXTOS = 32
+
+
+class GeminiConContexto:
+    """
+    GenerativeModel que acepta `contexto=ContextoFijo` en generate_content.
+
+    La parte fija del prompt se registra una sola vez por clave: como
+    contenido cacheado de Gemini (GEMINI_CACHE_CONTEXTO=1, se renueva antes
+    de que venza su `ttl`) o, si no se puede cachear (p. ej. por debajo del
+    mínimo de tokens del modelo), como instrucción de sistema.
+
+    Solo el contenido cacheado ahorra bytes: así cada llamada manda solo la
+    parte del turno. La instrucción de sistema el cliente la vuelve a mandar
+    en cada llamada, así que sin caché lo único que se ahorra es armar la
+    parte fija en cada turno. `bytes_turno` y `bytes_instruccion` cuentan lo
+    que sale en cada llamada (el prompt y la instrucción reenviada).
+    """
+
+    def __init__(self, nombre_modelo, cachear=False, ttl=3600, max_contextos=MAX_CONTEXTOS):
+        import google.generativeai as genai
+
+        self._genai = genai
+        self.nombre_modelo = nombre_modelo
+        self.cachear = cachear
+        self.ttl = ttl
+        self.max_contextos = max_contextos
+        self._base = genai.GenerativeModel(nombre_modelo)
+        self._lock = threading.Lock()
+        # clave -> (GenerativeModel, vencimiento en time.monotonic(), bytes que se reenvían por llamada)
+        self._modelos = OrderedDict()
+        self.registros = 0
+        self.bytes_turno = 0
+        self.bytes_instruccion = 0
+
+    def _registrar(self, contexto):
+        genai = self._genai
+        if self.cachear:
+            try:
+                cache = genai.caching.CachedContent.create(
+                    model=self.nombre_modelo, display_name=contexto.clave,
+                    system_instruction=contexto.texto, ttl=timedelta(seconds=self.ttl)
+                )
+                # Se renueva con margen, antes de que Gemini lo borre
+                modelo = genai.GenerativeModel.from_cached_content(cached_content=cache)
+                return modelo, time.monotonic() + 0.9 * self.ttl, 0
+            except Exception as e:
+                logger.warning("No se pudo cachear el contexto %s: %s", contexto.clave, e)
+        modelo = genai.GenerativeModel(self.nombre_modelo, system_instruction=contexto.texto)
+        return modelo, float('inf'), len(contexto.texto.encode('utf-8'))
+
+    def _entrada(self, contexto):
+        with self._lock:
+            entrada = self._modelos.get(contexto.clave)
+            if entrada is not None and entrada[1] > time.monotonic():
+                self._modelos.move_to_end(contexto.clave)
+                return entrada
+        # Fuera del lock: crear el contenido cacheado es una llamada a la API
+        entrada = self._registrar(contexto)
+        with self._lock:
+            self._modelos[contexto.clave] = entrada
+            self.registros += 1
+            while len(self._modelos) > self.max_contextos:
+                self._modelos.popitem(last=False)
+        return entrada
+
+    def _modelo(self, contexto, prompt):
+        """El modelo para `contexto`, contando los bytes que salen en esta llamada"""
+        if contexto is None:
+            modelo, reenviados = self._base, 0
+        else:
+            modelo, _, reenviados = self._entrada(contexto)
+        bytes_prompt = len(prompt.encode('utf-8')) if isinstance(prompt, str) else 0
+        with self._lock:
+            self.bytes_turno += bytes_prompt
+            self.bytes_instruccion += reenviados
+        return modelo
+
+    def calentar(self, contextos=()):
+        """
+        Registra `contextos` y abre la conexión con una llamada barata
+        (count_tokens usa el mismo cliente que generate_content)
+        """
+        for contexto in contextos:
+            self._entrada(contexto)
+        self._base.count_tokens("hola")
+
+    def generate_content(self, prompt, contexto=None, **kwargs):
+        return self._modelo(contexto, prompt).generate_content(prompt, **kwargs)
+
+    async def generate_content_async(self, prompt, contexto=None, **kwargs):
+        return await self._modelo(contexto, prompt).generate_content_async(prompt, **kwargs)
+
+
+def crear_gateway(model):
+    """Envuelve `model` con la configuración de las variables GEMINI_*"""
+    return ModelGateway(
+        model,
+        max_en_vuelo=int(os.getenv('GEMINI_MAX_EN_VUELO', 8)),
+        max_en_vuelo_async=int(os.getenv('GEMINI_MAX_EN_VUELO_ASYNC', 64)),
+        timeout=float(os.getenv('GEMINI_TIMEOUT', 30)),
+        espera_maxima=float(os.getenv('GEMINI_ESPERA_MAXIMA', 10)),
+        reintentos=int(os.getenv('GEMINI_REINTENTOS', 2)),
+        breaker=CircuitBreaker(
+            umbral=int(os.getenv('GEMINI_CIRCUITO_UMBRAL', 5)),
+            enfriamiento=float(os.getenv('GEMINI_CIRCUITO_ENFRIAMIENTO', 30))
+        )
+    )
+
+
+def obtener_modelo():
+    """Devuelve el gateway del modelo, compartido por todos los módulos del proceso"""
+    global _gateway
+    with _lock:
+        if _gateway is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+            _gateway = crear_gateway(GeminiConContexto(
+                os.getenv('GEMINI_MODEL', 'gemini-pro'),
+                cachear=os.getenv('GEMINI_CACHE_CONTEXTO', '0') == '1',
+                ttl=int(os.getenv('GEMINI_CACHE_TTL', 3600))
+            ))
+        return _gateway
+
+
+def latencia_promedio_modelo():
+    """Latencia promedio de las llamadas al modelo en segundos (None si todavía no hubo llamadas)"""
+    if _gateway is None:
+        return None
+    promedio_ms = _gateway.estadisticas()['latencia_modelo']['promedio_ms']
+    return promedio_ms / 1000 if promedio_ms else None
+
+
+class ModeloPerezoso:
+    """
+    Se comporta como el gateway pero recién lo crea (e importa
+    google.generativeai) en la primera llamada, para que importar los
+    módulos de chat sea rápido.
+    """
+
+    def __getattr__(self, nombre):
+        return getattr(obtener_modelo(), nombre)
+
+
+modelo_compartido = ModeloPerezoso()
+
+
+@registrar_recolector
+def metricas_gateway():
+    """Contadores del gateway para /metrics (vacío si el modelo aún no se creó)"""
+    if _gateway is None:
+        return {}
+    stats = _gateway.estadisticas()
+    metricas = {f'gemini_{nombre}_total': stats[nombre] for nombre in _gateway.contadores}
+    metricas['gemini_circuito_abierto'] = int(stats['circuito'] != 'cerrado')
+    metricas['gemini_espera_cola_promedio_ms'] = stats['espera_cola']['promedio_ms']
+    metricas['gemini_latencia_promedio_ms'] = stats['latencia_modelo']['promedio_ms']
+    return metricas
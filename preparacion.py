@@ -0,0 +1,95 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+from flask import jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# Cuánto puede cachear el navegador la respuesta a un preflight CORS (Chrome la limita a 2 horas)
+CORS_MAX_AGE = int(os.getenv('CORS_MAX_AGE', 7200))
+
+_lock = threading.Lock()
+_listo = threading.Event()
+_pasos = {}
+
+
+def _paso(nombre, funcion):
+    """Corre un paso del calentamiento; si falla queda registrado pero no frena a los demás"""
+    inicio = time.perf_counter()
+    try:
+        resultado = funcion()
+        error = None
+    except Exception as e:
+        logger.warning("Calentamiento %s falló: %s", nombre, e)
+        resultado, error = None, f'{type(e).__name__}: {e}'
+    with _lock:
+        _pasos[nombre] = {'ms': round(1000 * (time.perf_counter() - inicio), 1), 'error': error}
+    return resultado
+
+
+def calentar(app):
+    """
+    Deja el proceso listo antes de atender: importa google.generativeai y crea
+    el gateway, arma lo que cada flujo arma en su primera consulta (catálogo,
+    contexto fijo del prompt, respuestas directas), registra esos contextos
+    fijos en el modelo y abre su conexión (el cliente la reutiliza después),
+    y abre el store de sesiones, la bitácora y el backend de límites.
+
+    Cada flujo puede definir `calentar()` en su módulo, que devuelve los
+    ContextoFijo que va a usar. Hay que llamarlo en cada proceso que atiende
+    (después del fork, ver gunicorn.conf.py): las conexiones no sobreviven al fork.
+    """
+    from bitacora import obtener_bitacora
+    from limites import obtener_limitador
+    from modelo import obtener_modelo
+    from sesiones import obtener_store
+
+    gateway = _paso('modulos', obtener_modelo)
+
+    contextos = []
+    for blueprint in app.blueprints.values():
+        calentar_flujo = getattr(sys.modules.get(blueprint.import_name), 'calentar', None)
+        if calentar_flujo is not None:
+            contextos.extend(_paso(f'flujo_{blueprint.name}', calentar_flujo) or ())
+
+    if gateway is not None:
+        _paso('modelo', lambda: gateway.calentar(contextos))
+    _paso('sesiones', lambda: obtener_store().existe('calentamiento'))
+    _paso('bitacora', obtener_bitacora)
+    _paso('limites', obtener_limitador)
+    _listo.set()
+    return estado()
+
+
+def estado():
+    with _lock:
+        pasos = {nombre: dict(paso) for nombre, paso in _pasos.items()}
+    return {'listo': _listo.is_set(), 'pasos': pasos}
+
+
+def preparar(app):
+    """
+    Agrega GET /ready (503 hasta que termina `calentar`) y responde los
+    preflight CORS antes que cualquier otro hook de la petición.
+    """
+
+    @app.before_request
+    def _preflight():
+        # Solo los preflight de verdad: un OPTIONS sin Access-Control-Request-Method sigue su curso
+        if request.method == 'OPTIONS' and 'Access-Control-Request-Method' in request.headers:
+            # Flask-CORS agrega los headers (y Access-Control-Max-Age) en su after_request
+            return app.make_default_options_response()
+        return None
+
+    # Que corra antes que los before_request ya registrados (métricas, tiendas)
+    app.before_request_funcs[None].insert(0, app.before_request_funcs[None].pop())
+
+    @app.route('/ready')
+    def ready():
+        datos = estado()
+        return jsonify({'status': 'success' if datos['listo'] else 'error', **datos}), 200 if datos['listo'] else 503
+
+    return app
@@ -0,0 +1,108 @@
+import bisect
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# Una promoción sigue activa durante todo el instante de su fecha_fin
+_DESPUES_DE_FIN = timedelta(microseconds=1)
+
+
+class _LineaDeTiempo:
+    """
+    Divide el tiempo en los intervalos [limites[i], limites[i+1]) en los que
+    el conjunto de promociones activas no cambia, y guarda ese conjunto para
+    cada uno. Buscar qué está activo en `t` es un bisect.
+
+    Memoria: un límite por inicio y fin, más las promociones activas de cada
+    intervalo (crece con cuánto se superponen las promociones).
+    """
+
+    def __init__(self, promociones):
+        empiezan = defaultdict(list)
+        terminan = defaultdict(list)
+        for i, promo in enumerate(promociones):
+            empiezan[promo.inicio].append(i)
+            terminan[promo.fin + _DESPUES_DE_FIN].append(i)
+
+        self.limites = sorted(empiezan.keys() | terminan.keys())
+        self.activas = []
+        actuales = set()
+        for limite in self.limites:
+            actuales.difference_update(terminan.get(limite, ()))
+            actuales.update(empiezan.get(limite, ()))
+            # En el orden del archivo
+            self.activas.append(tuple(promociones[i] for i in sorted(actuales)))
+
+    def en(self, t):
+        i = bisect.bisect_right(self.limites, t) - 1
+        return self.activas[i] if i >= 0 else ()
+
+    def vigencia(self, t):
+        """Intervalo [desde, hasta) que contiene a `t`; en `hasta` cambia el conjunto activo"""
+        i = bisect.bisect_right(self.limites, t)
+        desde = self.limites[i - 1] if i else datetime.min
+        hasta = self.limites[i] if i < len(self.limites) else datetime.max
+        return desde, hasta
+
+
+class CalendarioPromociones:
+    """
+    Índice de promociones construido una vez por versión del catálogo.
+
+    Las promociones sin `categorias` ni `productos` son generales; las demás
+    se indexan además por cada categoría y cada id de producto al que aplican.
+    Todas las consultas son O(log n) más el tamaño de la respuesta.
+    """
+
+    def __init__(self, promociones):
+        self.promociones = list(promociones)
+        self._orden = {id(promo): i for i, promo in enumerate(self.promociones)}
+
+        generales = []
+        por_categoria = defaultdict(list)
+        por_producto = defaultdict(list)
+        for promo in self.promociones:
+            if not promo.categorias and not promo.productos:
+                generales.append(promo)
+            for categoria in promo.categorias:
+                por_categoria[categoria].append(promo)
+            for producto_id in promo.productos:
+                por_producto[producto_id].append(promo)
+
+        self._todas = _LineaDeTiempo(self.promociones)
+        self._generales = _LineaDeTiempo(generales)
+        self._por_categoria = {c: _LineaDeTiempo(p) for c, p in por_categoria.items()}
+        self._por_producto = {p: _LineaDeTiempo(ps) for p, ps in por_producto.items()}
+
+    def __len__(self):
+        return len(self.promociones)
+
+    def activas(self, t):
+        """Todas las promociones activas en `t`"""
+        return list(self._todas.en(t))
+
+    def vigencia(self, t):
+        """(desde, hasta): mientras `t` esté en ese rango, `activas(t)` no cambia"""
+        return self._todas.vigencia(t)
+
+    def proximo_cambio(self, t):
+        return self._todas.vigencia(t)[1]
+
+    def generales(self, t):
+        return list(self._generales.en(t))
+
+    def de_categoria(self, categoria, t):
+        linea = self._por_categoria.get(categoria)
+        return list(linea.en(t)) if linea else []
+
+    def de_producto(self, producto_id, t):
+        linea = self._por_producto.get(producto_id)
+        return list(linea.en(t)) if linea else []
+
+    def activas_para(self, t, categorias=(), productos=()):
+        """Las generales más las de esas categorías y productos, sin repetir y en el orden del archivo"""
+        encontradas = {id(promo): promo for promo in self._generales.en(t)}
+        for categoria in categorias:
+            encontradas.update((id(p), p) for p in self.de_categoria(categoria, t))
+        for producto_id in productos:
+            encontradas.update((id(p), p) for p in self.de_producto(producto_id, t))
+        return sorted(encontradas.values(), key=lambda promo: self._orden[id(promo)])
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+
+from texto import normalizar, raiz, tokens
+
+# Mínima proporción de palabras del mensaje que deben ser de la intención
+UMBRAL_POR_DEFECTO = float(os.getenv('RESPUESTAS_DIRECTAS_UMBRAL', 0.6))
+
+# Intención -> (disparadores, relleno). Hace falta al menos un disparador; el
+# relleno son palabras que suelen acompañarlos y no bajan la confianza.
+INTENCIONES = {
+    'horario': (
+        'horario hora abren abre abierto abiertos cierran cierra atienden atencion',
+        'lunes martes miercoles jueves viernes sabado domingo feriado dia hoy tienda ustedes hasta desde'
+    ),
+    'ubicacion': (
+        'donde direccion ubicado ubicados ubicacion ubican quedan queda encuentran local',
+        'tienda ustedes exactamente fisica'
+    ),
+    'telefono': (
+        'telefono llamar llamo contacto contactar',
+        'numero tienda ustedes'
+    ),
+    'pago': (
+        'pago pagar tarjeta efectivo transferencia debito credito',
+        'metodo forma medio aceptan acepta puedo'
+    ),
+    'devolucion': (
+        'devolucion devoluciones devolver cambio cambios cambiar',
+        'politica prenda plazo dia puedo'
+    ),
+}
+
+ETIQUETAS_DIAS = {
+    'lunes_viernes': 'Lunes a Viernes',
+    'sabados': 'Sábados',
+    'domingos': 'Domingos',
+}
+
+
+def _raices(palabras):
+    return frozenset(raiz(normalizar(p)) for p in palabras.split())
+
+
+def _enumerar(valores):
+    valores = list(valores)
+    if len(valores) < 2:
+        return ''.join(valores)
+    return f"{', '.join(valores[:-1])} y {valores[-1]}"
+
+
+def respuestas_de_tienda(info):
+    """
+    Respuestas fijas a partir de los datos de la tienda: sirve para los
+    STORE_INFO de los flujos y para info_general de store_data.json. Solo hay
+    respuesta para lo que esté en los datos.
+    """
+    respuestas = {}
+    horarios = info.get('horarios')
+    if isinstance(horarios, dict) and horarios:
+        lineas = [f"- {ETIQUETAS_DIAS.get(dia, dia.replace('_', ' ').capitalize())}: {horas}"
+                  for dia, horas in horarios.items()]
+        respuestas['horario'] = "Nuestros horarios de atención son:\n" + "\n".join(lineas)
+    elif info.get('horario'):
+        respuestas['horario'] = f"Nuestro horario de atención es: {info['horario']}."
+    if info.get('direccion'):
+        respuestas['ubicacion'] = f"Estamos ubicados en {info['direccion']}."
+    if info.get('telefono'):
+        respuestas['telefono'] = f"Puedes llamarnos al {info['telefono']}."
+    if info.get('metodos_pago'):
+        respuestas['pago'] = f"Aceptamos estos métodos de pago: {_enumerar(info['metodos_pago'])}."
+    if info.get('politica_devoluciones'):
+        respuestas['devolucion'] = f"Nuestra política de cambios y devoluciones: {info['politica_devoluciones']}."
+    return respuestas
+
+
+class RespuestasDirectas:
+    """
+    Responde sin el modelo las preguntas sobre datos fijos de la tienda
+    (horario, dirección, teléfono, pagos, devoluciones).
+
+    Las respuestas se arman una vez a partir de los datos. Un mensaje se
+    responde solo si es de tipo 'general', tiene disparadores de una sola
+    intención y casi todas sus palabras son de esa intención (confianza >=
+    `umbral`); si no, devuelve None y la consulta sigue hacia el modelo.
+    """
+
+    def __init__(self, respuestas=None, umbral=UMBRAL_POR_DEFECTO, intenciones=INTENCIONES,
+                 latencia_modelo=None):
+        self.umbral = umbral
+        self._intenciones = {
+            intencion: (_raices(disparadores), _raices(relleno))
+            for intencion, (disparadores, relleno) in intenciones.items()
+        }
+        # Devuelve la latencia promedio del modelo en segundos, para estimar el ahorro
+        self._latencia_modelo = latencia_modelo
+        self._lock = threading.Lock()
+        self.respuestas = dict(respuestas or {})
+
+        self.consultas = 0
+        self.directas = 0
+        self.baja_confianza = 0
+        self.por_intencion = {}
+        self.segundos = 0.0
+
+    def clasificar(self, mensaje, respuestas=None):
+        """(intención, confianza) de la intención con respuesta fija, o (None, 0.0)"""
+        respuestas = self.respuestas if respuestas is None else respuestas
+        palabras = tokens(mensaje)
+        if not palabras:
+            return None, 0.0
+        encontrada = None
+        for intencion, (disparadores, relleno) in self._intenciones.items():
+            if intencion not in respuestas or disparadores.isdisjoint(palabras):
+                continue
+            if encontrada is not None:
+                # Pregunta por más de una cosa: mejor que la responda el modelo
+                return None, 0.0
+            propias = sum(1 for p in palabras if p in disparadores or p in relleno)
+            encontrada = intencion, propias / len(palabras)
+        return encontrada or (None, 0.0)
+
+    def responder(self, mensaje, tipo_consulta='general', nombre=None, respuestas=None):
+        """
+        Texto de la respuesta, o None si hay que consultar al modelo.
+        `respuestas` reemplaza a las del constructor (p. ej. las de otra tienda).
+        """
+        inicio = time.perf_counter()
+        respuestas = self.respuestas if respuestas is None else respuestas
+        intencion, confianza = (None, 0.0) if tipo_consulta != 'general' else self.clasificar(mensaje, respuestas)
+        texto = None
+        if intencion is not None and confianza >= self.umbral:
+            texto = respuestas[intencion]
+            if nombre:
+                texto = f"¡Claro, {nombre}! {texto}"
+
+        with self._lock:
+            self.consultas += 1
+            self.segundos += time.perf_counter() - inicio
+            if texto is not None:
+                self.directas += 1
+                self.por_intencion[intencion] = self.por_intencion.get(intencion, 0) + 1
+            elif intencion is not None:
+                self.baja_confianza += 1
+        return texto
+
+    def estadisticas(self):
+        with self._lock:
+            stats = {
+                'consultas': self.consultas,
+                'directas': self.directas,
+                'proporcion_directas': round(self.directas / self.consultas, 4) if self.consultas else 0.0,
+                'baja_confianza': self.baja_confianza,
+                'por_intencion': dict(self.por_intencion),
+                'promedio_us': round(1e6 * self.segundos / self.consultas, 1) if self.consultas else 0.0,
+            }
+        latencia = self._latencia_modelo() if self._latencia_modelo else None
+        stats['ahorro_estimado_s'] = round(stats['directas'] * latencia, 2) if latencia else None
+        return stats
@@ -0,0 +1,525 @@
+import asyncio
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from bitacora import obtener_bitacora
+
+TTL_POR_DEFECTO = 60 * 60 * 24
+MAX_SESIONES_POR_DEFECTO = 10000
+LIMITE_HISTORIAL = 50
+MAX_LIMITE_HISTORIAL = 500
+
+
+def nuevo_session_id():
+    """
+    Genera un id de sesión aleatorio de 128 bits.
+
+    No depende del reloj ni de contadores del proceso, así que es único entre
+    workers y servidores, y no se puede adivinar a partir de otro id.
+    """
+    return f"session_{secrets.token_urlsafe(16)}"
+
+
+class SessionStore(ABC):
+    """
+    Interfaz común para guardar el estado y el historial de las sesiones.
+
+    El estado (datos del cliente, estado de la conversación, etc.) se guarda
+    completo con `guardar`; el historial se guarda aparte y cada turno se
+    agrega con `agregar_historial`, sin reescribir la sesión.
+    """
+
+    @abstractmethod
+    def crear(self, session_id, estado):
+        """Crea la sesión si no existe. Devuelve False si el id ya estaba en uso"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def obtener(self, session_id):
+        """Devuelve el estado de la sesión o None si no existe o expiró"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def guardar(self, session_id, estado):
+        raise NotImplementedError
+
+    @abstractmethod
+    def agregar_historial(self, session_id, entrada):
+        raise NotImplementedError
+
+    @abstractmethod
+    def historial(self, session_id, ultimos=None):
+        """Devuelve el historial completo, o solo los `ultimos` turnos"""
+        raise NotImplementedError
+
+    def cantidad_historial(self, session_id):
+        return len(self.historial(session_id))
+
+    def rango_historial(self, session_id, inicio, fin):
+        """Turnos [inicio, fin) del historial, del más viejo al más nuevo"""
+        return self.historial(session_id)[inicio:fin]
+
+    def version_historial(self, session_id):
+        """
+        Algo que cambia cada vez que se agrega un turno (para el ETag de
+        /api/chat-history). Sin recorte del historial alcanza con la cantidad.
+        """
+        return self.cantidad_historial(session_id)
+
+    def pagina_historial(self, session_id, cursor=None, limite=LIMITE_HISTORIAL):
+        """
+        Una página del historial para /api/chat-history. `cursor` es la
+        posición del primer turno; sin cursor se devuelven los últimos turnos.
+        """
+        limite = max(1, min(limite, MAX_LIMITE_HISTORIAL))
+        total = self.cantidad_historial(session_id)
+        inicio = max(0, total - limite) if cursor is None else max(0, min(cursor, total))
+        entradas = self.rango_historial(session_id, inicio, inicio + limite)
+        fin = inicio + len(entradas)
+        return {
+            'history': entradas,
+            'total': total,
+            'cursor': inicio,
+            'next_cursor': fin if fin < total else None,
+            'prev_cursor': max(0, inicio - limite) if inicio > 0 else None
+        }
+
+    @abstractmethod
+    def eliminar(self, session_id):
+        raise NotImplementedError
+
+    def existe(self, session_id):
+        return self.obtener(session_id) is not None
+
+    def crear_sesion(self, estado):
+        """Crea una sesión con un id nuevo y lo devuelve"""
+        # `crear` es atómico: si el id ya existiera (prácticamente imposible) se genera otro
+        while True:
+            session_id = nuevo_session_id()
+            if self.crear(session_id, estado):
+                return session_id
+
+
+class MemoriaStore(SessionStore):
+    """
+    Store en memoria del proceso con desalojo LRU y expiración por inactividad.
+    `al_desalojar(session_id)` se llama por cada sesión desalojada o vencida
+    (lo usa la bitácora para soltar su historial).
+    """
+
+    def __init__(self, max_sesiones=MAX_SESIONES_POR_DEFECTO, ttl=TTL_POR_DEFECTO, al_desalojar=None):
+        self.max_sesiones = max_sesiones
+        self.ttl = ttl
+        self.al_desalojar = al_desalojar
+        self._lock = threading.Lock()
+        # session_id -> [expira, estado, historial]; el orden es el de último acceso
+        self._sesiones = OrderedDict()
+
+    def _purgar(self, ahora):
+        # Las sesiones al inicio son las de acceso más antiguo: las primeras en expirar
+        while self._sesiones:
+            session_id, entrada = next(iter(self._sesiones.items()))
+            if entrada[0] > ahora and len(self._sesiones) <= self.max_sesiones:
+                break
+            self._desalojar(session_id)
+
+    def _desalojar(self, session_id):
+        del self._sesiones[session_id]
+        if self.al_desalojar is not None:
+            self.al_desalojar(session_id)
+
+    def _tocar(self, session_id, ahora):
+        entrada = self._sesiones.get(session_id)
+        if entrada is None:
+            return None
+        if entrada[0] <= ahora:
+            self._desalojar(session_id)
+            return None
+        entrada[0] = ahora + self.ttl
+        self._sesiones.move_to_end(session_id)
+        return entrada
+
+    def crear(self, session_id, estado):
+        ahora = time.monotonic()
+        with self._lock:
+            if self._tocar(session_id, ahora) is not None:
+                return False
+            self._sesiones[session_id] = [ahora + self.ttl, estado, []]
+            self._purgar(ahora)
+            return True
+
+    def obtener(self, session_id):
+        with self._lock:
+            entrada = self._tocar(session_id, time.monotonic())
+            return entrada[1] if entrada else None
+
+    def guardar(self, session_id, estado):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._tocar(session_id, ahora)
+            if entrada is None:
+                self._sesiones[session_id] = [ahora + self.ttl, estado, []]
+                self._purgar(ahora)
+            else:
+                entrada[1] = estado
+
+    def agregar_historial(self, session_id, entrada):
+        with self._lock:
+            sesion = self._tocar(session_id, time.monotonic())
+            if sesion is not None:
+                sesion[2].append(entrada)
+
+    def historial(self, session_id, ultimos=None):
+        with self._lock:
+            sesion = self._tocar(session_id, time.monotonic())
+            if sesion is None:
+                return []
+            return list(sesion[2][-ultimos:] if ultimos else sesion[2])
+
+    def cantidad_historial(self, session_id):
+        with self._lock:
+            sesion = self._tocar(session_id, time.monotonic())
+            return len(sesion[2]) if sesion else 0
+
+    def rango_historial(self, session_id, inicio, fin):
+        with self._lock:
+            sesion = self._tocar(session_id, time.monotonic())
+            return sesion[2][inicio:fin] if sesion else []
+
+    def eliminar(self, session_id):
+        with self._lock:
+            self._sesiones.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sesiones)
+
+
+class SQLiteStore(SessionStore):
+    """Store persistente en un archivo SQLite, compartible entre procesos"""
+
+    def __init__(self, ruta='sesiones.db', ttl=TTL_POR_DEFECTO, purgar_cada=500):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.purgar_cada = purgar_cada
+        self._escrituras = 0
+        self._local = threading.local()
+        with self._conexion() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sesiones (
+                    id TEXT PRIMARY KEY,
+                    estado TEXT NOT NULL,
+                    expira REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS historial (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    entrada TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_historial_sesion ON historial (session_id, seq);
+            """)
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _tal_vez_purgar(self, conn):
+        self._escrituras += 1
+        if self._escrituras % self.purgar_cada:
+            return
+        ahora = time.time()
+        conn.execute("DELETE FROM historial WHERE session_id IN (SELECT id FROM sesiones WHERE expira <= ?)", (ahora,))
+        conn.execute("DELETE FROM sesiones WHERE expira <= ?", (ahora,))
+
+    def crear(self, session_id, estado):
+        conn = self._conexion()
+        ahora = time.time()
+        # Si existe una sesión expirada con el mismo id, se reutiliza el id
+        conn.execute("DELETE FROM sesiones WHERE id = ? AND expira <= ?", (session_id, ahora))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO sesiones (id, estado, expira) VALUES (?, ?, ?)",
+            (session_id, json.dumps(estado), ahora + self.ttl)
+        )
+        self._tal_vez_purgar(conn)
+        return cursor.rowcount == 1
+
+    def obtener(self, session_id):
+        conn = self._conexion()
+        ahora = time.time()
+        fila = conn.execute(
+            "SELECT estado FROM sesiones WHERE id = ? AND expira > ?", (session_id, ahora)
+        ).fetchone()
+        if fila is None:
+            return None
+        conn.execute("UPDATE sesiones SET expira = ? WHERE id = ?", (ahora + self.ttl, session_id))
+        return json.loads(fila[0])
+
+    def guardar(self, session_id, estado):
+        conn = self._conexion()
+        conn.execute(
+            "INSERT INTO sesiones (id, estado, expira) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET estado = excluded.estado, expira = excluded.expira",
+            (session_id, json.dumps(estado), time.time() + self.ttl)
+        )
+        self._tal_vez_purgar(conn)
+
+    def agregar_historial(self, session_id, entrada):
+        conn = self._conexion()
+        conn.execute(
+            "INSERT INTO historial (session_id, entrada) VALUES (?, ?)",
+            (session_id, json.dumps(entrada))
+        )
+
+    def historial(self, session_id, ultimos=None):
+        conn = self._conexion()
+        if ultimos:
+            filas = conn.execute(
+                "SELECT entrada FROM historial WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, ultimos)
+            ).fetchall()
+            filas.reverse()
+        else:
+            filas = conn.execute(
+                "SELECT entrada FROM historial WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return [json.loads(fila[0]) for fila in filas]
+
+    def cantidad_historial(self, session_id):
+        fila = self._conexion().execute(
+            "SELECT COUNT(*) FROM historial WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return fila[0]
+
+    def rango_historial(self, session_id, inicio, fin):
+        filas = self._conexion().execute(
+            "SELECT entrada FROM historial WHERE session_id = ? ORDER BY seq LIMIT ? OFFSET ?",
+            (session_id, max(0, fin - inicio), inicio)
+        ).fetchall()
+        return [json.loads(fila[0]) for fila in filas]
+
+    def version_historial(self, session_id):
+        # seq es AUTOINCREMENT: nunca se reutiliza, aunque se borren turnos
+        fila = self._conexion().execute(
+            "SELECT MAX(seq) FROM historial WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return fila[0] or 0
+
+    def eliminar(self, session_id):
+        conn = self._conexion()
+        conn.execute("DELETE FROM historial WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM sesiones WHERE id = ?", (session_id,))
+
+    def __len__(self):
+        fila = self._conexion().execute(
+            "SELECT COUNT(*) FROM sesiones WHERE expira > ?", (time.time(),)
+        ).fetchone()
+        return fila[0]
+
+
+class RedisStore(SessionStore):
+    """
+    Store sobre cualquier cliente con la interfaz de redis-py (redis, fakeredis,
+    o un servidor compatible con el protocolo de Redis como KeyDB o Valkey).
+    """
+
+    def __init__(self, cliente, ttl=TTL_POR_DEFECTO, prefijo='chat:'):
+        self.cliente = cliente
+        self.ttl = int(ttl)
+        self.prefijo = prefijo
+
+    def _clave_estado(self, session_id):
+        return f"{self.prefijo}sesion:{session_id}"
+
+    def _clave_historial(self, session_id):
+        return f"{self.prefijo}historial:{session_id}"
+
+    def crear(self, session_id, estado):
+        return bool(self.cliente.set(
+            self._clave_estado(session_id), json.dumps(estado), nx=True, ex=self.ttl
+        ))
+
+    def obtener(self, session_id):
+        clave = self._clave_estado(session_id)
+        valor = self.cliente.get(clave)
+        if valor is None:
+            return None
+        self.cliente.expire(clave, self.ttl)
+        return json.loads(valor)
+
+    def guardar(self, session_id, estado):
+        self.cliente.set(self._clave_estado(session_id), json.dumps(estado), ex=self.ttl)
+
+    def agregar_historial(self, session_id, entrada):
+        clave = self._clave_historial(session_id)
+        pipe = self.cliente.pipeline()
+        pipe.rpush(clave, json.dumps(entrada))
+        pipe.expire(clave, self.ttl)
+        pipe.execute()
+
+    def historial(self, session_id, ultimos=None):
+        inicio = -ultimos if ultimos else 0
+        valores = self.cliente.lrange(self._clave_historial(session_id), inicio, -1)
+        return [json.loads(valor) for valor in valores]
+
+    def cantidad_historial(self, session_id):
+        return self.cliente.llen(self._clave_historial(session_id))
+
+    def rango_historial(self, session_id, inicio, fin):
+        if fin <= inicio:
+            return []
+        valores = self.cliente.lrange(self._clave_historial(session_id), inicio, fin - 1)
+        return [json.loads(valor) for valor in valores]
+
+    def eliminar(self, session_id):
+        self.cliente.delete(self._clave_estado(session_id), self._clave_historial(session_id))
+
+
+def crear_store():
+    """
+    Crea el store configurado en las variables de entorno:
+    SESSION_STORE=memoria|sqlite|redis, SESSION_TTL, SESSION_MAX,
+    SESSION_SQLITE_PATH y REDIS_URL.
+    """
+    tipo = os.getenv('SESSION_STORE', 'memoria').lower()
+    ttl = float(os.getenv('SESSION_TTL', TTL_POR_DEFECTO))
+
+    if tipo == 'sqlite':
+        return SQLiteStore(os.getenv('SESSION_SQLITE_PATH', 'sesiones.db'), ttl=ttl)
+    if tipo == 'redis':
+        import redis
+        return RedisStore(redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0')), ttl=ttl)
+    # Las sesiones desalojadas por LRU sueltan también su historial de la bitácora
+    bitacora = obtener_bitacora()
+    return MemoriaStore(
+        int(os.getenv('SESSION_MAX', MAX_SESIONES_POR_DEFECTO)), ttl=ttl,
+        al_desalojar=bitacora.eliminar if bitacora else None
+    )
+
+
+_lock_compartido = threading.Lock()
+_store_compartido = None
+
+
+def obtener_store():
+    """Devuelve el store del proceso, creado en el primer uso y compartido por todos los flujos"""
+    global _store_compartido
+    with _lock_compartido:
+        if _store_compartido is None:
+            _store_compartido = crear_store()
+        return _store_compartido
+
+
+class EspacioSesiones(SessionStore):
+    """
+    Vista de un store con los ids prefijados, para que cada flujo de chat use
+    el mismo backend sin mezclar sus sesiones. Si no se indica `store`, usa
+    el store compartido del proceso (se resuelve recién en el primer uso).
+
+    El historial va a la bitácora de conversaciones del proceso (ver
+    bitacora.py) salvo que esté desactivada o se pase `bitacora=False`; en
+    ese caso queda en el store.
+    """
+
+    def __init__(self, prefijo, store=None, bitacora=None):
+        self.prefijo = prefijo
+        self._store = store
+        self._bitacora = bitacora
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = obtener_store()
+        return self._store
+
+    @property
+    def bitacora(self):
+        if self._bitacora is None:
+            self._bitacora = obtener_bitacora() or False
+        return self._bitacora
+
+    def _clave(self, session_id):
+        return f"{self.prefijo}:{session_id}"
+
+    def crear(self, session_id, estado):
+        return self.store.crear(self._clave(session_id), estado)
+
+    def obtener(self, session_id):
+        return self.store.obtener(self._clave(session_id))
+
+    def guardar(self, session_id, estado):
+        self.store.guardar(self._clave(session_id), estado)
+
+    def agregar_historial(self, session_id, entrada):
+        if self.bitacora:
+            self.bitacora.agregar(self._clave(session_id), entrada)
+        else:
+            self.store.agregar_historial(self._clave(session_id), entrada)
+
+    def historial(self, session_id, ultimos=None):
+        if self.bitacora:
+            return self.bitacora.ultimos(self._clave(session_id), ultimos)
+        return self.store.historial(self._clave(session_id), ultimos)
+
+    def cantidad_historial(self, session_id):
+        if self.bitacora:
+            return self.bitacora.cantidad(self._clave(session_id))
+        return self.store.cantidad_historial(self._clave(session_id))
+
+    def rango_historial(self, session_id, inicio, fin):
+        if self.bitacora:
+            return self.bitacora.rango(self._clave(session_id), inicio, fin)
+        return self.store.rango_historial(self._clave(session_id), inicio, fin)
+
+    def version_historial(self, session_id):
+        if self.bitacora:
+            return self.bitacora.version(self._clave(session_id))
+        return self.store.version_historial(self._clave(session_id))
+
+    def eliminar(self, session_id):
+        if self.bitacora:
+            self.bitacora.eliminar(self._clave(session_id))
+        self.store.eliminar(self._clave(session_id))
+
+
+class CerrojosSesion:
+    """
+    Un asyncio.Lock por session_id para el modo asíncrono: entre la lectura y
+    el guardado del estado hay awaits, así que dos mensajes de la misma sesión
+    no deben intercalarse. El cerrojo se descarta cuando nadie lo usa.
+    """
+
+    def __init__(self):
+        # session_id -> [lock, cantidad de tareas que lo usan o esperan]
+        self._cerrojos = {}
+
+    def __len__(self):
+        return len(self._cerrojos)
+
+    @asynccontextmanager
+    async def bloquear(self, session_id):
+        if not session_id:
+            # Sesión nueva: nadie más puede tener su id todavía
+            yield
+            return
+        entrada = self._cerrojos.get(session_id)
+        if entrada is None:
+            entrada = self._cerrojos[session_id] = [asyncio.Lock(), 0]
+        entrada[1] += 1
+        try:
+            async with entrada[0]:
+                yield
+        finally:
+            entrada[1] -= 1
+            if not entrada[1]:
+                del self._cerrojos[session_id]
@@ -0,0 +1,79 @@
+import json
+import time
+
+from gateway import GatewayError
+
+from flask import Response, stream_with_context
+
+MIMETYPE_SSE = 'text/event-stream'
+
+
+def quiere_stream(request):
+    """Indica si el cliente pidió la respuesta en streaming (SSE)"""
+    if request.path.endswith('/stream'):
+        return True
+    mejor = request.accept_mimetypes.best_match([MIMETYPE_SSE, 'application/json'])
+    return mejor == MIMETYPE_SSE and request.accept_mimetypes[MIMETYPE_SSE] > 0
+
+
+def evento_sse(datos, evento=None):
+    """Serializa un evento Server-Sent Events"""
+    linea = f"data: {json.dumps(datos, ensure_ascii=False)}\n\n"
+    if evento:
+        return f"event: {evento}\n{linea}"
+    return linea
+
+
+def respuesta_sse(model, prompt, al_terminar=None, extra=None, contexto=None):
+    """
+    Reenvía al cliente los fragmentos de Gemini a medida que llegan.
+    `contexto` es la parte fija del prompt (ver contexto.ContextoFijo).
+
+    Al terminar, `al_terminar(texto_completo)` recibe la respuesta ensamblada
+    para guardarla en el historial de la sesión.
+    """
+    extra = extra or {}
+    kwargs = {'contexto': contexto} if contexto is not None else {}
+
+    def generar():
+        inicio = time.perf_counter()
+        ttfb = None
+        partes = []
+        flujo = None
+        try:
+            flujo = model.generate_content(prompt, stream=True, **kwargs)
+            for chunk in flujo:
+                texto = chunk.text
+                if not texto:
+                    continue
+                if ttfb is None:
+                    ttfb = time.perf_counter() - inicio
+                partes.append(texto)
+                yield evento_sse({'text': texto}, 'chunk')
+
+            response_text = "".join(partes)
+            if al_terminar:
+                al_terminar(response_text)
+
+            yield evento_sse({
+                **extra,
+                'status': 'success',
+                'response': response_text,
+                'ttfb_ms': round((ttfb or 0) * 1000, 2),
+                'total_ms': round((time.perf_counter() - inicio) * 1000, 2)
+            }, 'done')
+        except GatewayError as e:
+            yield evento_sse({'error': e.respuesta, 'status': 'error'}, 'error')
+        except Exception as e:
+            yield evento_sse({'error': str(e), 'status': 'error'}, 'error')
+        finally:
+            # Si el cliente se desconecta, devuelve el cupo del gateway de inmediato
+            cerrar = getattr(flujo, 'close', None)
+            if cerrar is not None:
+                cerrar()
+
+    return Response(
+        stream_with_context(generar()),
+        mimetype=MIMETYPE_SSE,
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
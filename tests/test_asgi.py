@@ -0,0 +1,58 @@
+"""
+Prueba de humo del modo asíncrono (asgi.py) con el modelo falso. Se salta si
+quart no está instalado (es una dependencia opcional).
+"""
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip('quart')
+pytest.importorskip('quart_cors')
+
+os.environ.setdefault('GOOGLE_API_KEY', 'fake')
+os.environ.setdefault('SESSION_STORE', 'memoria')
+os.environ.setdefault('HISTORIAL_DIR', '')
+# Todas las peticiones salen de la misma IP: sin límites de frecuencia (ver limites.py)
+os.environ.setdefault('LIMITE_IP_RAFAGA', '0')
+os.environ.setdefault('LIMITE_SESION_RAFAGA', '0')
+
+import chat_complet  # noqa: E402
+import metricas  # noqa: E402
+from asgi import create_asgi_app  # noqa: E402
+from fake_gemini import FakeGenerativeModel  # noqa: E402
+from gateway import ModelGateway  # noqa: E402
+
+RUTA = '/chat-complet/api'
+
+
+def test_chat_e_historial():
+    chat_complet.model = ModelGateway(FakeGenerativeModel(retardo_inicial=0, retardo_trozo=0))
+
+    async def correr():
+        cliente = create_asgi_app().test_client()
+
+        response = await cliente.post(f'{RUTA}/chat', json={'message': 'hola'})
+        assert response.status_code == 200
+        session_id = (await response.get_json())['session_id']
+
+        response = await cliente.post(f'{RUTA}/chat', json={'message': 123, 'session_id': session_id})
+        assert response.status_code == 400
+
+        response = await cliente.post(f'{RUTA}/chat', json={'message': 'Ana', 'session_id': session_id})
+        assert response.status_code == 200
+
+        response = await cliente.get(f'{RUTA}/chat-history', query_string={'session_id': session_id})
+        assert response.status_code == 200
+        assert (await response.get_json())['status'] == 'success'
+
+        etag = response.headers['ETag']
+        response = await cliente.get(
+            f'{RUTA}/chat-history', query_string={'session_id': session_id}, headers={'If-None-Match': etag}
+        )
+        assert response.status_code == 304
+
+    asyncio.run(correr())
+
+    # Las métricas de la máquina de estados llevan el flujo de Quart, no 'batch'
+    assert 'flujo="chat_complet_async"' in metricas.exponer()
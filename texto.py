@@ -0,0 +1,34 @@
+import re
+import unicodedata
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9ñ ]+')
+_ESPACIOS = re.compile(r'\s+')
+
+PALABRAS_VACIAS = frozenset("""
+a al algo algun alguna como con cual cuales de del el en es esta estan este esto
+hay la las le les lo los me mi mis muy no o para pero por que quiero se si sin
+su sus te tiene tu un una uno unos y ya yo hola tienen busco necesito
+""".split())
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes, sin puntuación y con espacios simples"""
+    texto = texto.lower().replace('ñ', '\0')
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).replace('\0', 'ñ')
+    texto = _NO_ALFANUMERICO.sub(' ', texto)
+    return _ESPACIOS.sub(' ', texto).strip()
+
+
+def raiz(palabra):
+    """Singular aproximado: camisetas -> camiseta, colores -> color"""
+    if len(palabra) > 4 and palabra.endswith('es') and palabra[-3] not in 'aeiou':
+        return palabra[:-2]
+    if len(palabra) > 3 and palabra.endswith('s'):
+        return palabra[:-1]
+    return palabra
+
+
+def tokens(texto):
+    """Palabras normalizadas y en singular, sin palabras vacías"""
+    return [raiz(p) for p in normalizar(texto).split() if p not in PALABRAS_VACIAS]
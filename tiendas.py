@@ -0,0 +1,207 @@
+import os
+import re
+import sys
+import threading
+import types
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from catalogo import CatalogoCache, obtener_catalogo
+
+MAX_TIENDAS_POR_DEFECTO = 256
+MAX_MB_POR_DEFECTO = 256
+
+# Ids de tienda válidos: también son nombres de archivo, así no hay rutas con '..' ni '/'
+_PATRON_TIENDA = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+
+# Lo que no cuenta como memoria del catálogo
+_OMITIDOS = (type, types.FunctionType, types.MethodType, types.ModuleType, type(threading.Lock()), type(threading.RLock()))
+
+# Tienda de la petición en curso (None: la tienda por defecto). Es una
+# ContextVar y no flask.g para que también sirva en los handlers de Quart y
+# en los hilos del batch (copiando el contexto).
+_tienda_actual = ContextVar('tienda_actual', default=None)
+
+
+class TiendaDesconocida(LookupError):
+    """El id no es válido o no hay catálogo para esa tienda"""
+
+
+def resolver_tienda(headers, host=None, data=None):
+    """
+    Id de la tienda de una petición: header X-Tienda, campo "tienda" del
+    cuerpo JSON o subdominio de TIENDAS_DOMINIO (tienda.ejemplo.com), en ese
+    orden. None si no indica ninguna. Lanza TiendaDesconocida si el id no
+    es válido.
+    """
+    tienda = headers.get('X-Tienda')
+    if not tienda and isinstance(data, dict):
+        tienda = data.get('tienda')
+    dominio = os.getenv('TIENDAS_DOMINIO')
+    if not tienda and dominio and host:
+        host = host.split(':', 1)[0].lower()
+        if host.endswith('.' + dominio):
+            tienda = host[:-len(dominio) - 1]
+    if not tienda:
+        return None
+    tienda = str(tienda).lower()
+    if not _PATRON_TIENDA.match(tienda):
+        raise TiendaDesconocida(tienda)
+    return tienda
+
+
+def usar_tienda(tienda):
+    """Fija la tienda de la petición en curso; devuelve el token para restaurarla"""
+    return _tienda_actual.set(tienda)
+
+
+def restaurar_tienda(token):
+    _tienda_actual.reset(token)
+
+
+def tienda_actual():
+    return _tienda_actual.get()
+
+
+def tamano_profundo(objeto, vistos=None):
+    """Bytes aproximados de `objeto` y todo lo que referencia (cada objeto se cuenta una vez)"""
+    vistos = set() if vistos is None else vistos
+    pendientes = [objeto]
+    total = 0
+    while pendientes:
+        actual = pendientes.pop()
+        if id(actual) in vistos or isinstance(actual, _OMITIDOS):
+            continue
+        vistos.add(id(actual))
+        total += sys.getsizeof(actual)
+        if isinstance(actual, dict):
+            pendientes.extend(actual.keys())
+            pendientes.extend(actual.values())
+        elif isinstance(actual, (list, tuple, set, frozenset)):
+            pendientes.extend(actual)
+        elif not isinstance(actual, (str, bytes, int, float, bool)) and actual is not None:
+            for slot in getattr(type(actual), '__slots__', ()):
+                if hasattr(actual, slot):
+                    pendientes.append(getattr(actual, slot))
+            if hasattr(actual, '__dict__'):
+                pendientes.append(vars(actual))
+    return total
+
+
+class CatalogosTiendas:
+    """
+    Catálogos de muchas tiendas, cada uno en `directorio/<tienda>.json`.
+
+    Cada catálogo se lee y se formatea recién en su primer uso, y se recarga
+    solo cuando cambia su archivo (ver CatalogoCache). Los cargados quedan en
+    un LRU acotado por cantidad y por memoria estimada; el de la tienda por
+    defecto (`por_defecto`, la ruta de siempre) no se descarta nunca.
+    """
+
+    def __init__(self, directorio='tiendas', max_tiendas=MAX_TIENDAS_POR_DEFECTO,
+                 max_bytes=MAX_MB_POR_DEFECTO * 2 ** 20, por_defecto='store_data.json'):
+        self.directorio = directorio
+        self.max_tiendas = max_tiendas
+        self.max_bytes = max_bytes
+        self.por_defecto = por_defecto
+        self._lock = threading.Lock()
+        # tienda -> [CatalogoCache, bytes estimados, recargas al medir]
+        self._cargados = OrderedDict()
+        self.bytes = 0
+
+        self.cargas = 0
+        self.descartes = 0
+
+    def ruta(self, tienda):
+        return os.path.join(self.directorio, f"{tienda}.json")
+
+    def existe(self, tienda):
+        if tienda is None:
+            return True
+        with self._lock:
+            if tienda in self._cargados:
+                return True
+        return os.path.isfile(self.ruta(tienda))
+
+    def obtener(self, tienda):
+        """CatalogoCache de la tienda (None: la tienda por defecto)"""
+        if tienda is None:
+            return obtener_catalogo(self.por_defecto)
+        with self._lock:
+            entrada = self._cargados.get(tienda)
+            if entrada is not None:
+                self._cargados.move_to_end(tienda)
+                if entrada[2] == entrada[0].reloads:
+                    return entrada[0]
+        if entrada is None:
+            if not os.path.isfile(self.ruta(tienda)):
+                raise TiendaDesconocida(tienda)
+            entrada = [CatalogoCache(self.ruta(tienda)), 0, -1]
+            with self._lock:
+                # Otra petición pudo crearla mientras tanto
+                entrada = self._cargados.setdefault(tienda, entrada)
+
+        # Carga (o recarga) fuera del lock del LRU; el de la caché evita cargas dobles
+        cache = entrada[0]
+        cache.contexto()
+        self._medir(tienda, entrada)
+        return cache
+
+    def _medir(self, tienda, entrada):
+        cache = entrada[0]
+        recargas = cache.reloads
+        tamano = tamano_profundo(vars(cache))
+        with self._lock:
+            if entrada[2] == recargas or self._cargados.get(tienda) is not entrada:
+                return
+            if entrada[2] < 0:
+                self.cargas += 1
+            self.bytes += tamano - entrada[1]
+            entrada[1], entrada[2] = tamano, recargas
+            self._descartar(tienda)
+
+    def _descartar(self, actual):
+        while len(self._cargados) > 1 and (len(self._cargados) > self.max_tiendas or self.bytes > self.max_bytes):
+            tienda, entrada = next(iter(self._cargados.items()))
+            if tienda == actual:
+                self._cargados.move_to_end(tienda)
+                continue
+            del self._cargados[tienda]
+            self.bytes -= entrada[1]
+            self.descartes += 1
+
+    def estadisticas(self):
+        with self._lock:
+            mayores = sorted(self._cargados.items(), key=lambda par: -par[1][1])[:5]
+            return {
+                'cargadas': len(self._cargados),
+                'max_tiendas': self.max_tiendas,
+                'memoria_mb': round(self.bytes / 2 ** 20, 2),
+                'max_memoria_mb': round(self.max_bytes / 2 ** 20, 2),
+                'cargas': self.cargas,
+                'descartes': self.descartes,
+                'mayores_kb': {tienda: round(entrada[1] / 1024, 1) for tienda, entrada in mayores}
+            }
+
+
+class CatalogoActual:
+    """
+    Se comporta como el CatalogoCache de la tienda de la petición en curso,
+    así los flujos usan `catalogo.contexto_para(...)` sin saber de tiendas.
+    """
+
+    def __init__(self, tiendas):
+        self.tiendas = tiendas
+
+    def __getattr__(self, nombre):
+        return getattr(self.tiendas.obtener(tienda_actual()), nombre)
+
+
+def crear_tiendas(por_defecto='store_data.json'):
+    """Catálogos de las variables de entorno TIENDAS_DIR, TIENDAS_MAX y TIENDAS_MAX_MB"""
+    return CatalogosTiendas(
+        os.getenv('TIENDAS_DIR', 'tiendas'),
+        max_tiendas=int(os.getenv('TIENDAS_MAX', MAX_TIENDAS_POR_DEFECTO)),
+        max_bytes=float(os.getenv('TIENDAS_MAX_MB', MAX_MB_POR_DEFECTO)) * 2 ** 20,
+        por_defecto=por_defecto
+    )
@@ -0,0 +1,4 @@
+# Punto de entrada para producción: gunicorn -c gunicorn.conf.py wsgi:app
+from app import create_app
+
+app = create_app()